@@ -1,18 +1,11 @@
-import os
-import google.generativeai as genai
+import annotation_payload
+import llm_backend
+import telemetry
 import json
 import pathlib
 import textwrap
 import re
 import time
-from dotenv import load_dotenv
-
-# --- Configuration ---
-load_dotenv()
-GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
-if not GOOGLE_API_KEY:
-    raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
-genai.configure(api_key=GOOGLE_API_KEY)
 
 # --- Chapter Lists ---
 CHAPTERS = {
@@ -124,19 +117,19 @@ def generate_annotation_prompt(subject, chapters, questions):
     You are an expert in educational content classification.
     You will receive a JSON array of questions from a Class 12 {subject.title()} question paper.
     Your task is to annotate each question with the correct chapter number (as a string, e.g., "1", "2", etc.) from the official NCERT Class 12 {subject.title()} chapters below.
-    - Insert the field "chapter": "<number>" immediately after the "type" field in each question object.
+    - Label each question with "chapter": "<number>".
     - Only use the chapter numbers from the list below.
-    - Output the result as a JSON array, with the "chapter" field added to each question.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter": "<number>"}}}}. Do not repeat the questions.
 
     Here are the chapters:
     {chr(10).join(chapter_lines)}
 
     Here is the input JSON array of questions:
     ```json
-    {json.dumps(questions, ensure_ascii=False, indent=2)}
+    {annotation_payload.compact_json(questions)}
     ```
 
-    Output only the annotated JSON array.
+    Output only the JSON object of labels.
     """)
     return prompt
 
@@ -155,12 +148,15 @@ def main():
     chapters = CHAPTERS[subject]
     prompt = generate_annotation_prompt(subject, chapters, questions)
     print("\nSending questions to Gemini for chapter annotation...")
-    model = genai.GenerativeModel(model_name="models/gemini-2.5-pro")
-    response = model.generate_content(prompt)
+    model = llm_backend.GenerativeModel(model_name="models/gemini-2.5-pro")
+    with telemetry.track("annotate", model.model_name, source=str(selected_file), questions=len(questions)) as call:
+        response = model.generate_content(prompt)
+        call.usage(response)
     print("Gemini response received. Parsing...")
     try:
         cleaned_json_string = clean_json_response(response.text)
         annotated = json.loads(cleaned_json_string)
+        annotated = annotation_payload.merge_labels(questions, annotated)
     except Exception as e:
         print(f"\n--- ERROR: Failed to parse Gemini's response. ---")
         print(f"Error details: {e}")
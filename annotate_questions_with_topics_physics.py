@@ -1,5 +1,6 @@
-import os
-import google.generativeai as genai
+import annotation_payload
+import llm_backend
+import telemetry
 import json
 import pathlib
 import textwrap
@@ -87,9 +88,9 @@ def generate_physics_annotation_prompt(chapters, topics, questions):
     - The correct chapter number and chapter name (from the official list below)
     - The correct topic number and topic name (from the official topic breakdown below)
     - Each question must be mapped to one and only one topic and chapter.
-    - Insert the fields "chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>" immediately after the "type" field in each question object.
+    - Label each question with "chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>".
     - Only use the chapter and topic numbers/names from the lists below.
-    - Output the result as a JSON array, with the new fields added to each question.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>"}}}}. Do not repeat the questions.
 
     Chapters:
     {chr(10).join(chapter_lines)}
@@ -99,10 +100,10 @@ def generate_physics_annotation_prompt(chapters, topics, questions):
 
     Here is the input JSON array of questions:
     ```json
-    {json.dumps(questions, ensure_ascii=False, indent=2)}
+    {annotation_payload.compact_json(questions)}
     ```
 
-    Output only the annotated JSON array.
+    Output only the JSON object of labels.
     """)
     return prompt
 
@@ -121,12 +122,15 @@ def main():
     topics = PHYSICS_TOPICS
     prompt = generate_physics_annotation_prompt(chapters, topics, questions)
     print("\nSending questions to Gemini for annotation...")
-    model = genai.GenerativeModel(model_name="models/gemini-2.5-pro")
-    response = model.generate_content(prompt)
+    model = llm_backend.GenerativeModel(model_name="models/gemini-2.5-pro")
+    with telemetry.track("annotate", model.model_name, source=str(selected_file), questions=len(questions)) as call:
+        response = model.generate_content(prompt)
+        call.usage(response)
     print("Gemini response received. Parsing...")
     try:
         cleaned_json_string = clean_json_response(response.text)
         annotated = json.loads(cleaned_json_string)
+        annotated = annotation_payload.merge_labels(questions, annotated)
     except Exception as e:
         print(f"\n--- ERROR: Failed to parse Gemini's response. ---")
         print(f"Error details: {e}")
@@ -154,10 +158,4 @@ def main():
     print(f"\n✓ Annotated data saved to: {out_path}")
 
 if __name__ == "__main__":
-    from dotenv import load_dotenv
-    load_dotenv()
-    GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
-    if not GOOGLE_API_KEY:
-        raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
-    genai.configure(api_key=GOOGLE_API_KEY)
     main()
@@ -0,0 +1,447 @@
+import collections
+import importlib
+import json
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+import annotation_payload
+import chapter_classifier
+import job_ledger
+import label_index
+import llm_cache
+import llm_router
+import syllabus_index
+import validation
+from subjects import SUBJECTS, annotated_folder, data_folder, identify_file
+
+# Questions per annotation call; small chunks run concurrently and fail independently
+DEFAULT_CHUNK_SIZE = 25
+# Attempts per chunk before the paper is given up on (cached chunks are kept)
+CHUNK_ATTEMPTS = 3
+# Next to each annotated file: the content hash and syllabus version behind every label
+PROVENANCE_DIR = ".provenance"
+
+
+def annotation_spec(subject: str) -> Dict[str, Any]:
+    return SUBJECTS[subject]["annotation"]
+
+
+def _annotator_module(subject: str):
+    return importlib.import_module(annotation_spec(subject)["module"])
+
+
+def get_chapters(subject: str) -> List[str]:
+    spec = annotation_spec(subject)
+    chapters = getattr(_annotator_module(subject), spec["chapters"])
+    # batch_annotate.py keeps one CHAPTERS dict for biology and chemistry
+    return chapters[subject] if isinstance(chapters, dict) else chapters
+
+
+def build_prompt(subject: str, questions: List[Dict[str, Any]],
+                 candidates: Optional[Dict[str, List[Tuple[str, ...]]]] = None) -> str:
+    """
+    Builds the same prompt the subject's batch_annotate_* script would send, or with
+    `candidates` (see syllabus_index.candidates) its "candidate_prompt", which lists
+    only the syllabus entries shortlisted for these questions.
+    """
+    spec = annotation_spec(subject)
+    module = _annotator_module(subject)
+    chapters = get_chapters(subject)
+    if candidates is not None:
+        return getattr(module, spec["candidate_prompt"])(chapters, candidates, questions)
+    generate = getattr(module, spec["prompt"])
+    if spec.get("subject_arg"):
+        return generate(subject, chapters, questions)
+    if "topics" in spec:
+        return generate(chapters, getattr(module, spec["topics"]), questions)
+    return generate(chapters, questions)
+
+
+def annotation_problems(subject: str, annotated: Any, questions: List[Dict[str, Any]]) -> List[str]:
+    """
+    validation.annotation_problems with the subject's chapter list, topics and label
+    fields. `annotated` is merge_labels output, one item per question in `questions`;
+    questions the model skipped are unlabelled there and fail the missing-field check.
+    """
+    spec = annotation_spec(subject)
+    if isinstance(annotated, list):
+        annotated = finalize_annotations(subject, annotated)  # bio/chem get chapter_name from the number
+    topics = getattr(_annotator_module(subject), spec["topics"]) if "topics" in spec else None
+    if isinstance(annotated, list) and len(annotated) != len(questions):
+        return [f"returned {len(annotated)} questions for {len(questions)} sent"]
+    return validation.annotation_problems(annotated, spec["fields"], get_chapters(subject), topics,
+                                          spec.get("extra_chapter_names", ()))
+
+
+def labelled_questions(subject: str) -> List[Tuple[Optional[int], Dict[str, Any], Tuple[str, ...]]]:
+    """(year, question, label values) for every already-annotated question whose labels pass validation."""
+    spec = annotation_spec(subject)
+    chapters = get_chapters(subject)
+    topics = getattr(_annotator_module(subject), spec["topics"]) if "topics" in spec else None
+    labelled = []
+    for fpath in sorted(annotated_folder(subject).glob("*.json")):
+        _, year = identify_file(fpath.name)
+        with open(fpath, 'r', encoding='utf-8') as f:
+            questions = json.load(f)
+        for q in questions:
+            if isinstance(q, dict) and not validation.annotation_problems(
+                    [q], spec["fields"], chapters, topics, spec.get("extra_chapter_names", ())):
+                labelled.append((year, q, tuple(str(q[field]) for field in spec["fields"])))
+    return labelled
+
+
+def _has_labels(subject: str, q: Dict[str, Any]) -> bool:
+    return all(q.get(field) not in (None, "") for field in annotation_spec(subject)["fields"])
+
+
+def _cache_key(prompt_hash: str, provider: "llm_router.Provider") -> str:
+    # Gemini keeps the model-only key, so responses cached before routing still hit
+    return llm_cache.make_key("annotate", prompt_hash, provider.model if provider.kind == "gemini" else provider.name)
+
+
+def annotate_questions(subject: str, questions: List[Dict[str, Any]], model_name: str = validation.PRO_MODEL,
+                       usage: Optional[Dict[str, int]] = None, source: Optional[str] = None, use_cache: bool = False,
+                       generation_slots=None, candidates: Optional[Dict[str, List[Tuple[str, ...]]]] = None
+                       ) -> Optional[List[Dict[str, Any]]]:
+    """
+    Sends one annotation prompt and returns the questions with the model's labels
+    merged in, or None if the response can't be parsed. With `use_cache`, responses
+    that pass validation are cached by prompt hash and the provider that answered, so
+    a rerun only pays for the questions that failed. With `candidates` the narrowed prompt is sent;
+    questions the model found no candidate for come back unlabelled.
+    """
+    module = _annotator_module(subject)
+    prompt = build_prompt(subject, questions, candidates)
+    prompt_hash = llm_cache.sha256_text(prompt)
+    router, provider = llm_router.router_for(model_name), None
+    # Any provider in the model's pool may have answered this prompt before
+    cached = next(filter(None, (llm_cache.load_response(_cache_key(prompt_hash, p)) for p in router.providers)),
+                  None) if use_cache else None
+    try:
+        if cached is not None:
+            text = cached
+        else:
+            # The router may answer from another provider in the model's pool (see llm_router.py)
+            with generation_slots or nullcontext():
+                text, tokens, provider = router.generate(prompt, "annotate", source, subject=subject,
+                                                         questions=len(questions))
+            job_ledger.add_tokens(usage, tokens)
+        annotated = annotation_payload.merge_labels(questions, json.loads(module.clean_json_response(text)))
+    except Exception as e:
+        if provider is not None:
+            router.report_invalid(provider)
+        print(f"\n--- ERROR: Failed to parse {model_name} response for {subject}: {e} ---")
+        return None
+    checked = [i for i, q in enumerate(annotated) if candidates is None or _has_labels(subject, q)]
+    if use_cache and cached is None and not annotation_problems(subject, [annotated[i] for i in checked],
+                                                                [questions[i] for i in checked]):
+        llm_cache.save_response(_cache_key(prompt_hash, provider), text, subject=subject, source=source,
+                                model=provider.name)
+    return annotated
+
+
+def annotate_narrowed(subject: str, questions: List[Dict[str, Any]], model_name: str = validation.PRO_MODEL,
+                      usage: Optional[Dict[str, int]] = None, source: Optional[str] = None, use_cache: bool = False,
+                      generation_slots=None, candidate_count: int = 0) -> Optional[List[Dict[str, Any]]]:
+    """
+    annotate_questions with only the syllabus entries among each question's top
+    `candidate_count` in place of the full list, for subjects with a "candidate_prompt".
+    Questions that fit none of them are asked again with the full syllabus.
+    """
+    if not candidate_count or "candidate_prompt" not in annotation_spec(subject):
+        return annotate_questions(subject, questions, model_name, usage, source, use_cache, generation_slots)
+    shortlist = syllabus_index.candidates(subject, questions, candidate_count)
+    annotated = annotate_questions(subject, questions, model_name, usage, source, use_cache, generation_slots,
+                                   shortlist)
+    if annotated is None:
+        return None
+    unplaced = [i for i, q in enumerate(annotated) if not _has_labels(subject, q)]
+    if unplaced:
+        print(f"⚠️  {source or subject}: {len(unplaced)} questions fit none of the shortlisted entries; "
+              f"asking again with the full syllabus")
+        full = annotate_questions(subject, [questions[i] for i in unplaced], model_name, usage, source, use_cache,
+                                  generation_slots)
+        if full is None:
+            return None
+        for i, q in zip(unplaced, full):
+            annotated[i] = q
+    return annotated
+
+
+def annotate_with_cascade(subject: str, questions: List[Dict[str, Any]], cascade: bool = False,
+                          usage: Optional[Dict[str, int]] = None, label: str = "", use_cache: bool = False,
+                          generation_slots=None, candidate_count: int = 0) -> Optional[List[Dict[str, Any]]]:
+    """With `cascade=True` the flash model goes first and pro only reruns output that fails validation."""
+    models = [validation.FAST_MODEL, validation.PRO_MODEL] if cascade else [validation.PRO_MODEL]
+    return validation.cascade(models,
+                              lambda model_name: annotate_narrowed(subject, questions, model_name, usage, label,
+                                                                   use_cache, generation_slots, candidate_count),
+                              lambda annotated: annotation_problems(subject, annotated, questions), label or subject)
+
+
+def annotate_in_chunks(subject: str, questions: List[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       cascade: bool = False, usage: Optional[Dict[str, int]] = None, label: str = "",
+                       use_cache: bool = True, generation_slots=None,
+                       candidate_count: int = 0) -> Optional[List[Dict[str, Any]]]:
+    """
+    Splits a paper into chunks of `chunk_size` questions and annotates them
+    concurrently; `generation_slots` bounds the calls in flight across papers.
+    A chunk that errors, can't be parsed or fails validation is retried on its
+    own (up to CHUNK_ATTEMPTS). Returns None if any chunk never produced output.
+    """
+    if not chunk_size or chunk_size >= len(questions):
+        return annotate_with_cascade(subject, questions, cascade, usage, label, use_cache, generation_slots,
+                                     candidate_count)
+    chunks = [questions[i:i + chunk_size] for i in range(0, len(questions), chunk_size)]
+
+    def run_chunk(index: int) -> Optional[List[Dict[str, Any]]]:
+        chunk = chunks[index]
+        chunk_label = f"{label} chunk {index + 1}/{len(chunks)}"
+        annotated = None
+        for attempt in range(1, CHUNK_ATTEMPTS + 1):
+            try:
+                result = annotate_with_cascade(subject, chunk, cascade, usage, chunk_label, use_cache, generation_slots,
+                                               candidate_count)
+            except Exception as e:
+                print(f"⚠️  {chunk_label} attempt {attempt}/{CHUNK_ATTEMPTS} failed: {e}")
+                continue
+            if result is None:
+                continue
+            annotated = result
+            problems = annotation_problems(subject, annotated, chunk)
+            if not problems:
+                break
+            print(f"⚠️  {chunk_label} attempt {attempt}/{CHUNK_ATTEMPTS}: {len(problems)} problems, e.g. {problems[0]}")
+        return annotated
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        results = list(executor.map(run_chunk, range(len(chunks))))
+    failed = [i + 1 for i, result in enumerate(results) if result is None]
+    if failed:
+        print(f"❌ {label or subject}: chunks {failed} of {len(chunks)} produced no usable output")
+        return None
+    return [q for result in results for q in result]
+
+
+def composition_labels(subject: str, questions: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    Labels by question index for the language papers' composition questions (essay,
+    letter, precis, ...): a question whose "type" contains one of the subject's
+    "composition_keywords" always gets its "composition_chapter".
+    """
+    spec = annotation_spec(subject)
+    if "composition_keywords" not in spec:
+        return {}
+    keywords = getattr(_annotator_module(subject), spec["composition_keywords"])
+    labels = {}
+    for i, q in enumerate(questions):
+        q_type = str(q.get("type") or "").lower()
+        if any(kw in q_type for kw in keywords):
+            labels[i] = {"chapter_name": spec["composition_chapter"]}
+    return labels
+
+
+def local_labels(subject: str, questions: List[Dict[str, Any]], local_precision: Optional[float] = None,
+                 reuse: bool = True, label: str = "") -> Dict[int, Dict[str, Any]]:
+    """
+    Labels decided without the LLM, by question index: composition questions by
+    their type, then copies from the same question in an earlier annotated year
+    (only the match kinds whose held-out agreement reaches `local_precision`, or
+    the classifier's default target), then the local classifier.
+    """
+    labels = composition_labels(subject, questions)
+    by_type = len(labels)
+    if reuse:
+        reused = label_index.reuse_labels(subject, [q for i, q in enumerate(questions) if i not in labels],
+                                          local_precision or chapter_classifier.DEFAULT_PRECISION)
+        rest = [i for i in range(len(questions)) if i not in labels]
+        labels.update({rest[j]: found for j, found in reused.items()})
+    reused = len(labels) - by_type
+    if local_precision is not None:
+        rest = [i for i in range(len(questions)) if i not in labels]
+        predicted = chapter_classifier.classify(subject, [questions[i] for i in rest], local_precision)
+        labels.update({rest[j]: found for j, found in predicted.items()})
+    if labels:
+        print(f"✓ {label or subject}: {by_type} questions labelled by type, {reused} reuse earlier labels, "
+              f"{len(labels) - by_type - reused} classified locally, {len(questions) - len(labels)} sent to the model")
+    return labels
+
+
+def combine_labels(questions: List[Dict[str, Any]], local: Dict[int, Dict[str, Any]],
+                   from_model: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Every question in its original order: `local` labels by index, the rest taken in turn from `from_model`."""
+    from_model = iter(from_model)
+    return [annotation_payload.insert_labels(q, local[i]) if i in local else next(from_model)
+            for i, q in enumerate(questions)]
+
+
+def annotate_paper(subject: str, questions: List[Dict[str, Any]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   cascade: bool = False, usage: Optional[Dict[str, int]] = None, label: str = "",
+                   use_cache: bool = True, generation_slots=None, local_precision: Optional[float] = None,
+                   reuse: bool = True, candidate_count: int = 0,
+                   known_labels: Optional[Dict[int, Dict[str, Any]]] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Labels what can be decided locally (see local_labels) and sends only the rest
+    to the model, in chunks. `known_labels` (by index, e.g. from delta_labels) are
+    kept as they are. Returns every question in its original order, or None if the
+    model's part failed.
+    """
+    local = dict(known_labels or {})
+    rest = [i for i in range(len(questions)) if i not in local]
+    found = local_labels(subject, [questions[i] for i in rest], local_precision, reuse, label)
+    local.update({rest[j]: labels for j, labels in found.items()})
+    remaining = [q for i, q in enumerate(questions) if i not in local]
+    from_model = annotate_in_chunks(subject, remaining, chunk_size, cascade, usage, label, use_cache,
+                                    generation_slots, candidate_count) if remaining else []
+    if from_model is None:
+        return None
+    return combine_labels(questions, local, from_model)
+
+
+def finalize_annotations(subject: str, annotated: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fills chapter_name from the chapter number where the model left it out and
+    moves the label fields to sit immediately after "type", as the annotators do.
+    """
+    fields = annotation_spec(subject)["fields"]
+    chapters = get_chapters(subject)
+    result = []
+    for q in annotated:
+        if not isinstance(q, dict):
+            result.append(q)
+            continue
+        if "chapter" in fields and q.get("chapter") is not None and "chapter_name" not in q:
+            try:
+                idx = int(q["chapter"]) - 1
+                if 0 <= idx < len(chapters):
+                    q["chapter_name"] = chapters[idx]
+            except (TypeError, ValueError):
+                pass
+        if "type" not in q or not all(field in q for field in fields):
+            result.append(q)
+            continue
+        new_q = {}
+        for k, v in q.items():
+            if k in fields:
+                continue
+            new_q[k] = v
+            if k == "type":
+                for field in fields:
+                    new_q[field] = q[field]
+        result.append(new_q)
+    return result
+
+
+def pending_files(subject: str) -> List[Tuple[pathlib.Path, pathlib.Path]]:
+    """(data file, annotated file) pairs for every extracted paper not yet annotated."""
+    pending = []
+    for fpath in sorted(data_folder(subject).glob("*.json")):
+        out_path = annotated_folder(subject) / fpath.name
+        if out_path.exists():
+            print(f"⏭️  Skipping {fpath.name} (already annotated)")
+            continue
+        pending.append((fpath, out_path))
+    return pending
+
+
+def syllabus(subject: str) -> Dict[str, Any]:
+    """The label lists annotations are checked against."""
+    spec = annotation_spec(subject)
+    topics = getattr(_annotator_module(subject), spec["topics"]) if "topics" in spec else []
+    return {"chapters": list(get_chapters(subject)), "extra_chapter_names": list(spec.get("extra_chapter_names", ())),
+            "topics": [list(topic) for topic in topics]}
+
+
+def syllabus_version(subject: str) -> str:
+    return llm_cache.sha256_text(json.dumps(syllabus(subject), ensure_ascii=False, sort_keys=True))[:12]
+
+
+def content_hash(q: Dict[str, Any]) -> str:
+    """Hash of the question content the model labels (annotation_payload.COMPACT_FIELDS, untruncated)."""
+    content = {field: q.get(field) for field in annotation_payload.COMPACT_FIELDS if q.get(field)}
+    return llm_cache.sha256_text(json.dumps(content, ensure_ascii=False, sort_keys=True))[:16]
+
+
+def provenance_path(out_path: pathlib.Path) -> pathlib.Path:
+    return out_path.parent / PROVENANCE_DIR / out_path.name
+
+
+def load_provenance(out_path: pathlib.Path) -> Optional[Dict[str, Any]]:
+    path = provenance_path(out_path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_annotations(subject: str, annotated: List[Dict[str, Any]], out_path: pathlib.Path,
+                     label_versions: Optional[Dict[str, Optional[str]]] = None) -> None:
+    """
+    Writes the annotated file and its provenance: every question's content hash and
+    the syllabus version its labels were made under - the current one, unless
+    `label_versions` ({payload id: version}) says a label was kept from an earlier run.
+    Repeated ids are told apart as in annotation_payload.payload_ids.
+    """
+    out_path.parent.mkdir(exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(finalize_annotations(subject, annotated), f, indent=4, ensure_ascii=False)
+    save_provenance(subject, annotated, out_path, label_versions)
+
+
+def save_provenance(subject: str, annotated: List[Dict[str, Any]], out_path: pathlib.Path,
+                    label_versions: Optional[Dict[str, Optional[str]]] = None) -> None:
+    version = syllabus_version(subject)
+    label_versions = label_versions or {}
+    path = provenance_path(out_path)
+    path.parent.mkdir(exist_ok=True)
+    annotated = [q for q in annotated if isinstance(q, dict)]
+    provenance = {"syllabus_version": version, "questions": {
+        qid: {"hash": content_hash(q), "syllabus_version": label_versions.get(qid, version)}
+        for q, qid in zip(annotated, annotation_payload.payload_ids(annotated))}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(provenance, f, indent=4, ensure_ascii=False)
+
+
+def delta_labels(subject: str, questions: List[Dict[str, Any]], out_path: pathlib.Path
+                 ) -> Tuple[Dict[int, Dict[str, Any]], Dict[str, Optional[str]], collections.Counter]:
+    """
+    For a paper that was annotated before: the labels (by question index) that are
+    still good, the syllabus version each was made under, and why the others must
+    be sent again ("new", "text changed", "label not in syllabus"). A label is still
+    good if the question's content hash is unchanged and the label was made under
+    the current syllabus or still validates against it. Files written before
+    provenance was kept are compared by the question text in the annotated file.
+    """
+    spec = annotation_spec(subject)
+    fields = spec["fields"]
+    chapters = get_chapters(subject)
+    topics = getattr(_annotator_module(subject), spec["topics"]) if "topics" in spec else None
+    version = syllabus_version(subject)
+    with open(out_path, 'r', encoding='utf-8') as f:
+        old_questions = [q for q in json.load(f) if isinstance(q, dict)]
+    annotated = dict(zip(annotation_payload.payload_ids(old_questions), old_questions))
+    provenance = (load_provenance(out_path) or {}).get("questions", {})
+
+    kept: Dict[int, Dict[str, Any]] = {}
+    versions: Dict[str, Optional[str]] = {}
+    stale = collections.Counter()
+    for i, (q, qid) in enumerate(zip(questions, annotation_payload.payload_ids(questions))):
+        old = annotated.get(qid)
+        if old is None:
+            stale["new"] += 1
+            continue
+        entry = provenance.get(qid)
+        if (entry["hash"] if entry else content_hash(old)) != content_hash(q):
+            stale["text changed"] += 1
+            continue
+        labels = {field: old[field] for field in fields if field in old}
+        old_version = entry["syllabus_version"] if entry else None
+        if len(labels) < len(fields) or (old_version != version and validation.annotation_problems(
+                [old], fields, chapters, topics, spec.get("extra_chapter_names", ()))):
+            stale["label not in syllabus"] += 1
+            continue
+        kept[i] = labels
+        versions[qid] = old_version
+    return kept, versions, stale
@@ -0,0 +1,81 @@
+import json
+from typing import Any, Dict, List
+
+# Annotation only needs enough of each question to classify it. The Hindi mirror
+# fields (prashna, vikalpa, anuprashna), answers and instructions are left out, and
+# the model returns {id: labels} instead of echoing every question back.
+# Extracted ids aren't always unique (eng_2019 has objective_1 twice), so a repeated id
+# is sent as "<id>#2", "<id>#3", ... in paper order (payload_ids) and matched back the same way.
+COMPACT_FIELDS = ("id", "type", "question", "options", "sub_questions")
+# Unseen passages and essays can run to thousands of characters; the opening is
+# enough to place them
+MAX_TEXT_CHARS = 1000
+
+
+def _truncate(text: Any) -> Any:
+    if isinstance(text, str) and len(text) > MAX_TEXT_CHARS:
+        return text[:MAX_TEXT_CHARS] + "…"
+    return text
+
+
+def payload_ids(questions: List[Any]) -> List[str]:
+    """Each question's id as a string, with repeats numbered so that every id is unique."""
+    seen: Dict[str, int] = {}
+    ids = []
+    for q in questions:
+        qid = str(q.get("id")) if isinstance(q, dict) else "None"
+        seen[qid] = seen.get(qid, 0) + 1
+        ids.append(qid if seen[qid] == 1 else f"{qid}#{seen[qid]}")
+    return ids
+
+
+def compact_questions(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The projection of each question that is sent for annotation."""
+    compact = []
+    for q, qid in zip(questions, payload_ids(questions)):
+        item = {field: q[field] for field in COMPACT_FIELDS if q.get(field)}
+        if "id" in item:
+            item["id"] = qid
+        if "question" in item:
+            item["question"] = _truncate(item["question"])
+        compact.append(item)
+    return compact
+
+
+def compact_json(questions: List[Dict[str, Any]]) -> str:
+    """compact_questions() as a JSON array with one question per line (no indentation)."""
+    lines = [json.dumps(q, ensure_ascii=False, separators=(",", ":")) for q in compact_questions(questions)]
+    return "[\n" + ",\n".join(lines) + "\n]"
+
+
+def merge_labels(questions: List[Dict[str, Any]], labels: Any) -> List[Dict[str, Any]]:
+    """
+    Joins the model's {id: {field: value}} answer (keyed by payload_ids) into copies of the original
+    questions, inserting the new fields immediately after "type". A full annotated
+    array (the old response format) is accepted too; only its new fields are taken.
+    Questions the model skipped are returned unlabelled so validation can flag them.
+    """
+    if isinstance(labels, list):
+        items = [item for item in labels if isinstance(item, dict)]
+        labels = dict(zip(payload_ids(items), items))
+    if not isinstance(labels, dict):
+        raise ValueError("expected a JSON object mapping question ids to their labels")
+
+    merged = []
+    for q, qid in zip(questions, payload_ids(questions)):
+        label = labels.get(qid)
+        merged.append(insert_labels(q, label if isinstance(label, dict) else {}))
+    return merged
+
+
+def insert_labels(q: Dict[str, Any], labels: Dict[str, Any]) -> Dict[str, Any]:
+    """A copy of `q` with the label fields it doesn't have yet inserted after "type"."""
+    new_fields = {k: v for k, v in labels.items() if k not in q}
+    if "type" not in q:
+        return {**q, **new_fields}
+    new_q = {}
+    for k, v in q.items():
+        new_q[k] = v
+        if k == "type":
+            new_q.update(new_fields)
+    return new_q
@@ -1,10 +1,10 @@
-import os
-import google.generativeai as genai
+import annotation_payload
+import llm_backend
+import telemetry
 import json
 import pathlib
 import textwrap
 import re
-from dotenv import load_dotenv
 
 def clean_json_response(raw_text: str) -> str:
     match = re.search(r'```json\s*([\s\S]*?)\s*```', raw_text, re.DOTALL)
@@ -39,26 +39,30 @@ ENGLISH_CHAPTERS = [
     "Memories of Childhood"
 ]
 
+# Question types that never belong to a textbook chapter; annotation_engine labels
+# them "General" without asking the model
+COMPOSITION_KEYWORDS = ["essay", "letter", "precis", "comprehension", "passage", "grammar", "translate", "translation"]
+
 def generate_english_annotation_prompt(chapters, questions):
     chapter_lines = [f"{ch}" for ch in chapters]
     prompt = textwrap.dedent(f"""
     You are an expert in educational content classification.
     You will receive a JSON array of questions from a Bihar Board Class 12 English question paper.
     Your task is to annotate each question with the correct chapter name from the official NCERT Class 12 English chapters below.
-    - Insert the field "chapter_name": "<name>" immediately after the "type" field in each question object.
+    - Label each question with "chapter_name": "<name>".
     - Only use the exact chapter names from the list below.
     - If a question does not belong to any specific chapter (e.g., Grammar, Unseen Passage, Essay, Letter), set "chapter_name" to "General".
-    - Output the result as a JSON array, with the new fields added to each question.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter_name": "<name>"}}}}. Do not repeat the questions.
 
     Chapters:
     {chr(10).join(chapter_lines)}
 
     Here is the input JSON array of questions:
     ```json
-    {json.dumps(questions, ensure_ascii=False, indent=2)}
+    {annotation_payload.compact_json(questions)}
     ```
 
-    Output only the annotated JSON array.
+    Output only the JSON object of labels.
     """)
     return prompt
 
@@ -72,8 +76,9 @@ def main():
     if not files:
         print(f"No JSON files found in english_data/!")
         return
+    import annotation_engine
     chapters = ENGLISH_CHAPTERS
-    model = genai.GenerativeModel(model_name="models/gemini-2.5-pro")
+    model = llm_backend.GenerativeModel(model_name="models/gemini-2.5-pro")
     for fpath in files:
         out_path = out_folder / fpath.name
         if out_path.exists():
@@ -83,20 +88,30 @@ def main():
         print(f"\nProcessing: {fpath.name}")
         with open(fpath, 'r', encoding='utf-8') as f:
             questions = json.load(f)
-        prompt = generate_english_annotation_prompt(chapters, questions)
-        print("Sending questions to Gemini for annotation...")
-        response = model.generate_content(prompt)
-        print("Gemini response received. Parsing...")
-        try:
-            cleaned_json_string = clean_json_response(response.text)
-            annotated = json.loads(cleaned_json_string)
-        except Exception as e:
-            print(f"\n--- ERROR: Failed to parse Gemini's response for {fpath.name}. ---")
-            print(f"Error details: {e}")
-            print("\n--- Raw Model Response: ---")
-            print(response.text)
-            print("\n--------------------------")
-            continue
+        # Essays, letters, precis etc. are "General" by their type alone
+        local = annotation_engine.composition_labels("english", questions)
+        to_annotate = [q for i, q in enumerate(questions) if i not in local]
+        print(f"{len(local)} composition questions labelled by type, {len(to_annotate)} left for Gemini")
+        annotated = []
+        if to_annotate:
+            prompt = generate_english_annotation_prompt(chapters, to_annotate)
+            print("Sending questions to Gemini for annotation...")
+            with telemetry.track("annotate", model.model_name, source=str(fpath), questions=len(to_annotate)) as call:
+                response = model.generate_content(prompt)
+                call.usage(response)
+            print("Gemini response received. Parsing...")
+            try:
+                cleaned_json_string = clean_json_response(response.text)
+                annotated = json.loads(cleaned_json_string)
+                annotated = annotation_payload.merge_labels(to_annotate, annotated)
+            except Exception as e:
+                print(f"\n--- ERROR: Failed to parse Gemini's response for {fpath.name}. ---")
+                print(f"Error details: {e}")
+                print("\n--- Raw Model Response: ---")
+                print(response.text)
+                print("\n--------------------------")
+                continue
+        annotated = annotation_engine.combine_labels(questions, local, annotated)
         # Reorder fields
         for i, q in enumerate(annotated):
             if "type" in q and "chapter_name" in q:
@@ -111,9 +126,4 @@ def main():
         print(f"✓ Annotated data saved to: {out_path}")
 
 if __name__ == "__main__":
-    load_dotenv()
-    GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
-    if not GOOGLE_API_KEY:
-        raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
-    genai.configure(api_key=GOOGLE_API_KEY)
     main()
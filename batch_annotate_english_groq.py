@@ -4,8 +4,9 @@ import pathlib
 import textwrap
 import re
 import time
-from dotenv import load_dotenv
-from groq import Groq
+import annotation_payload
+import llm_backend
+import telemetry
 
 def clean_json_response(raw_text: str) -> str:
     match = re.search(r'```json\s*([\s\S]*?)\s*```', raw_text, re.DOTALL)
@@ -46,20 +47,20 @@ def generate_english_annotation_prompt(chapters, questions):
     You are an expert in educational content classification.
     You will receive a JSON array of questions from a Bihar Board Class 12 English question paper.
     Your task is to annotate each question with the correct chapter name from the official NCERT Class 12 English chapters below.
-    - Insert the field "chapter_name": "<name>" immediately after the "type" field in each question object.
+    - Label each question with "chapter_name": "<name>".
     - Only use the exact chapter names from the list below.
     - If a question does not belong to any specific chapter (e.g., Grammar, Unseen Passage, Essay, Letter), set "chapter_name" to "General".
-    - Output the result as a JSON array, with the new fields added to each question.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter_name": "<name>"}}}}. Do not repeat the questions.
 
     Chapters:
     {chr(10).join(chapter_lines)}
 
     Here is the input JSON array of questions:
     ```json
-    {json.dumps(questions, ensure_ascii=False, indent=2)}
+    {annotation_payload.compact_json(questions)}
     ```
 
-    Output only the annotated JSON array.
+    Output only the JSON object of labels.
     """)
     return prompt
 
@@ -67,13 +68,18 @@ def main():
     print("Batch English Question Annotator (Groq)")
     print("="*40)
     
-    load_dotenv()
-    GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
-    if not GROQ_API_KEY:
-        print("Error: GROQ_API_KEY not found in environment variables.")
-        return
+    # Replayed runs (LLM_BACKEND=replay) need no key and no client
+    client = None
+    if not llm_backend.replaying():
+        from dotenv import load_dotenv
+        from groq import Groq
+        load_dotenv()
+        GROQ_API_KEY = os.environ.get('GROQ_API_KEY')
+        if not GROQ_API_KEY:
+            print("Error: GROQ_API_KEY not found in environment variables.")
+            return
 
-    client = Groq(api_key=GROQ_API_KEY)
+        client = Groq(api_key=GROQ_API_KEY)
 
     data_folder = pathlib.Path("english_data")
     out_folder = pathlib.Path("english_data_annotated")
@@ -84,6 +90,7 @@ def main():
         print(f"No JSON files found in english_data/!")
         return
         
+    import annotation_engine
     chapters = ENGLISH_CHAPTERS
     
     for fpath in files:
@@ -105,18 +112,23 @@ def main():
         with open(fpath, 'r', encoding='utf-8') as f:
             questions = json.load(f)
         
+        # Essays, letters, precis etc. are labelled by their type alone
+        local = annotation_engine.composition_labels("english", questions)
+        to_annotate = [q for i, q in enumerate(questions) if i not in local]
+        print(f"{len(local)} composition questions labelled by type")
+        
         # Split into chunks to avoid rate limits (10k TPM limit)
         CHUNK_SIZE = 10  # Process 10 questions at a time
-        total_chunks = (len(questions) + CHUNK_SIZE - 1) // CHUNK_SIZE
+        total_chunks = (len(to_annotate) + CHUNK_SIZE - 1) // CHUNK_SIZE
         
-        print(f"Total questions: {len(questions)}, splitting into {total_chunks} chunks")
+        print(f"Total questions: {len(to_annotate)}, splitting into {total_chunks} chunks")
         
         all_annotated = []
         
         for chunk_idx in range(total_chunks):
             start_idx = chunk_idx * CHUNK_SIZE
-            end_idx = min(start_idx + CHUNK_SIZE, len(questions))
-            chunk_questions = questions[start_idx:end_idx]
+            end_idx = min(start_idx + CHUNK_SIZE, len(to_annotate))
+            chunk_questions = to_annotate[start_idx:end_idx]
             
             print(f"\n[Chunk {chunk_idx + 1}/{total_chunks}] Processing questions {start_idx + 1}-{end_idx}")
             
@@ -131,31 +143,40 @@ def main():
                 try:
                     print("Sending to Groq (Moonshot Kimi)...")
                     
-                    completion = client.chat.completions.create(
-                        model="moonshotai/kimi-k2-instruct-0905",
-                        messages=[
-                          {
-                            "role": "user",
-                            "content": prompt
-                          }
-                        ],
-                        temperature=1.0,
-                        max_tokens=16384,  # Maximum allowed by this model 
-                        top_p=1,
-                        stream=True,
-                        stop=None
-                    )
+                    with telemetry.track("annotate", "moonshotai/kimi-k2-instruct-0905", provider="groq",
+                                         source=str(fpath), questions=len(chunk_questions), retries=attempt,
+                                         chunk=chunk_idx + 1) as call:
+                        completion = llm_backend.groq_stream(
+                            client,
+                            model="moonshotai/kimi-k2-instruct-0905",
+                            messages=[
+                              {
+                                "role": "user",
+                                "content": prompt
+                              }
+                            ],
+                            temperature=1.0,
+                            max_tokens=16384,  # Maximum allowed by this model 
+                            top_p=1,
+                            stream=True,
+                            stop=None
+                        )
 
-                    full_response = ""
-                    for chunk in completion:
-                        content = chunk.choices[0].delta.content or ""
-                        full_response += content
-                        print(content, end="", flush=True)
+                        full_response = ""
+                        for chunk in completion:
+                            content = chunk.choices[0].delta.content or ""
+                            full_response += content
+                            print(content, end="", flush=True)
+                            # Groq reports token usage on the last chunk of a stream
+                            x_groq = getattr(chunk, "x_groq", None)
+                            if getattr(x_groq, "usage", None):
+                                call.usage(x_groq.usage)
                     print()
                     
                     print("Response received. Parsing...")
                     cleaned_json_string = clean_json_response(full_response)
                     annotated_chunk = json.loads(cleaned_json_string)
+                    annotated_chunk = annotation_payload.merge_labels(chunk_questions, annotated_chunk)
                     break # Success
                     
                 except Exception as e:
@@ -170,16 +191,14 @@ def main():
             if annotated_chunk:
                 all_annotated.extend(annotated_chunk)
                 print(f"✓ Chunk {chunk_idx + 1} processed successfully")
-                # Add delay between chunks to respect rate limits
-                if chunk_idx < total_chunks - 1:
-                    print("Waiting 10 seconds before next chunk...")
-                    time.sleep(10)
+                # No fixed pause between chunks: llm_backend paces calls to the model's TPM budget
             else:
                 print(f"⚠️ Skipping {fpath.name} due to errors")
                 all_annotated = None
                 break
         
-        if all_annotated and len(all_annotated) == len(questions):
+        if all_annotated is not None and len(all_annotated) == len(to_annotate):
+            all_annotated = annotation_engine.combine_labels(questions, local, all_annotated)
             print(f"\n✅ Successfully processed all {len(all_annotated)} questions")
             # Reorder fields
             for i, q in enumerate(all_annotated):
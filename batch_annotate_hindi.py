@@ -1,10 +1,10 @@
-import os
-import google.generativeai as genai
+import annotation_payload
+import llm_backend
+import telemetry
 import json
 import pathlib
 import textwrap
 import re
-from dotenv import load_dotenv
 
 def clean_json_response(raw_text: str) -> str:
     match = re.search(r'```json\s*([\s\S]*?)\s*```', raw_text, re.DOTALL)
@@ -52,6 +52,14 @@ HINDI_CHAPTERS = [
     "Vyakaran"
 ]
 
+# Question types that are language skills rather than a textbook chapter; annotation_engine
+# labels them "Vyakaran" without asking the model ("summary" is left out: it usually asks
+# for the saaransh of a textbook chapter)
+COMPOSITION_KEYWORDS = [
+    "nibandh", "essay", "letter", "patra", "sankshepan", "precis", "gadyansh", "passage",
+    "comprehension", "anuvad", "translate", "vyakaran", "grammar"
+]
+
 def generate_hindi_annotation_prompt(chapters, questions):
     chapter_lines = [f"{ch}" for ch in chapters]
     prompt = textwrap.dedent(f"""
@@ -64,19 +72,19 @@ def generate_hindi_annotation_prompt(chapters, questions):
     2. **Grammar Questions**: Map ALL grammar-related questions (Sandhi, Samas, Upsarg, Pratyay, Ling, Vachan, Karak, etc.) to the chapter "Vyakaran".
     3. **General Questions**: Essay (Nibandh), Letter Writing (Patra Lekhan), Comprehension (Gadyansh), Translation (Anuvad), etc., if they don't fit a specific book chapter, should also be mapped to "Vyakaran" or effectively categorized. For now, use "Vyakaran" for all general language skills unless it's a specific book chapter.
 
-    - Insert the field "chapter_name": "<name>" immediately after the "type" field in each question object.
+    - Label each question with "chapter_name": "<name>".
     - Only use the exact chapter names from the list below.
-    - Output the result as a JSON array, with the new fields added to each question.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter_name": "<name>"}}}}. Do not repeat the questions.
 
     Chapters:
     {chr(10).join(chapter_lines)}
 
     Here is the input JSON array of questions:
     ```json
-    {json.dumps(questions, ensure_ascii=False, indent=2)}
+    {annotation_payload.compact_json(questions)}
     ```
 
-    Output only the annotated JSON array.
+    Output only the JSON object of labels.
     """)
     return prompt
 
@@ -90,9 +98,10 @@ def main():
     if not files:
         print(f"No JSON files found in hindi_data/!")
         return
+    import annotation_engine
     chapters = HINDI_CHAPTERS
     # Using 1.5 Pro to ensure high quality with large context if needed, or stick to what history uses.
-    model = genai.GenerativeModel(model_name="models/gemini-2.5-pro")
+    model = llm_backend.GenerativeModel(model_name="models/gemini-2.5-pro")
     
     for fpath in files:
         out_path = out_folder / fpath.name
@@ -107,17 +116,26 @@ def main():
         # Batching strategies for large files to avoid token limits if necessary
         # For now, assuming file fits in context window of 1.5 Pro
         
-        prompt = generate_hindi_annotation_prompt(chapters, questions)
-        print("Sending questions to Gemini for annotation...")
+        # Nibandh, patra, gadyansh etc. are "Vyakaran" by their type alone
+        local = annotation_engine.composition_labels("hindi", questions)
+        to_annotate = [q for i, q in enumerate(questions) if i not in local]
+        print(f"{len(local)} composition questions labelled by type, {len(to_annotate)} left for Gemini")
+        prompt = generate_hindi_annotation_prompt(chapters, to_annotate)
+        if to_annotate:
+            print("Sending questions to Gemini for annotation...")
         
         # Adding retry logic for robustness
-        retries = 3
+        retries = 3 if to_annotate else 0
+        annotated = []
         while retries > 0:
             try:
-                response = model.generate_content(prompt)
+                with telemetry.track("annotate", model.model_name, source=str(fpath), questions=len(to_annotate), retries=3 - retries) as call:
+                    response = model.generate_content(prompt)
+                    call.usage(response)
                 print("Gemini response received. Parsing...")
                 cleaned_json_string = clean_json_response(response.text)
                 annotated = json.loads(cleaned_json_string)
+                annotated = annotation_payload.merge_labels(to_annotate, annotated)
                 break
             except Exception as e:
                 print(f"Error: {e}. Retrying... ({retries} left)")
@@ -126,7 +144,8 @@ def main():
                     print(f"❌ Failed to annotate {fpath.name}")
                     annotated = None
 
-        if annotated:
+        if annotated is not None:
+            annotated = annotation_engine.combine_labels(questions, local, annotated)
              # Reorder fields
             for i, q in enumerate(annotated):
                 if "type" in q and "chapter_name" in q:
@@ -142,9 +161,4 @@ def main():
             print(f"✓ Annotated data saved to: {out_path}")
 
 if __name__ == "__main__":
-    load_dotenv()
-    GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
-    if not GOOGLE_API_KEY:
-        raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
-    genai.configure(api_key=GOOGLE_API_KEY)
     main()
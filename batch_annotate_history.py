@@ -1,10 +1,10 @@
-import os
-import google.generativeai as genai
+import annotation_payload
+import llm_backend
+import telemetry
 import json
 import pathlib
 import textwrap
 import re
-from dotenv import load_dotenv
 
 def clean_json_response(raw_text: str) -> str:
     match = re.search(r'```json\s*([\s\S]*?)\s*```', raw_text, re.DOTALL)
@@ -41,19 +41,19 @@ def generate_history_annotation_prompt(chapters, questions):
     You are an expert in educational content classification.
     You will receive a JSON array of questions from a Class 12 History question paper.
     Your task is to annotate each question with the correct chapter name from the official NCERT Class 12 History chapters below.
-    - Insert the fields "chapter_name": "<name>" immediately after the "type" field in each question object.
+    - Label each question with "chapter_name": "<name>".
     - Only use the exact chapter names from the list below.
-    - Output the result as a JSON array, with the new fields added to each question.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter_name": "<name>"}}}}. Do not repeat the questions.
 
     Chapters:
     {chr(10).join(chapter_lines)}
 
     Here is the input JSON array of questions:
     ```json
-    {json.dumps(questions, ensure_ascii=False, indent=2)}
+    {annotation_payload.compact_json(questions)}
     ```
 
-    Output only the annotated JSON array.
+    Output only the JSON object of labels.
     """)
     return prompt
 
@@ -68,7 +68,7 @@ def main():
         print(f"No JSON files found in history_data/!")
         return
     chapters = HISTORY_CHAPTERS
-    model = genai.GenerativeModel(model_name="models/gemini-2.5-pro")
+    model = llm_backend.GenerativeModel(model_name="models/gemini-2.5-pro")
     for fpath in files:
         out_path = out_folder / fpath.name
         if out_path.exists():
@@ -80,11 +80,14 @@ def main():
             questions = json.load(f)
         prompt = generate_history_annotation_prompt(chapters, questions)
         print("Sending questions to Gemini for annotation...")
-        response = model.generate_content(prompt)
+        with telemetry.track("annotate", model.model_name, source=str(fpath), questions=len(questions)) as call:
+            response = model.generate_content(prompt)
+            call.usage(response)
         print("Gemini response received. Parsing...")
         try:
             cleaned_json_string = clean_json_response(response.text)
             annotated = json.loads(cleaned_json_string)
+            annotated = annotation_payload.merge_labels(questions, annotated)
         except Exception as e:
             print(f"\n--- ERROR: Failed to parse Gemini's response for {fpath.name}. ---")
             print(f"Error details: {e}")
@@ -106,9 +109,4 @@ def main():
         print(f"✓ Annotated data saved to: {out_path}")
 
 if __name__ == "__main__":
-    load_dotenv()
-    GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
-    if not GOOGLE_API_KEY:
-        raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
-    genai.configure(api_key=GOOGLE_API_KEY)
     main()
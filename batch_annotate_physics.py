@@ -1,5 +1,6 @@
-import os
-import google.generativeai as genai
+import annotation_payload
+import llm_backend
+import telemetry
 import json
 import pathlib
 import textwrap
@@ -57,9 +58,9 @@ def generate_physics_annotation_prompt(chapters, topics, questions):
     - The correct chapter number and chapter name (from the official list below)
     - The correct topic number and topic name (from the official topic breakdown below)
     - Each question must be mapped to one and only one topic and chapter.
-    - Insert the fields "chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>" immediately after the "type" field in each question object.
+    - Label each question with "chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>".
     - Only use the chapter and topic numbers/names from the lists below.
-    - Output the result as a JSON array, with the new fields added to each question.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>"}}}}. Do not repeat the questions.
 
     Chapters:
     {chr(10).join(chapter_lines)}
@@ -69,10 +70,45 @@ def generate_physics_annotation_prompt(chapters, topics, questions):
 
     Here is the input JSON array of questions:
     ```json
-    {json.dumps(questions, ensure_ascii=False, indent=2)}
+    {annotation_payload.compact_json(questions)}
     ```
 
-    Output only the annotated JSON array.
+    Output only the JSON object of labels.
+    """)
+    return prompt
+
+def generate_physics_candidate_prompt(chapters, candidates, questions):
+    """
+    Like generate_physics_annotation_prompt, but lists only the topics shortlisted for
+    these questions ({id: [(chapter, chapter_name, topic, topic_name)]}).
+    """
+    chapter_lines = [f"{i+1}. {ch}" for i, ch in enumerate(chapters)]
+    shortlisted = {topic for entries in candidates.values() for _, _, topic, _ in entries}
+    topic_lines = [f"{num} {name}" for num, name in PHYSICS_TOPICS if num in shortlisted]
+    prompt = textwrap.dedent(f"""
+    You are an expert in educational content classification.
+    You will receive a JSON array of questions from a Class 12 Physics question paper.
+    Your task is to annotate each question with:
+    - The correct chapter number and chapter name (from the official list below)
+    - The correct topic number and topic name (from the shortlisted topics below)
+    - Each question must be mapped to one and only one topic and chapter.
+    - Label each question with "chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>".
+    - Only use the chapter and topic numbers/names from the lists below.
+    - If none of the shortlisted topics fits a question, map its id to null instead of guessing.
+    - Output a JSON object that maps each question's "id" to an object with only these fields, e.g. {{"<id>": {{"chapter": "<number>", "chapter_name": "<name>", "topic": "<number>", "topic_name": "<name>"}}}}. Do not repeat the questions.
+
+    Chapters:
+    {chr(10).join(chapter_lines)}
+
+    Shortlisted topics:
+    {chr(10).join(topic_lines)}
+
+    Here is the input JSON array of questions:
+    ```json
+    {annotation_payload.compact_json(questions)}
+    ```
+
+    Output only the JSON object of labels.
     """)
     return prompt
 
@@ -88,7 +124,7 @@ def main():
         return
     chapters = PHYSICS_CHAPTERS
     topics = PHYSICS_TOPICS
-    model = genai.GenerativeModel(model_name="models/gemini-2.5-pro")
+    model = llm_backend.GenerativeModel(model_name="models/gemini-2.5-pro")
     for fpath in files:
         out_path = out_folder / fpath.name
         if out_path.exists():
@@ -100,11 +136,14 @@ def main():
             questions = json.load(f)
         prompt = generate_physics_annotation_prompt(chapters, topics, questions)
         print("Sending questions to Gemini for annotation...")
-        response = model.generate_content(prompt)
+        with telemetry.track("annotate", model.model_name, source=str(fpath), questions=len(questions)) as call:
+            response = model.generate_content(prompt)
+            call.usage(response)
         print("Gemini response received. Parsing...")
         try:
             cleaned_json_string = clean_json_response(response.text)
             annotated = json.loads(cleaned_json_string)
+            annotated = annotation_payload.merge_labels(questions, annotated)
         except Exception as e:
             print(f"\n--- ERROR: Failed to parse Gemini's response for {fpath.name}. ---")
             print(f"Error details: {e}")
@@ -130,10 +169,4 @@ def main():
         print(f"✓ Annotated data saved to: {out_path}")
 
 if __name__ == "__main__":
-    from dotenv import load_dotenv
-    load_dotenv()
-    GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
-    if not GOOGLE_API_KEY:
-        raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
-    genai.configure(api_key=GOOGLE_API_KEY)
     main()
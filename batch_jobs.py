@@ -0,0 +1,174 @@
+import argparse
+import importlib
+import json
+import pathlib
+import re
+
+import annotation_payload
+import job_ledger
+import llm_backend
+from subjects import SUBJECTS, annotated_folder, data_folder, data_path, find_paper, resolve_subjects
+
+# Batch request/result files live here (the repo root requests.jsonl is something else)
+BATCH_DIR = pathlib.Path("batch_jobs")
+
+
+def clean_json_response(raw_text: str) -> str:
+    """
+    Cleans the raw text response from the model to extract a valid JSON string.
+    """
+    match = re.search(r"```json\s*([\[{].*[\]}])\s*```", raw_text, re.DOTALL)
+    if match:
+        return match.group(1)
+    return raw_text.strip()
+
+
+def batch_line(key, parts):
+    """One request in the Gemini Batch API JSONL input format."""
+    return {"key": key, "request": {"contents": [{"role": "user", "parts": parts}]}}
+
+
+def extraction_requests(subjects, years=None):
+    """Uploads every pending paper and yields a batch request for it."""
+    for subject in subjects:
+        module_name, _ = SUBJECTS[subject]["extractor"]
+        for year in years or SUBJECTS[subject]["years"]:
+            input_pdf = find_paper(subject, year)
+            if input_pdf is None:
+                continue
+            if data_path(subject, year).exists():
+                print(f"⏭️  Skipping {input_pdf.name} (already processed)")
+                continue
+            module = importlib.import_module(module_name)
+            # Uploaded files expire after 48 hours, so submit the batch soon after emitting it
+            uploaded_file = llm_backend.upload_file(path=input_pdf, display_name=input_pdf.name)
+            print(f"✓ Uploaded {input_pdf.name}: {uploaded_file.uri}")
+            yield batch_line(f"extract:{subject}:{year}", module.generate_extraction_prompt(uploaded_file.uri))
+
+
+def annotation_requests(subjects):
+    """Yields a batch request for every extracted paper that is not annotated yet."""
+    import annotation_engine
+    for subject in subjects:
+        for fpath, _ in annotation_engine.pending_files(subject):
+            with open(fpath, 'r', encoding='utf-8') as f:
+                questions = json.load(f)
+            prompt = annotation_engine.build_prompt(subject, questions)
+            yield batch_line(f"annotate:{subject}:{fpath.name}", [{"text": prompt}])
+
+
+def emit(stage, subjects, years, output_path):
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    requests = extraction_requests(subjects, years) if stage == "extract" else annotation_requests(subjects)
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for line in requests:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    if count:
+        print(f"\n✓ Wrote {count} {stage} requests to {output_path}")
+    else:
+        output_path.unlink()
+        print("Nothing to do - no pending work for the selected subjects.")
+
+
+def response_text(result):
+    """Joins the text parts of the first candidate of a batch result line, or None."""
+    candidates = (result.get("response") or {}).get("candidates") or []
+    if not candidates:
+        return None
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    text = "".join(part.get("text", "") for part in parts if not part.get("thought"))
+    return text or None
+
+
+def batch_usage(result):
+    metadata = (result.get("response") or {}).get("usageMetadata") or {}
+    return {"input_tokens": metadata.get("promptTokenCount", 0),
+            "output_tokens": metadata.get("candidatesTokenCount", 0)}
+
+
+def ingest_result(result):
+    """Writes the output file for one batch result line. Returns True on success."""
+    key = result.get("key", "")
+    stage, subject, target = key.split(":", 2)
+    year = int(target) if stage == "extract" else int(re.search(r"\d{4}", target).group())
+    text = response_text(result)
+    if text is None:
+        error = result.get("error") or result.get("status") or "no candidates in response"
+        print(f"❌ {key}: {error}")
+        job_ledger.finish(subject, year, stage, usage=batch_usage(result), error=str(error))
+        return False
+    try:
+        data = json.loads(clean_json_response(text))
+    except json.JSONDecodeError as e:
+        print(f"❌ {key}: could not parse response as JSON ({e})")
+        job_ledger.finish(subject, year, stage, usage=batch_usage(result), error=f"Invalid JSON: {e}")
+        return False
+
+    if stage == "extract":
+        out_path = data_path(subject, int(target))
+        out_path.parent.mkdir(exist_ok=True)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+    elif stage == "annotate":
+        import annotation_engine
+        out_path = annotated_folder(subject) / target
+        with open(data_folder(subject) / target, 'r', encoding='utf-8') as f:
+            questions = json.load(f)
+        annotation_engine.save_annotations(subject, annotation_payload.merge_labels(questions, data), out_path)
+    else:
+        print(f"❌ {key}: unknown stage '{stage}'")
+        return False
+    job_ledger.finish(subject, year, stage, usage=batch_usage(result))
+    print(f"✓ {key} -> {out_path}")
+    return True
+
+
+def ingest(results_path):
+    ok, failed = 0, []
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            try:
+                success = ingest_result(result)
+            except (KeyError, ValueError) as e:
+                print(f"❌ {result.get('key')}: {e}")
+                success = False
+            if success:
+                ok += 1
+            else:
+                failed.append(result.get("key"))
+    print(f"\n✓  Ingested: {ok}/{ok + len(failed)}")
+    if failed:
+        print("Failed (re-emit to retry):")
+        for key in failed:
+            print(f"  - {key}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline batch mode: emit pending extraction/annotation work as a "
+                                                 "Gemini Batch API JSONL file, then ingest the results file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    emit_parser = sub.add_parser("emit", help="Write pending work as batch requests")
+    emit_parser.add_argument("stage", choices=["extract", "annotate"])
+    emit_parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    emit_parser.add_argument("--years", type=int, nargs="+", help="Only these years (extract stage)")
+    emit_parser.add_argument("--output", type=pathlib.Path, help="Output JSONL (default: batch_jobs/<stage>_requests.jsonl)")
+
+    ingest_parser = sub.add_parser("ingest", help="Write data files from a batch results JSONL")
+    ingest_parser.add_argument("results", type=pathlib.Path)
+
+    args = parser.parse_args()
+    if args.command == "emit":
+        output = args.output or BATCH_DIR / f"{args.stage}_requests.jsonl"
+        emit(args.stage, resolve_subjects(args.subjects), args.years, output)
+    else:
+        ingest(args.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,6 @@
 import time
 from process_english_paper import process_question_paper
 import pathlib
-from dotenv import load_dotenv
-
-# Load key from .env
-load_dotenv()
 
 def main():
     # List of years to process (2021-2026)
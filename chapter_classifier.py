@@ -0,0 +1,199 @@
+# Offline chapter (and physics topic) classifier trained on the labels already in
+# {subject}_data_annotated/. Each question's English and Hindi text is turned into
+# TF-IDF weighted character n-grams and compared with one centroid per label; the
+# margin between the best and second-best centroid is the confidence.
+# The confidence threshold is calibrated per subject by cross-validating over years,
+# so only predictions at least as precise as `precision` are used. A subject whose
+# labels can't reach it (e.g. the dummy-annotated languages) is left entirely to the LLM.
+import argparse
+import collections
+import math
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from subjects import SUBJECTS, resolve_subjects
+
+NGRAM_RANGE = (3, 5)
+DEFAULT_PRECISION = 0.95
+CALIBRATION_FOLDS = 3
+# Margins tried during calibration, lowest (most coverage) first
+CANDIDATE_THRESHOLDS = [0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3]
+# Fewer calibration predictions than this above a threshold is not evidence enough
+MIN_SUPPORT = 20
+
+Label = Tuple[str, ...]
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text)).strip()
+
+
+def question_text(q: Dict[str, Any]) -> str:
+    """Question and prashna, plus English options and sub-questions."""
+    parts = [q.get("question"), q.get("prashna")]
+    for field in ("options", "sub_questions"):
+        if isinstance(q.get(field), dict):
+            parts.extend(q[field].values())
+    return normalize_text(" ".join(p for p in parts if isinstance(p, str)))
+
+
+def _ngrams(text: str) -> collections.Counter:
+    padded = f" {text} "
+    grams = collections.Counter()
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+def _normalized(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(x * x for x in vector.values())) or 1.0
+    return {g: x / norm for g, x in vector.items()}
+
+
+class CentroidClassifier:
+    def __init__(self, fields: Sequence[str]):
+        self.fields = list(fields)
+        self.idf: Dict[str, float] = {}
+        # n-gram -> [(label, centroid weight)]
+        self.index: Dict[str, List[Tuple[Label, float]]] = {}
+        self.threshold: Optional[float] = None
+
+    def _vector(self, text: str) -> Dict[str, float]:
+        return _normalized({g: (1 + math.log(c)) * self.idf[g] for g, c in _ngrams(text).items() if g in self.idf})
+
+    def fit(self, examples: Sequence[Tuple[str, Label]]) -> "CentroidClassifier":
+        df = collections.Counter()
+        grams = [_ngrams(text) for text, _ in examples]
+        for g in grams:
+            df.update(g.keys())
+        self.idf = {g: math.log((1 + len(examples)) / (1 + d)) + 1 for g, d in df.items()}
+        centroids: Dict[Label, collections.Counter] = collections.defaultdict(collections.Counter)
+        for (text, label) in examples:
+            centroids[label].update(self._vector(text))
+        self.index = collections.defaultdict(list)
+        for label, centroid in centroids.items():
+            for g, x in _normalized(centroid).items():
+                self.index[g].append((label, x))
+        return self
+
+    def score(self, text: str) -> Tuple[Optional[Label], float]:
+        """(best label, margin over the runner-up)"""
+        scores: Dict[Label, float] = collections.defaultdict(float)
+        for g, x in self._vector(text).items():
+            for label, w in self.index.get(g, ()):
+                scores[label] += x * w
+        if not scores:
+            return None, 0.0
+        ranked = sorted(scores.values(), reverse=True)
+        best = max(scores, key=scores.get)
+        return best, ranked[0] - (ranked[1] if len(ranked) > 1 else 0.0)
+
+    def predict(self, q: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """The labels for `q` if the classifier is calibrated and confident enough, else None."""
+        if self.threshold is None:
+            return None
+        label, margin = self.score(question_text(q))
+        if label is None or margin < self.threshold:
+            return None
+        return dict(zip(self.fields, label))
+
+
+def training_examples(subject: str) -> List[Tuple[Optional[int], str, Label]]:
+    """(year, text, label) for every annotated question whose labels pass validation."""
+    import annotation_engine
+    examples = []
+    for year, q, label in annotation_engine.labelled_questions(subject):
+        text = question_text(q)
+        if text:
+            examples.append((year, text, label))
+    return examples
+
+
+def calibrate(examples: Sequence[Tuple[Optional[int], str, Label]], fields: Sequence[str],
+              precision: float = DEFAULT_PRECISION) -> Tuple[Optional[float], float, float]:
+    """
+    Cross-validates over years (CALIBRATION_FOLDS folds) and returns the lowest
+    margin threshold whose predictions reach `precision`, with the coverage and
+    precision it achieved. The threshold is None if no candidate qualifies.
+    """
+    years = sorted({year for year, _, _ in examples}, key=lambda y: (y is None, y))
+    if len(years) < 2:
+        return None, 0.0, 0.0
+    folds = [set(years[i::CALIBRATION_FOLDS]) for i in range(min(CALIBRATION_FOLDS, len(years)))]
+    results = []
+    for held_out in folds:
+        train = [(text, label) for year, text, label in examples if year not in held_out]
+        model = CentroidClassifier(fields).fit(train)
+        for year, text, label in examples:
+            if year in held_out:
+                predicted, margin = model.score(text)
+                results.append((margin, predicted == label))
+    for threshold in CANDIDATE_THRESHOLDS:
+        selected = [correct for margin, correct in results if margin >= threshold]
+        if len(selected) >= MIN_SUPPORT and sum(selected) / len(selected) >= precision:
+            return threshold, len(selected) / len(results), sum(selected) / len(selected)
+    return None, 0.0, 0.0
+
+
+_models: Dict[Tuple[str, float], CentroidClassifier] = {}
+_models_lock = threading.Lock()
+
+
+def load(subject: str, precision: float = DEFAULT_PRECISION) -> CentroidClassifier:
+    """Trains (once per process) and calibrates the classifier for a subject."""
+    import annotation_engine
+    with _models_lock:
+        key = (subject, precision)
+        if key not in _models:
+            fields = annotation_engine.annotation_spec(subject)["fields"]
+            examples = training_examples(subject)
+            model = CentroidClassifier(fields)
+            if examples:
+                model.threshold, coverage, achieved = calibrate(examples, fields, precision)
+                model.fit([(text, label) for _, text, label in examples])
+                if model.threshold is None:
+                    print(f"⚠️  {subject}: local classifier can't reach {precision:.0%} precision; using the LLM only")
+                else:
+                    print(f"✓ {subject}: local classifier trained on {len(examples)} questions "
+                          f"(margin ≥ {model.threshold}, ~{coverage:.0%} coverage at {achieved:.0%} precision)")
+            _models[key] = model
+        return _models[key]
+
+
+def classify(subject: str, questions: List[Dict[str, Any]],
+             precision: float = DEFAULT_PRECISION) -> Dict[int, Dict[str, str]]:
+    """Labels for the questions (by index) the classifier is confident about."""
+    model = load(subject, precision)
+    labels = {}
+    for i, q in enumerate(questions):
+        predicted = model.predict(q)
+        if predicted is not None:
+            labels[i] = predicted
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the local chapter classifier and report its coverage")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--precision", type=float, default=DEFAULT_PRECISION,
+                        help=f"Target precision of local labels (default: {DEFAULT_PRECISION})")
+    args = parser.parse_args()
+
+    import annotation_engine
+    print(f"{'subject':<18} {'examples':>8} {'threshold':>9} {'coverage':>8} {'precision':>9}")
+    for subject in resolve_subjects(args.subjects):
+        examples = training_examples(subject)
+        fields = annotation_engine.annotation_spec(subject)["fields"]
+        threshold, coverage, achieved = calibrate(examples, fields, args.precision)
+        if threshold is None:
+            print(f"{subject:<18} {len(examples):>8} {'-':>9} {'-':>8} {'-':>9}")
+        else:
+            print(f"{subject:<18} {len(examples):>8} {threshold:>9} {coverage:>8.0%} {achieved:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
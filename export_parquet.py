@@ -0,0 +1,118 @@
+# Flattens every {subject}_pro/{subject}_all_years.json into one columnar Parquet
+# dataset for analytics, hive-partitioned by subject and year:
+#   corpus_parquet/subject=physics/year=2021/part-0.parquet
+# Columns: id, type, chapter, chapter_name, topic, topic_name, question (English) and
+# prashna (Hindi); subject and year come from the partition path. Readers only touch the
+# columns and partitions they ask for, e.g. chapter frequency per year across subjects:
+#   python export_parquet.py --chapter-counts
+# Needs pyarrow (pip install pyarrow); nothing else in the pipeline does.
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from subjects import SUBJECTS, resolve_subjects
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed for the export itself
+    pa = ds = pq = None
+
+CORPUS_DIR = "corpus_parquet"
+# Text columns, in file order
+COLUMNS = ["id", "type", "chapter", "chapter_name", "topic", "topic_name", "question", "prashna"]
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("The Parquet export needs pyarrow. Install it with: pip install pyarrow")
+
+
+def _text(value: Any) -> Optional[str]:
+    # Chapter numbers are strings in most files and ints in a few
+    return None if value is None or value == "" else str(value)
+
+
+def flatten(data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Dict[str, List[Optional[str]]]]:
+    """{year: {column: values}} for one merged file."""
+    years = {}
+    for year, items in data.items():
+        if not isinstance(items, list):
+            continue
+        columns = {column: [] for column in COLUMNS}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            for column in COLUMNS:
+                columns[column].append(_text(item.get(column)))
+        years[year] = columns
+    return years
+
+
+def export_subject(subject: str, out_dir: str = CORPUS_DIR) -> Dict[str, int]:
+    """Rewrites the subject's partitions; returns questions per year."""
+    _require_pyarrow()
+    with open(os.path.join(f"{subject}_pro", f"{subject}_all_years.json"), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    schema = pa.schema([(column, pa.string()) for column in COLUMNS])
+    subject_dir = os.path.join(out_dir, f"subject={subject}")
+    # Years dropped from the merged file must not linger in the dataset
+    shutil.rmtree(subject_dir, ignore_errors=True)
+    counts = {}
+    for year, columns in flatten(data).items():
+        year_dir = os.path.join(subject_dir, f"year={year}")
+        os.makedirs(year_dir)
+        pq.write_table(pa.table(columns, schema=schema), os.path.join(year_dir, "part-0.parquet"))
+        counts[year] = len(columns["id"])
+    return counts
+
+
+def read_corpus(columns: Optional[Sequence[str]] = None, subjects: Optional[Sequence[str]] = None,
+                out_dir: str = CORPUS_DIR):
+    """The dataset as a pyarrow Table, reading only `columns` (plus subject/year) of `subjects`."""
+    _require_pyarrow()
+    dataset = ds.dataset(out_dir, format="parquet", partitioning="hive")
+    selected = None if columns is None else list(dict.fromkeys(["subject", "year", *columns]))
+    condition = ds.field("subject").isin(list(subjects)) if subjects else None
+    return dataset.to_table(columns=selected, filter=condition)
+
+
+def chapter_counts(subjects: Optional[Sequence[str]] = None, out_dir: str = CORPUS_DIR):
+    """Questions per (subject, year, chapter_name)."""
+    table = read_corpus(["id", "chapter_name"], subjects, out_dir)
+    return table.group_by(["subject", "year", "chapter_name"]).aggregate([("id", "count")]) \
+        .sort_by([("subject", "ascending"), ("year", "ascending"), ("id_count", "descending")])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the merged files of all subjects to a Parquet dataset")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--out", default=CORPUS_DIR, help=f"Dataset folder (default: {CORPUS_DIR})")
+    parser.add_argument("--chapter-counts", action="store_true",
+                        help="Don't export; print questions per chapter and year from the existing dataset")
+    args = parser.parse_args()
+    subjects = resolve_subjects(args.subjects)
+
+    start = time.time()
+    if args.chapter_counts:
+        table = chapter_counts(args.subjects or None, args.out)
+        for row in table.to_pylist():
+            print(f"{row['subject']:<18} {row['year']:>4} {row['id_count']:>4}  {row['chapter_name']}")
+        print(f"⏱️  {table.num_rows} rows in {time.time() - start:.3f}s")
+        return
+
+    for subject in subjects:
+        if not os.path.exists(os.path.join(f"{subject}_pro", f"{subject}_all_years.json")):
+            print(f"⏭️  {subject}: no merged file, run merge_{subject}.py first")
+            continue
+        counts = export_subject(subject, args.out)
+        print(f"✓ {subject}: {sum(counts.values())} questions in {len(counts)} year partitions")
+    print(f"⏱️  Exported to {args.out}/ in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from subjects import SUBJECTS, annotated_path, data_path, find_paper, resolve_subjects
+
+# One row per (subject, year, stage) job. Stages: "extract" (PDF -> {subject}_data)
+# and "annotate" ({subject}_data -> {subject}_data_annotated).
+LEDGER_PATH = pathlib.Path(os.environ.get("JOB_LEDGER", "jobs.sqlite3"))
+
+STAGES = ("extract", "annotate")
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    subject       TEXT NOT NULL,
+    year          INTEGER NOT NULL,
+    stage         TEXT NOT NULL,
+    status        TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    last_error    TEXT,
+    duration      REAL,
+    input_tokens  INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    updated_at    REAL NOT NULL,
+    PRIMARY KEY (subject, year, stage)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (stage, status);
+"""
+
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+
+
+def _db() -> sqlite3.Connection:
+    """One shared connection per process; callers hold _lock while using it."""
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(str(LEDGER_PATH), check_same_thread=False, isolation_level=None)
+        _connection.row_factory = sqlite3.Row
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.executescript(SCHEMA)
+    return _connection
+
+
+def _output_path(subject: str, year: int, stage: str) -> pathlib.Path:
+    return data_path(subject, year) if stage == "extract" else annotated_path(subject, year)
+
+
+def _input_exists(subject: str, year: int, stage: str) -> bool:
+    return find_paper(subject, year) is not None if stage == "extract" else data_path(subject, year).exists()
+
+
+def sync(subjects: List[str], stage: str, rescan: bool = False) -> int:
+    """
+    Registers jobs whose input exists on disk. New jobs start as "done" if their output
+    is already there (earlier runs predate the ledger), otherwise "pending". Existing rows
+    are left alone unless `rescan` is set, which re-derives done/pending from the files.
+    Returns the number of rows added or changed.
+    """
+    now = time.time()
+    changed = 0
+    with _lock:
+        db = _db()
+        for subject in subjects:
+            for year in SUBJECTS[subject]["years"]:
+                if not _input_exists(subject, year, stage):
+                    continue
+                status = DONE if _output_path(subject, year, stage).exists() else PENDING
+                cur = db.execute(
+                    "INSERT OR IGNORE INTO jobs (subject, year, stage, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (subject, year, stage, status, now))
+                if not cur.rowcount and rescan:
+                    # Output appeared -> done; output of a "done" job deleted -> pending.
+                    # Failed jobs without output keep their status and last error.
+                    condition = "status != ?" if status == DONE else "status = ?"
+                    cur = db.execute(
+                        f"UPDATE jobs SET status = ?, updated_at = ? "
+                        f"WHERE subject = ? AND year = ? AND stage = ? AND {condition}",
+                        (status, now, subject, year, stage, DONE))
+                changed += cur.rowcount
+    return changed
+
+
+def jobs_with_status(stage: str, statuses, subjects: Optional[List[str]] = None) -> List[sqlite3.Row]:
+    """Indexed lookup of the jobs of one stage in any of the given statuses."""
+    statuses = [statuses] if isinstance(statuses, str) else list(statuses)
+    query = f"SELECT * FROM jobs WHERE stage = ? AND status IN ({', '.join('?' * len(statuses))})"
+    params: List[Any] = [stage, *statuses]
+    if subjects:
+        query += f" AND subject IN ({', '.join('?' * len(subjects))})"
+        params += subjects
+    with _lock:
+        return _db().execute(query + " ORDER BY subject, year DESC", params).fetchall()
+
+
+def runnable(stage: str, subjects: Optional[List[str]] = None) -> List[sqlite3.Row]:
+    """Pending and failed jobs, plus "running" ones left behind by a crashed run."""
+    return jobs_with_status(stage, (PENDING, FAILED, RUNNING), subjects)
+
+
+def start(subject: str, year: int, stage: str) -> None:
+    with _lock:
+        _db().execute(
+            "INSERT INTO jobs (subject, year, stage, status, attempts, updated_at) VALUES (?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT (subject, year, stage) DO UPDATE SET status = excluded.status, "
+            "attempts = attempts + 1, updated_at = excluded.updated_at",
+            (subject, year, stage, RUNNING, time.time()))
+
+
+def finish(subject: str, year: int, stage: str, duration: Optional[float] = None,
+           usage: Optional[Dict[str, int]] = None, error: Optional[str] = None) -> None:
+    """Marks a job done, or failed when `error` is given, and adds its token usage."""
+    usage = usage or {}
+    with _lock:
+        _db().execute(
+            "INSERT INTO jobs (subject, year, stage, status, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (subject, year, stage) DO UPDATE SET status = excluded.status, "
+            "last_error = ?, duration = ?, input_tokens = input_tokens + ?, "
+            "output_tokens = output_tokens + ?, updated_at = excluded.updated_at",
+            (subject, year, stage, FAILED if error else DONE, time.time(),
+             error, duration, usage.get("input_tokens", 0), usage.get("output_tokens", 0)))
+
+
+_usage_lock = threading.Lock()
+
+
+def add_usage(usage: Optional[Dict[str, int]], response) -> None:
+    """Adds a Gemini response's token counts to `usage` (safe to call from shard threads)."""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return
+    add_tokens(usage, {"input_tokens": metadata.prompt_token_count, "output_tokens": metadata.candidates_token_count})
+
+
+def add_tokens(usage: Optional[Dict[str, int]], counts: Optional[Dict[str, int]]) -> None:
+    """Adds {"input_tokens": n, "output_tokens": m} to `usage`."""
+    if usage is None or not counts:
+        return
+    with _usage_lock:
+        usage["input_tokens"] = usage.get("input_tokens", 0) + (counts.get("input_tokens") or 0)
+        usage["output_tokens"] = usage.get("output_tokens", 0) + (counts.get("output_tokens") or 0)
+
+
+def summary(stage: Optional[str] = None) -> List[sqlite3.Row]:
+    query = ("SELECT stage, subject, status, COUNT(*) AS jobs, SUM(attempts) AS attempts, "
+             "SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens FROM jobs")
+    params = []
+    if stage:
+        query += " WHERE stage = ?"
+        params.append(stage)
+    with _lock:
+        return _db().execute(query + " GROUP BY stage, subject, status ORDER BY stage, subject, status", params).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and sync the job ledger")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = sub.add_parser("sync", help="Register jobs for papers/data files found on disk")
+    sync_parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    sync_parser.add_argument("--stage", choices=STAGES, help="Only this stage (default: both)")
+    sync_parser.add_argument("--rescan", action="store_true", help="Re-derive done/pending from the output files")
+
+    status_parser = sub.add_parser("status", help="Per-subject job counts")
+    status_parser.add_argument("--stage", choices=STAGES)
+
+    list_parser = sub.add_parser("list", help="List jobs in a given status")
+    list_parser.add_argument("status", choices=(PENDING, RUNNING, DONE, FAILED))
+    list_parser.add_argument("subjects", nargs="*")
+    list_parser.add_argument("--stage", choices=STAGES, default="extract")
+
+    args = parser.parse_args()
+    if args.command == "sync":
+        for stage in [args.stage] if args.stage else STAGES:
+            changed = sync(resolve_subjects(args.subjects), stage, args.rescan)
+            print(f"✓ {stage}: {changed} jobs added or updated")
+    elif args.command == "status":
+        rows = summary(args.stage)
+        if not rows:
+            print("The ledger is empty - run `python job_ledger.py sync` first.")
+        for row in rows:
+            print(f"{row['stage']:<9} {row['subject']:<18} {row['status']:<8} {row['jobs']:>4} jobs  "
+                  f"{row['attempts']:>4} attempts  {row['input_tokens']:>9} in / {row['output_tokens']:>8} out tokens")
+    else:
+        for row in jobs_with_status(args.stage, args.status, resolve_subjects(args.subjects)):
+            error = f" - {row['last_error']}" if row["last_error"] else ""
+            print(f"{row['subject']} {row['year']} (attempts: {row['attempts']}){error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Cross-year label reuse. Bihar Board papers repeat many questions almost word for
+# word, so before a paper is sent to the model every question is looked up in an
+# index of the subject's already-annotated years:
+# - exact: the normalized English question text (plus options) matches
+# - near: a candidate sharing most words is at least NEAR_MATCH_RATIO similar
+# Matches copy the earlier labels; only unseen questions go to the model.
+# Copying is only as good as the earlier labels, so each match kind is gated per subject
+# like the local classifier: held-out years (CALIBRATION_FOLDS folds) are looked up in an
+# index of the other years, and a kind is used only if its copied labels agree with the
+# real ones at least `precision` of the time over at least MIN_SUPPORT matches.
+import argparse
+import collections
+import difflib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from chapter_classifier import CALIBRATION_FOLDS, DEFAULT_PRECISION, MIN_SUPPORT, normalize_text
+from subjects import SUBJECTS, resolve_subjects
+
+NEAR_MATCH_RATIO = 0.9
+# Very short stems ("Define osmosis.") are too generic to match on their own
+MIN_FINGERPRINT_CHARS = 25
+# Near-match candidates compared in full per question
+MAX_CANDIDATES = 5
+MATCH_KINDS = ("exact", "near")
+
+
+def fingerprint(q: Dict[str, Any]) -> str:
+    """Normalized English question text followed by its options, in A-D order."""
+    parts = [q.get("question")]
+    if isinstance(q.get("options"), dict):
+        parts.extend(q["options"][key] for key in sorted(q["options"]))
+    return normalize_text(" ".join(p for p in parts if isinstance(p, str)))
+
+
+class LabelIndex:
+    def __init__(self, fields):
+        self.fields = list(fields)
+        # Match kinds whose copies are trusted (see calibrate)
+        self.trusted = set(MATCH_KINDS)
+        self.labels: Dict[str, Tuple[str, ...]] = {}
+        # word -> fingerprints containing it, for near-match candidates
+        self.words: Dict[str, set] = collections.defaultdict(set)
+
+    def build(self, labelled: List[Tuple[Any, Dict[str, Any], Tuple[str, ...]]]) -> "LabelIndex":
+        """Indexes (year, question, label) triples; a fingerprint seen with different labels keeps the most common."""
+        votes: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        for _, q, label in labelled:
+            key = fingerprint(q)
+            if len(key) >= MIN_FINGERPRINT_CHARS:
+                votes[key][label] += 1
+        for key, counter in votes.items():
+            (label, count), *rest = counter.most_common(2)
+            if rest and rest[0][1] == count:
+                continue  # annotated inconsistently across years; let the model decide
+            self.labels[key] = label
+            for word in set(key.split()):
+                self.words[word].add(key)
+        return self
+
+    def lookup(self, q: Dict[str, Any]) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+        """(labels, "exact" | "near") for a question seen before, else (None, None)."""
+        key = fingerprint(q)
+        if len(key) < MIN_FINGERPRINT_CHARS:
+            return None, None
+        if key in self.labels:
+            return dict(zip(self.fields, self.labels[key])), "exact"
+
+        words = set(key.split())
+        shared = collections.Counter()
+        for word in words:
+            shared.update(self.words.get(word, ()))
+        candidates = [c for c, n in shared.most_common(MAX_CANDIDATES) if n >= len(words) / 2]
+        best, best_ratio = None, NEAR_MATCH_RATIO
+        for candidate in candidates:
+            ratio = difflib.SequenceMatcher(None, key, candidate, autojunk=False).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        if best is None:
+            return None, None
+        return dict(zip(self.fields, self.labels[best])), "near"
+
+
+def calibrate(labelled: List[Tuple[Any, Dict[str, Any], Tuple[str, ...]]], fields,
+              precision: float = DEFAULT_PRECISION) -> Dict[str, Tuple[bool, int, float]]:
+    """
+    Cross-validates over years and returns, per match kind, whether it reaches
+    `precision`, how many held-out questions it matched and how often they agreed.
+    """
+    years = sorted({year for year, _, _ in labelled}, key=lambda y: (y is None, y))
+    agreed: Dict[str, List[bool]] = {kind: [] for kind in MATCH_KINDS}
+    for held_out in [set(years[i::CALIBRATION_FOLDS]) for i in range(min(CALIBRATION_FOLDS, len(years)))]:
+        if len(held_out) == len(years):
+            continue  # a single year has nothing to be checked against
+        index = LabelIndex(fields).build([item for item in labelled if item[0] not in held_out])
+        for year, q, label in labelled:
+            if year in held_out:
+                found, kind = index.lookup(q)
+                if found is not None:
+                    agreed[kind].append(tuple(found[field] for field in fields) == label)
+    results = {}
+    for kind, matches in agreed.items():
+        agreement = sum(matches) / len(matches) if matches else 0.0
+        results[kind] = (len(matches) >= MIN_SUPPORT and agreement >= precision, len(matches), agreement)
+    return results
+
+
+_indexes: Dict[Tuple[str, float], LabelIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def load(subject: str, precision: float = DEFAULT_PRECISION) -> LabelIndex:
+    """Builds (once per process) the index over a subject's annotated years and calibrates which kinds to trust."""
+    import annotation_engine
+    with _indexes_lock:
+        key = (subject, precision)
+        if key not in _indexes:
+            fields = annotation_engine.annotation_spec(subject)["fields"]
+            labelled = annotation_engine.labelled_questions(subject)
+            index = LabelIndex(fields).build(labelled)
+            calibration = calibrate(labelled, fields, precision)
+            index.trusted = {kind for kind, (trusted, _, _) in calibration.items() if trusted}
+            print(f"{'✓' if index.trusted else '⚠️ '} {subject}: label reuse "
+                  + ", ".join(f"{kind} matches {'on' if trusted else 'off'} ({agreement:.0%} of {n} agree)"
+                              for kind, (trusted, n, agreement) in calibration.items())
+                  + f" at a {precision:.0%} target")
+            _indexes[key] = index
+        return _indexes[key]
+
+
+def reuse_labels(subject: str, questions: List[Dict[str, Any]],
+                 precision: float = DEFAULT_PRECISION) -> Dict[int, Dict[str, str]]:
+    """Labels copied from earlier years for the questions (by index) that repeat, where that kind of match is trusted."""
+    index = load(subject, precision)
+    labels = {}
+    for i, q in enumerate(questions):
+        found, kind = index.lookup(q)
+        if found is not None and kind in index.trusted:
+            labels[i] = found
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report how many questions per year repeat an earlier annotated one")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    args = parser.parse_args()
+
+    import annotation_engine
+    print(f"{'subject':<18} {'year':>4} {'questions':>9} {'exact':>5} {'near':>5} {'agree':>6}")
+    for subject in resolve_subjects(args.subjects):
+        labelled = annotation_engine.labelled_questions(subject)
+        fields = annotation_engine.annotation_spec(subject)["fields"]
+        for year in sorted({year for year, _, _ in labelled if year is not None}):
+            # Index every other year, as if this one were being annotated now
+            index = LabelIndex(fields).build([item for item in labelled if item[0] != year])
+            held_out = [(q, label) for y, q, label in labelled if y == year]
+            matches = collections.Counter()
+            agree = 0
+            for q, label in held_out:
+                found, kind = index.lookup(q)
+                if found is not None:
+                    matches[kind] += 1
+                    agree += tuple(found[field] for field in fields) == label
+            matched = matches["exact"] + matches["near"]
+            print(f"{subject:<18} {year:>4} {len(held_out):>9} {matches['exact']:>5} {matches['near']:>5} "
+                  f"{(f'{agree / matched:.0%}' if matched else '-'):>6}")
+
+
+if __name__ == "__main__":
+    main()
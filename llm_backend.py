@@ -0,0 +1,332 @@
+# Pluggable model backend: live Gemini/Groq calls, or recorded responses for offline runs.
+#   LLM_BACKEND=live    (default) call the APIs
+#   LLM_BACKEND=record  call the APIs and save every response to a cassette
+#   LLM_BACKEND=replay  serve responses from the cassettes; no API key or network needed
+# Cassettes are keyed by a hash of the model and the request; uploaded PDFs count by
+# their content hash, so replays match even though file URIs differ per upload.
+# LLM_REPLAY_LATENCY simulates API latency when replaying: seconds per call, or
+# "recorded" to take as long as the recorded call did.
+# Live and recorded calls are paced by the shared per-model limits in rate_limits.py
+# and retried when the API answers 429.
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import llm_cache
+import rate_limits
+
+MODE = os.environ.get("LLM_BACKEND", "live")
+CASSETTE_DIR = pathlib.Path(os.environ.get("LLM_CASSETTE_DIR", "cassettes"))
+REPLAY_LATENCY = os.environ.get("LLM_REPLAY_LATENCY", "0")
+
+if MODE not in ("live", "record", "replay"):
+    raise ValueError(f"LLM_BACKEND must be live, record or replay (got {MODE!r})")
+
+_configure_lock = threading.Lock()
+_genai = None
+# file URI -> content hash of the uploaded file, for cassette keys
+_uploaded_hashes: Dict[str, str] = {}
+
+
+def replaying() -> bool:
+    return MODE == "replay"
+
+
+def configure():
+    """
+    Configures google.generativeai from GOOGLE_API_KEY on first use and returns the
+    module. In replay mode nothing is imported and no key is needed.
+    """
+    global _genai
+    if replaying():
+        return None
+    with _configure_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            from dotenv import load_dotenv
+            load_dotenv()
+            api_key = os.environ.get('GOOGLE_API_KEY')
+            if not api_key:
+                raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
+            genai.configure(api_key=api_key)
+            _genai = genai
+    return _genai
+
+
+# --- Cassettes ---
+
+def _normalize(contents: Any) -> Any:
+    """Makes a request JSON-serializable and independent of per-upload file URIs."""
+    if isinstance(contents, dict):
+        normalized = {k: _normalize(v) for k, v in contents.items()}
+        uri = normalized.get("file_uri")
+        if uri:
+            normalized["file_uri"] = _uploaded_hashes.get(uri, uri.replace("replay://", ""))
+        return normalized
+    if isinstance(contents, (list, tuple)):
+        return [_normalize(item) for item in contents]
+    if isinstance(contents, bytes):  # inline data, e.g. predict_questions.py's JSON part
+        return llm_cache.sha256_bytes(contents)
+    if hasattr(contents, "model_dump"):  # google.genai pydantic types
+        return _normalize(contents.model_dump(mode="json", exclude_none=True))
+    return contents
+
+
+def cassette_key(model_name: str, contents: Any, **options) -> str:
+    if isinstance(contents, str):
+        contents = [contents]  # a bare prompt and a one-part list are the same request
+    request = json.dumps({"model": model_name, "contents": _normalize(contents), "options": options},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def _cassette_path(key: str) -> pathlib.Path:
+    return CASSETTE_DIR / key[:2] / f"{key}.json"
+
+
+def _save_cassette(key: str, entry: Dict[str, Any]) -> None:
+    path = _cassette_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _load_cassette(key: str, model_name: str) -> Dict[str, Any]:
+    path = _cassette_path(key)
+    if not path.exists():
+        raise LookupError(f"No recorded response for this {model_name} request (cassette {key[:12]}). "
+                          "Run once with LLM_BACKEND=record to capture it.")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _simulate_latency(entry: Dict[str, Any]) -> float:
+    """Seconds to sleep for one replayed call."""
+    if REPLAY_LATENCY == "recorded":
+        return entry.get("seconds", 0)
+    return float(REPLAY_LATENCY or 0)
+
+
+# --- Replayed Gemini responses (the subset of the SDK's response the scripts use) ---
+
+def _usage_metadata(usage: Optional[Dict[str, int]]):
+    if usage is None:
+        return None
+    return SimpleNamespace(prompt_token_count=usage.get("input_tokens"),
+                           candidates_token_count=usage.get("output_tokens"))
+
+
+class ReplayChunk:
+    def __init__(self, text: Optional[str]):
+        self._text = text
+        parts = [SimpleNamespace(text=text)] if text else []
+        self.candidates = [SimpleNamespace(content=SimpleNamespace(parts=parts), safety_ratings=[])]
+        self.prompt_feedback = None
+
+    @property
+    def text(self) -> str:
+        if not self._text:
+            raise ValueError("The recorded response has no text (it was blocked or empty).")
+        return self._text
+
+
+class ReplayResponse(ReplayChunk):
+    def __init__(self, entry: Dict[str, Any]):
+        super().__init__(entry.get("text"))
+        self.usage_metadata = _usage_metadata(entry.get("usage"))
+
+
+class ReplayStream:
+    def __init__(self, entry: Dict[str, Any]):
+        self._entry = entry
+        self.usage_metadata = None
+
+    def __iter__(self) -> Iterator[ReplayChunk]:
+        chunks = self._entry.get("chunks") or [self._entry.get("text")]
+        delay = _simulate_latency(self._entry) / max(len(chunks), 1)
+        for text in chunks:
+            time.sleep(delay)
+            yield ReplayChunk(text)
+        self.usage_metadata = _usage_metadata(self._entry.get("usage"))
+
+
+def _gemini_usage(response) -> Optional[Dict[str, int]]:
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return None
+    return {"input_tokens": metadata.prompt_token_count, "output_tokens": metadata.candidates_token_count}
+
+
+def _response_text(response) -> Optional[str]:
+    try:
+        return response.text
+    except ValueError:
+        return None  # blocked or empty; recorded as such
+
+
+def _send(model_name: str, contents: Any, send):
+    """
+    Calls `send()` once the model's rate limiter admits the request, retrying 429s.
+    Returns (result, limiter, estimated tokens) so the caller can settle the usage;
+    the estimate of an attempt that raised is refunded right away.
+    """
+    limiter = rate_limits.limiter_for(model_name)
+    estimate = rate_limits.estimate_tokens(contents)
+    for attempt in range(rate_limits.RATE_LIMIT_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire(estimate)
+        try:
+            return send(), limiter, estimate
+        except Exception as e:
+            # The failed attempt used no tokens; only the next acquire charges the estimate again
+            if limiter is not None:
+                limiter.settle(estimate, 0)
+            if not rate_limits.is_rate_limit_error(e) or attempt == rate_limits.RATE_LIMIT_RETRIES:
+                raise
+            delay = rate_limits.retry_after(e, attempt)
+            print(f"⏳ {model_name} is rate limited; retrying in {delay:.1f}s")
+            if limiter is not None:
+                limiter.backoff(delay)
+            else:
+                time.sleep(delay)
+
+
+def _settle(limiter, estimate: int, usage: Optional[Dict[str, int]]) -> None:
+    if limiter is not None and usage:
+        output = 0 if limiter.input_only else (usage.get("output_tokens") or 0)
+        limiter.settle(estimate, (usage.get("input_tokens") or 0) + output)
+
+
+class _WatchedStream:
+    """Passes a live stream through and calls `on_done(chunk texts)` once it is consumed."""
+
+    def __init__(self, response, on_done):
+        self._response, self._on_done = response, on_done
+
+    def __iter__(self):
+        chunks = []
+        for chunk in self._response:
+            chunks.append(_response_text(chunk))
+            yield chunk
+        self._on_done(chunks)
+
+    @property
+    def usage_metadata(self):
+        return self._response.usage_metadata
+
+
+class GenerativeModel:
+    """Drop-in for genai.GenerativeModel(model_name=...).generate_content(...)."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None if replaying() else configure().GenerativeModel(model_name=model_name)
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        # safety_settings etc. change the response, so they are part of the key
+        key = cassette_key(self.model_name, contents, **kwargs)
+        if replaying():
+            entry = _load_cassette(key, self.model_name)
+            if stream:
+                return ReplayStream(entry)
+            time.sleep(_simulate_latency(entry))
+            return ReplayResponse(entry)
+
+        start = time.perf_counter()
+        response, limiter, estimate = _send(self.model_name, contents,
+                                            lambda: self._model.generate_content(contents, stream=stream, **kwargs))
+
+        def done(chunks: Optional[List[Optional[str]]] = None) -> None:
+            usage = _gemini_usage(response)
+            _settle(limiter, estimate, usage)
+            if MODE == "record":
+                entry = {"model": self.model_name, "usage": usage, "seconds": round(time.perf_counter() - start, 3)}
+                if chunks is None:
+                    entry["text"] = _response_text(response)
+                else:
+                    entry.update(chunks=chunks, text="".join(c for c in chunks if c) or None)
+                _save_cassette(key, entry)
+
+        if stream:
+            return _WatchedStream(response, done)
+        done()
+        return response
+
+
+def upload_file(path, display_name: Optional[str] = None):
+    """genai.upload_file; in replay mode returns a stand-in whose URI is the file hash."""
+    digest = llm_cache.file_sha256(pathlib.Path(path))
+    if replaying():
+        return SimpleNamespace(uri=f"replay://{digest}", name=f"files/replay-{digest[:12]}")
+    uploaded_file = configure().upload_file(path=path, display_name=display_name)
+    _uploaded_hashes[uploaded_file.uri] = digest
+    return uploaded_file
+
+
+def delete_file(name: str) -> None:
+    if not replaying():
+        configure().delete_file(name)
+
+
+# --- google.genai Client (predict_questions.py) ---
+
+def client_generate_content(client, model: str, contents):
+    """client.models.generate_content(model=..., contents=...) with record/replay."""
+    key = cassette_key(model, contents)
+    if replaying():
+        entry = _load_cassette(key, model)
+        time.sleep(_simulate_latency(entry))
+        return ReplayResponse(entry)
+    start = time.perf_counter()
+    response, limiter, estimate = _send(model, contents,
+                                        lambda: client.models.generate_content(model=model, contents=contents))
+    _settle(limiter, estimate, _gemini_usage(response))
+    if MODE == "record":
+        _save_cassette(key, {"model": model, "text": response.text, "usage": _gemini_usage(response),
+                             "seconds": round(time.perf_counter() - start, 3)})
+    return response
+
+
+# --- Groq chat completions (batch_annotate_english_groq.py) ---
+
+def _groq_chunk(content: Optional[str], usage: Optional[Dict[str, int]] = None):
+    x_groq = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=usage["input_tokens"],
+                                                   completion_tokens=usage["output_tokens"])) if usage else None
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], x_groq=x_groq)
+
+
+def groq_stream(client, **kwargs) -> Iterator[Any]:
+    """client.chat.completions.create(stream=True, ...) with record/replay; yields stream chunks."""
+    key = cassette_key(kwargs.get("model", ""), kwargs.get("messages"),
+                       **{k: v for k, v in kwargs.items() if k not in ("model", "messages")})
+    if replaying():
+        entry = _load_cassette(key, kwargs.get("model", ""))
+        chunks = entry.get("chunks") or []
+        delay = _simulate_latency(entry) / max(len(chunks), 1)
+        for i, content in enumerate(chunks):
+            time.sleep(delay)
+            yield _groq_chunk(content, entry.get("usage") if i == len(chunks) - 1 else None)
+        return
+
+    start = time.perf_counter()
+    chunks: List[Optional[str]] = []
+    usage = None
+    stream, limiter, estimate = _send(kwargs.get("model", ""), kwargs.get("messages"),
+                                      lambda: client.chat.completions.create(**kwargs))
+    for chunk in stream:
+        chunks.append(chunk.choices[0].delta.content if chunk.choices else None)
+        x_groq_usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if x_groq_usage:
+            usage = {"input_tokens": x_groq_usage.prompt_tokens, "output_tokens": x_groq_usage.completion_tokens}
+        yield chunk
+    _settle(limiter, estimate, usage)
+    if MODE == "record":
+        _save_cassette(key, {"model": kwargs.get("model"), "chunks": chunks, "usage": usage,
+                             "seconds": round(time.perf_counter() - start, 3)})
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Responses are stored as .llm_cache/<first two hex chars>/<key>.json
+CACHE_DIR = pathlib.Path(os.environ.get("LLM_CACHE_DIR", ".llm_cache"))
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_text(text: str) -> str:
+    return sha256_bytes(text.encode("utf-8"))
+
+
+def file_sha256(path) -> str:
+    """Hash a file in 1 MB blocks so large PDFs are not read into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prompt_text_hash(prompt_parts: List[Dict[str, Any]]) -> str:
+    """Hash only the text parts of a prompt, so the per-upload file URI does not affect the key."""
+    texts = [part["text"] for part in prompt_parts if isinstance(part, dict) and "text" in part]
+    return sha256_text("\n".join(texts))
+
+
+def make_key(*components: str) -> str:
+    return sha256_text(":".join(components))
+
+
+def pdf_prompt_key(pdf_path, prompt_parts: List[Dict[str, Any]], model_name: str) -> str:
+    """Cache key for an extraction call: PDF content + prompt text + model."""
+    return make_key(file_sha256(pdf_path), prompt_text_hash(prompt_parts), model_name)
+
+
+def _entry_path(key: str) -> pathlib.Path:
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def load_response(key: str) -> Optional[str]:
+    """Return the cached raw response text for `key`, or None on a miss."""
+    path = _entry_path(key)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["text"]
+    except (OSError, ValueError, KeyError):
+        # A truncated or hand-edited entry is treated as a miss
+        return None
+
+
+def save_response(key: str, text: str, **metadata: Any) -> None:
+    """Store the raw response text; written via a temp file so concurrent runs never see half an entry."""
+    path = _entry_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {"key": key, "created": time.time(), **metadata, "text": text}
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
@@ -0,0 +1,222 @@
+# Routes text-only prompts (annotation) over several LLM providers. Each provider is
+# "kind:model" (kind is gemini or groq); the router sends a call to the provider
+# expected to finish it soonest:
+#   expected seconds = rate-limit wait for the call's tokens (rate_limits.py)
+#                      + observed seconds per 1k tokens * the call's tokens / 1000
+# divided by the provider's observed success rate. Calls already routed to a provider
+# and still in flight count against its quota, so concurrent workers spread out
+# instead of all picking the same provider. A provider that fails
+# DEGRADED_AFTER times in a row sits out a cooldown (doubling up to MAX_COOLDOWN)
+# and its calls fail over to the next best provider.
+# PDF extraction uploads files to Gemini and stays on it; only text prompts route.
+# LLM_PROVIDERS="gemini:models/gemini-2.5-pro,groq:moonshotai/kimi-k2-instruct-0905"
+# sets the pool used for the pro model (run_annotation.py --providers does the same).
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import llm_backend
+import rate_limits
+import telemetry
+import validation
+
+KINDS = ("gemini", "groq")
+# Weight of the newest observation in the latency and error-rate averages
+SMOOTHING = 0.3
+DEGRADED_AFTER = 2
+FAILURE_COOLDOWN = 30.0
+MAX_COOLDOWN = 600.0
+# An output rejected by the caller (unparseable JSON) counts as this much of a failure
+INVALID_OUTPUT_WEIGHT = 0.5
+
+_groq_client = None
+_groq_lock = threading.Lock()
+
+
+def _groq():
+    """The shared Groq client (None when replaying)."""
+    global _groq_client
+    if llm_backend.replaying():
+        return None
+    with _groq_lock:
+        if _groq_client is None:
+            from dotenv import load_dotenv
+            from groq import Groq
+            load_dotenv()
+            api_key = os.environ.get("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("Groq API key not found. Please set the GROQ_API_KEY environment variable.")
+            _groq_client = Groq(api_key=api_key)
+    return _groq_client
+
+
+class Provider:
+    def __init__(self, kind: str, model: str):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown provider {kind!r}; expected one of {', '.join(KINDS)}")
+        self.kind, self.model = kind, model
+        self.limiter = rate_limits.limiter_for(model)
+        self.seconds_per_1k: Optional[float] = None
+        self.error_rate = 0.0
+        self.failures = 0  # consecutive
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.in_flight_tokens = 0
+        self.calls = 0
+        self.errors = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}:{self.model}"
+
+    def expected_seconds(self, tokens: int) -> float:
+        # Unmeasured providers look free, so every provider gets tried early on
+        wait = self.limiter.expected_wait(tokens + self.in_flight_tokens, 1 + self.in_flight) \
+            if self.limiter is not None else 0.0
+        work = (self.seconds_per_1k or 0.0) * tokens / 1000
+        return (wait + work) / max(1.0 - self.error_rate, 0.05)
+
+    def generate(self, prompt: str) -> Tuple[Optional[str], Optional[Dict[str, int]]]:
+        """(text, {"input_tokens", "output_tokens"}) for one prompt."""
+        if self.kind == "gemini":
+            response = llm_backend.GenerativeModel(model_name=self.model).generate_content(prompt)
+            metadata = getattr(response, "usage_metadata", None)
+            usage = {"input_tokens": metadata.prompt_token_count,
+                     "output_tokens": metadata.candidates_token_count} if metadata is not None else None
+            return response.text, usage
+        # Same request shape as batch_annotate_english_groq.py, so its cassettes replay
+        text, usage = "", None
+        for chunk in llm_backend.groq_stream(_groq(), model=self.model,
+                                             messages=[{"role": "user", "content": prompt}],
+                                             temperature=1.0, max_tokens=16384, top_p=1, stream=True, stop=None):
+            text += (chunk.choices[0].delta.content or "") if chunk.choices else ""
+            x_groq_usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if x_groq_usage:
+                usage = {"input_tokens": x_groq_usage.prompt_tokens, "output_tokens": x_groq_usage.completion_tokens}
+        return text, usage
+
+
+def parse_providers(spec: str) -> List[Provider]:
+    """Providers from "kind:model,kind:model"."""
+    providers = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, sep, model = item.partition(":")
+        if not sep or not model:
+            raise ValueError(f"Providers look like kind:model, e.g. groq:moonshotai/kimi-k2-instruct-0905 (got {item!r})")
+        providers.append(Provider(kind, model))
+    return providers
+
+
+class Router:
+    def __init__(self, providers: Sequence[Provider]):
+        if not providers:
+            raise ValueError("A router needs at least one provider")
+        self.providers = list(providers)
+        self._lock = threading.RLock()
+
+    def ranked(self, tokens: int) -> List[Provider]:
+        """Providers in the order to try them: healthy ones by expected time, then those cooling down."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [p for p in self.providers if p.cooldown_until <= now]
+            cooling = sorted((p for p in self.providers if p.cooldown_until > now), key=lambda p: p.cooldown_until)
+            # Ties (e.g. providers with spare quota) go to the one with fewer calls in flight
+            return sorted(healthy, key=lambda p: (p.expected_seconds(tokens), p.in_flight)) + cooling
+
+    def _reserve(self, tokens: int, tried: List[Provider]) -> Optional[Provider]:
+        """The best provider not yet tried, counted as in flight until _release."""
+        with self._lock:
+            provider = next((p for p in self.ranked(tokens) if p not in tried), None)
+            if provider is not None:
+                provider.in_flight += 1
+                provider.in_flight_tokens += tokens
+            return provider
+
+    def _release(self, provider: Provider, tokens: int) -> None:
+        with self._lock:
+            provider.in_flight -= 1
+            provider.in_flight_tokens -= tokens
+            provider.calls += 1
+
+    def _observe(self, provider: Provider, failure: float, seconds: Optional[float] = None,
+                 tokens: int = 0) -> None:
+        with self._lock:
+            provider.error_rate += SMOOTHING * (failure - provider.error_rate)
+            if seconds is not None and tokens:
+                rate = seconds * 1000 / tokens
+                provider.seconds_per_1k = rate if provider.seconds_per_1k is None else \
+                    provider.seconds_per_1k + SMOOTHING * (rate - provider.seconds_per_1k)
+            if failure < 1:
+                provider.failures = 0
+                return
+            provider.errors += 1
+            provider.failures += 1
+            if provider.failures >= DEGRADED_AFTER and len(self.providers) > 1:
+                cooldown = min(FAILURE_COOLDOWN * 2 ** (provider.failures - DEGRADED_AFTER), MAX_COOLDOWN)
+                provider.cooldown_until = time.monotonic() + cooldown
+                print(f"⚠️  {provider.name} failed {provider.failures} times in a row; "
+                      f"routing around it for {cooldown:.0f}s")
+
+    def generate(self, prompt: str, stage: str, source: Optional[str] = None,
+                 **fields) -> Tuple[Optional[str], Optional[Dict[str, int]], Provider]:
+        """
+        Sends `prompt` to the best provider, failing over to the next on an error.
+        Returns (text, usage, provider); raises the last error if every provider failed.
+        """
+        tokens = rate_limits.estimate_tokens(prompt)
+        last_error: Optional[Exception] = None
+        tried: List[Provider] = []
+        while True:
+            provider = self._reserve(tokens, tried)
+            if provider is None:
+                raise last_error
+            tried.append(provider)
+            start = time.perf_counter()
+            try:
+                with telemetry.track(stage, provider.model, provider=provider.kind, source=source, **fields) as call:
+                    text, usage = provider.generate(prompt)
+                    if usage:
+                        call.set(**usage)
+            except Exception as e:
+                self._release(provider, tokens)
+                self._observe(provider, 1.0)
+                last_error = e
+                if len(self.providers) > 1:
+                    print(f"⚠️  {provider.name} failed ({type(e).__name__}: {e}); trying the next provider")
+                continue
+            self._release(provider, tokens)
+            self._observe(provider, 0.0, time.perf_counter() - start, tokens)
+            return text, usage, provider
+
+    def report_invalid(self, provider: Provider) -> None:
+        """Counts an unusable answer (e.g. unparseable JSON) against the provider's error rate."""
+        self._observe(provider, INVALID_OUTPUT_WEIGHT)
+
+    def summary(self) -> str:
+        with self._lock:
+            return ", ".join(f"{p.name}: {p.calls} calls, {p.errors} errors"
+                             + (f", {p.seconds_per_1k:.1f}s/1k tokens" if p.seconds_per_1k is not None else "")
+                             for p in self.providers)
+
+
+_routers: Dict[str, Router] = {}
+_routers_lock = threading.Lock()
+
+
+def configure_pool(model_name: str, spec: str) -> Router:
+    """Routes calls made for `model_name` over the providers in `spec` ("kind:model,...")."""
+    router = Router(parse_providers(spec))
+    with _routers_lock:
+        _routers[model_name] = router
+    return router
+
+
+def router_for(model_name: str) -> Router:
+    """The router for calls made for `model_name`: its configured pool, or that Gemini model alone."""
+    with _routers_lock:
+        if model_name not in _routers:
+            spec = os.environ.get("LLM_PROVIDERS") if model_name == validation.PRO_MODEL else None
+            _routers[model_name] = Router(parse_providers(spec) if spec else [Provider("gemini", model_name)])
+        return _routers[model_name]
+
@@ -0,0 +1,157 @@
+# Incremental version of the merge_{subject}.py scripts. {subject}_pro/.merge_manifest.json
+# records the SHA-256 and item count of every annotated input file, the items per year
+# and the hash of the merged output. On the next run only files whose hash changed (or
+# that were added or removed) are parsed, and only their years are rebuilt; the other
+# years are taken from the existing {subject}_all_years.json. When nothing changed the
+# merged file isn't rewritten, and --split then also skips the subject's split trees.
+# Output is byte-for-byte what merge_{subject}.py writes.
+import argparse
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from llm_cache import file_sha256, sha256_text
+from merge_physics import read_items_from_file
+from subjects import SUBJECTS, annotated_folder, resolve_subjects
+
+MANIFEST_NAME = ".merge_manifest.json"
+
+
+def output_path(subject: str) -> str:
+    return os.path.join(f"{subject}_pro", f"{subject}_all_years.json")
+
+
+def manifest_path(subject: str) -> str:
+    return os.path.join(f"{subject}_pro", MANIFEST_NAME)
+
+
+def input_files(subject: str) -> List[str]:
+    """The annotated files merge_{subject}.py reads, in its order."""
+    prefix = SUBJECTS[subject]["data_name"].split("{year}")[0]
+    files = sorted(glob.glob(os.path.join(str(annotated_folder(subject)), f"{prefix}*.json")))
+    if not files and subject == "hindi":
+        # merge_hindi.py falls back to any JSON file
+        files = sorted(glob.glob(os.path.join(str(annotated_folder(subject)), "*.json")))
+    return files
+
+
+def year_of(base: str) -> str:
+    return "".join(ch for ch in base if ch.isdigit()) or base
+
+
+def year_sort_key(k: str) -> Any:
+    try:
+        return int(k)
+    except ValueError:
+        return k
+
+
+def load_manifest(subject: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(manifest_path(subject), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def merge_subject(subject: str, force: bool = False) -> Dict[str, Any]:
+    """
+    Brings {subject}_all_years.json up to date. Returns {"changed": whether the file was
+    written, "years": the years rebuilt, "parsed": input files read, "total": items}.
+    """
+    out_path = output_path(subject)
+    files = input_files(subject)
+    hashes = {os.path.basename(path): file_sha256(path) for path in files}
+
+    manifest = None if force else load_manifest(subject)
+    merged: Optional[Dict[str, List[Dict[str, Any]]]] = None
+    if manifest is not None and os.path.exists(out_path) and file_sha256(out_path) == manifest.get("output_sha256"):
+        if hashes == {name: entry["sha256"] for name, entry in manifest["files"].items()}:
+            return {"changed": False, "years": [], "parsed": 0, "total": sum(manifest["years"].values())}
+        with open(out_path, "r", encoding="utf-8") as f:
+            merged = json.load(f)
+
+    if merged is None:
+        stale_years = {year_of(name) for name in hashes}
+        merged, known = {}, {}
+    else:
+        known = manifest["files"]
+        changed = {name for name in hashes if known.get(name, {}).get("sha256") != hashes[name]}
+        changed |= set(known) - set(hashes)
+        stale_years = {year_of(name) for name in changed}
+
+    # A stale year is rebuilt from all of its files, in file order
+    file_entries = {name: entry for name, entry in known.items() if name in hashes and year_of(name) not in stale_years}
+    rebuilt: Dict[str, List[Dict[str, Any]]] = {}
+    parsed = 0
+    for path in files:
+        base = os.path.basename(path)
+        if year_of(base) not in stale_years:
+            continue
+        try:
+            items = read_items_from_file(path)
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse {path}: {e}")
+            continue
+        except OSError as e:
+            print(f"Failed to read {path}: {e}")
+            continue
+        parsed += 1
+        rebuilt.setdefault(year_of(base), []).extend(items)
+        file_entries[base] = {"sha256": hashes[base], "year": year_of(base), "items": len(items)}
+
+    grouped = {year: items for year, items in merged.items() if year not in stale_years}
+    grouped.update(rebuilt)
+    ordered_obj = {y: grouped[y] for y in sorted(grouped, key=year_sort_key)}
+    text = json.dumps(ordered_obj, ensure_ascii=False, indent=2)
+    text_sha = sha256_text(text)
+
+    written = not os.path.exists(out_path) or file_sha256(out_path) != text_sha
+    if written:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    with open(manifest_path(subject), "w", encoding="utf-8") as f:
+        json.dump({"files": dict(sorted(file_entries.items())),
+                   "years": {y: len(items) for y, items in ordered_obj.items()},
+                   "output_sha256": text_sha}, f, ensure_ascii=False, indent=2)
+    return {"changed": written, "years": sorted(stale_years, key=year_sort_key), "parsed": parsed,
+            "total": sum(len(items) for items in ordered_obj.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge annotated files into {subject}_all_years.json, re-reading only what changed")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and re-read every input file")
+    parser.add_argument("--split", action="store_true",
+                        help="Also regenerate the split trees (split_engine.py) of subjects whose merged file changed")
+    args = parser.parse_args()
+
+    start = time.time()
+    changed = []
+    for subject in resolve_subjects(args.subjects):
+        if not annotated_folder(subject).exists():
+            print(f"⏭️  {subject}: no {annotated_folder(subject)}/")
+            continue
+        result = merge_subject(subject, force=args.force)
+        if result["changed"]:
+            changed.append(subject)
+            print(f"✓ {subject}: rebuilt years {', '.join(result['years'])} from {result['parsed']} files, "
+                  f"{result['total']} items")
+        elif result["years"]:
+            print(f"✓ {subject}: re-read {result['parsed']} files, merged output unchanged")
+        else:
+            print(f"⏭️  {subject}: up to date ({result['total']} items)")
+    print(f"⏱️  Merged in {time.time() - start:.2f}s")
+
+    if args.split and changed:
+        import split_engine
+        for subject in changed:
+            counts = split_engine.split_subject(subject, split_engine.DEFAULT_LAYOUTS)
+            print(f"✓ Split {subject}: {counts['questions']} questions")
+
+
+if __name__ == "__main__":
+    main()
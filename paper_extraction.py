@@ -0,0 +1,197 @@
+# The extraction shared by process_paper.py, process_hindi_paper.py and
+# process_english_paper.py: extract_paper picks the models (cascade) and page shards,
+# and extract_questions replays a cached response or uploads the PDF (or only its
+# scanned pages, see pdf_text.py), runs the script's prompt and parses the JSON array.
+# The scripts differ only in the prompt builder, safety settings and whether a text
+# layer must contain Devanagari to be trusted.
+import json
+import pathlib
+import re
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+import job_ledger
+import llm_backend
+import llm_cache
+import pdf_shards
+import pdf_text
+import stream_json
+import telemetry
+import validation
+
+
+def clean_json_response(raw_text: str) -> str:
+    """
+    Cleans the raw text response from the Gemini API to extract a valid JSON string.
+    It removes markdown code fences and any leading/trailing text.
+    """
+    # Use regex to find the JSON block within markdown fences
+    match = re.search(r'```json\s*([\s\S]*?)\s*```', raw_text, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    # Fallback for responses that might not have the fences but are still valid JSON
+    return raw_text.strip()
+
+
+def _report_blocked(response) -> None:
+    print("\n--- ERROR: Response blocked by Gemini API ---")
+    if response.candidates and response.candidates[0].safety_ratings:
+        print("Safety Ratings:")
+        for rating in response.candidates[0].safety_ratings:
+            print(f"  {rating.category}: {rating.probability}")
+    if hasattr(response, 'prompt_feedback'):
+        print(f"Prompt Feedback: {response.prompt_feedback}")
+    print("\nThis PDF may contain content flagged by safety filters.")
+    print("Try manually reviewing the PDF or using a different extraction method.")
+    print("-" * 50)
+
+
+def extract_questions(input_path: pathlib.Path, cache_key: str, build_prompt: Callable[[str], List[Dict[str, Any]]],
+                      model_name: str = validation.PRO_MODEL, upload_slots=None, generation_slots=None,
+                      use_cache=True, note: str = None, stream=False, text_layer=False, usage=None,
+                      safety_settings: Optional[List[Dict[str, str]]] = None, require_devanagari: bool = True,
+                      first_page: int = 1):
+    """
+    Uploads one PDF, runs the prompt `build_prompt(file_uri)` returns and gives back
+    the parsed question list. Returns None if the response was blocked or could not
+    be parsed. `note` is an extra instruction appended to the prompt (used for page
+    shards); `safety_settings` are passed on to the generation.
+    With `stream=True` each question is checkpointed as soon as it is complete, and
+    a failed attempt resumes from the last complete question (see stream_json.py).
+    With `text_layer=True` pages with a usable embedded text layer are sent as plain
+    text and only the scanned pages are uploaded (see pdf_text.py); `first_page` is the
+    paper's page number of the PDF's first page, so a shard's pages keep their real numbers.
+    Token counts of the generation are added to the `usage` dict if one is given.
+    The response is cached under `cache_key` once it parses as JSON.
+    """
+    raw_text = llm_cache.load_response(cache_key) if use_cache else None
+    uploaded_file = None
+    call = None  # metrics for a live (non-cached) call, see telemetry.py
+    # Only passed when set: the replay backend keys recordings on the generation arguments
+    generate_kwargs = {"safety_settings": safety_settings} if safety_settings else {}
+
+    if raw_text is not None:
+        print("Replaying cached Gemini response (upload and generation skipped)")
+    else:
+        call = telemetry.Call("extract", model_name, "gemini", str(input_path), stream=stream, text_layer=text_layer)
+        upload_path, text_pages, scanned_pages = input_path, {}, []
+        if text_layer:
+            upload_path, text_pages, scanned_pages = pdf_text.split_text_layer(input_path, require_devanagari, first_page)
+            print(f"Text layer: {len(text_pages)} pages sent as text, {len(scanned_pages)} scanned pages uploaded")
+
+        # Step 1: Upload the file to the Gemini File API
+        if upload_path is not None:
+            print("Uploading file to the File API...")
+            try:
+                with upload_slots or nullcontext(), call.timing("upload_seconds"):
+                    uploaded_file = llm_backend.upload_file(path=upload_path, display_name=input_path.name)
+            finally:
+                if upload_path != input_path:
+                    upload_path.unlink()  # temporary PDF with only the scanned pages
+            print(f"File uploaded successfully: {uploaded_file.uri}")
+
+        # Step 2: Construct the detailed prompt
+        prompt_parts = build_prompt(uploaded_file.uri if uploaded_file else "")
+        prompt_parts = pdf_text.with_text_pages(prompt_parts, text_pages, scanned_pages, uploaded_file is not None)
+        if note:
+            prompt_parts.append({'text': note})
+
+        # Step 3: Call the Gemini API to generate the content
+        print("Generating content with Gemini... (This may take a moment)")
+        model = llm_backend.GenerativeModel(model_name=model_name)
+        try:
+            with generation_slots or nullcontext(), call.timing("generate_seconds"):
+                if stream:
+                    raw_text = stream_json.stream_generate(model, prompt_parts, cache_key, usage, call,
+                                                           **generate_kwargs)
+                else:
+                    response = model.generate_content(prompt_parts, **generate_kwargs)
+                    job_ledger.add_usage(usage, response)
+                    call.usage(response)
+        except Exception as e:
+            call.record(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            # Optional: Delete the file from the File API after processing
+            if uploaded_file is not None:
+                print(f"Deleting file {uploaded_file.name} from the API...")
+                llm_backend.delete_file(uploaded_file.name)
+                print("File deleted.")
+
+        # Check if response was blocked by safety filters
+        if stream:
+            if raw_text is None:
+                call.record(error="Stream ended early")
+                return None
+        elif not response.candidates or not response.candidates[0].content.parts:
+            _report_blocked(response)
+            call.record(error="Response blocked")
+            return None
+        else:
+            raw_text = response.text
+
+    # Step 4: Clean and parse the response
+    print("Cleaning and parsing the JSON response...")
+    try:
+        cleaned_json_string = clean_json_response(raw_text)
+        data = json.loads(cleaned_json_string)
+    except json.JSONDecodeError as e:
+        print("\n--- ERROR: Failed to decode JSON from the model's response. ---")
+        print(f"Error details: {e}")
+        print("\n--- Raw Model Response: ---")
+        print(raw_text)
+        print("\n--------------------------")
+        if call:
+            call.record(error="Invalid JSON")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        print("\n--- Raw Model Response: ---")
+        print(raw_text)
+        if call:
+            call.record(error="Invalid JSON")
+        return None
+
+    if call:
+        # Only a response that parses is cached, so a truncated one is regenerated next run
+        llm_cache.save_response(cache_key, raw_text, model=model_name, source=input_path.name)
+        call.record(questions=len(data) if isinstance(data, list) else None)
+    return data
+
+
+def extract_paper(input_path: pathlib.Path, build_prompt: Callable[[str], List[Dict[str, Any]]],
+                  upload_slots=None, generation_slots=None, use_cache=True, shard_pages=None, stream=False,
+                  text_layer=False, usage=None, cascade=False,
+                  safety_settings: Optional[List[Dict[str, str]]] = None, require_devanagari: bool = True):
+    """
+    Extracts a whole paper with the prompt from `build_prompt`: the PDF at once, or with
+    `shard_pages=N` in N-page shards stitched back together (see pdf_shards.py). With
+    `cascade=True` the flash model goes first and pro only reruns output (or a shard's
+    output) that fails validation.extraction_problems. Returns None on failure.
+    """
+    models = [validation.FAST_MODEL, validation.PRO_MODEL] if cascade else [validation.PRO_MODEL]
+    prompt_template = build_prompt("")
+
+    def model_cache_key(model_name):
+        cache_key = llm_cache.pdf_prompt_key(input_path, prompt_template, model_name)
+        if text_layer:
+            cache_key = llm_cache.make_key(cache_key, "text-layer")
+        return cache_key
+
+    def extract(pdf_path, cache_key, model_name, note=None, first_page=1):
+        return extract_questions(pdf_path, cache_key, build_prompt, model_name, upload_slots, generation_slots,
+                                 use_cache, note=note, stream=stream, text_layer=text_layer, usage=usage,
+                                 safety_settings=safety_settings, require_devanagari=require_devanagari,
+                                 first_page=first_page)
+
+    if not shard_pages:
+        return validation.cascade(models, lambda model_name: extract(input_path, model_cache_key(model_name), model_name),
+                                  validation.extraction_problems, input_path.name)
+
+    def extract_shard(shard_path, first_page, last_page, note):
+        def attempt(model_name):
+            cache_key = llm_cache.make_key(model_cache_key(model_name), f"pages:{first_page}-{last_page}", note)
+            return extract(shard_path, cache_key, model_name, note, first_page)
+        return validation.cascade(models, attempt, validation.extraction_problems,
+                                  f"{input_path.name} pages {first_page}-{last_page}")
+    return pdf_shards.extract_in_shards(input_path, shard_pages, extract_shard)
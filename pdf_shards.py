@@ -0,0 +1,172 @@
+import difflib
+import pathlib
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # Only needed when sharding is switched on
+    PdfReader = PdfWriter = None
+
+# "obj_3", "short_12", "long_4_2", "letter_writing_1" -> (prefix, main number, alternative)
+ID_PATTERN = re.compile(r"^(?P<prefix>[A-Za-z]+(?:_[A-Za-z]+)*)_(?P<main>\d+)(?:_(?P<alt>\d+))?$")
+# Each shard also gets the next shard's first page, so a question that starts on its
+# last page can be finished there; the next shard skips questions continued from before.
+OVERLAP_PAGES = 1
+# Questions at the end of one shard compared with the start of the next for duplicates
+BOUNDARY_WINDOW = 3
+DUPLICATE_SIMILARITY = 0.9
+
+
+def split_pdf(input_path: pathlib.Path, pages_per_shard: int, output_dir: pathlib.Path,
+              overlap: int = OVERLAP_PAGES) -> List[Tuple[pathlib.Path, int, int]]:
+    """
+    Writes the PDF out as consecutive page ranges, each followed by up to `overlap`
+    pages of the next range. Returns (shard_path, first_page, last_page) tuples with
+    1-based page numbers of the shard's own range (without the overlap).
+    """
+    if PdfReader is None:
+        raise ImportError("Page sharding needs pypdf. Install it with: pip install pypdf")
+    if pages_per_shard < 1:
+        raise ValueError("pages_per_shard must be at least 1")
+
+    reader = PdfReader(str(input_path))
+    total_pages = len(reader.pages)
+    shards = []
+    for first in range(0, total_pages, pages_per_shard):
+        last = min(first + pages_per_shard, total_pages)
+        writer = PdfWriter()
+        for page_index in range(first, min(last + overlap, total_pages)):
+            writer.add_page(reader.pages[page_index])
+        shard_path = pathlib.Path(output_dir) / f"{input_path.stem}_p{first + 1}-{last}.pdf"
+        with open(shard_path, "wb") as f:
+            writer.write(f)
+        shards.append((shard_path, first + 1, last))
+    return shards
+
+
+def shard_note(first_page: int, last_page: int, next_page: Optional[int] = None) -> str:
+    """Extra prompt text telling the model which part of the paper it sees and extracts."""
+    pages = f"pages {first_page}-{last_page}" + (f" and {next_page}" if next_page else "")
+    note = (f"Note: this PDF contains only {pages} of the question paper. "
+            f"Extract only the questions that start on pages {first_page}-{last_page}. ")
+    if next_page:
+        note += (f"Page {next_page} belongs to the next part and is included only so that you can finish a "
+                 f"question (and its \"or\"/\"athva\" alternatives) that starts on page {last_page}; do not "
+                 f"extract questions that start on page {next_page}. ")
+    if first_page > 1:
+        note += (f"If the first question on page {first_page} continues from an earlier page, or is an "
+                 "alternative of a question numbered on an earlier page, skip it: the previous part extracts it. ")
+    return note + "Start the numbering for each question type at 1 as usual."
+
+
+def _text(question: Any) -> str:
+    if not isinstance(question, dict):
+        return ""
+    text = " ".join(str(question.get(field) or "") for field in ("question", "prashna"))
+    return " ".join(text.lower().split())
+
+
+def _same_question(a: str, b: str) -> bool:
+    # A question cut at the page break is a prefix of its complete copy
+    if not a or not b:
+        return False
+    return a.startswith(b) or b.startswith(a) or difflib.SequenceMatcher(None, a, b).ratio() >= DUPLICATE_SIMILARITY
+
+
+def drop_boundary_duplicates(shard_results: List[List[Dict[str, Any]]],
+                             labels: Sequence[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Removes questions that two neighbouring shards both extracted at their shared page
+    break (compared by text over BOUNDARY_WINDOW questions each side). The longer copy
+    is kept in the earlier shard, and every drop is reported.
+    """
+    results = [list(questions) for questions in shard_results]
+    for i in range(1, len(results)):
+        before, after = results[i - 1], results[i]
+        tail = range(max(0, len(before) - BOUNDARY_WINDOW), len(before))
+        for j in reversed(range(min(BOUNDARY_WINDOW, len(after)))):
+            match = next((k for k in tail if _same_question(_text(before[k]), _text(after[j]))), None)
+            if match is None:
+                continue
+            if len(_text(after[j])) > len(_text(before[match])):
+                before[match] = {**after[j], "id": before[match].get("id")}
+            print(f"⚠️  {after[j].get('id')} of pages {labels[i]} repeats {before[match].get('id')} of pages "
+                  f"{labels[i - 1]}; keeping one copy")
+            del after[j]
+    return results
+
+
+def stitch_question_ids(shard_results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Concatenates per-shard question arrays and renumbers their ids so that each
+    type prefix keeps counting from 1 across the whole paper.
+
+    Within one shard, alternatives that share a question number (long_3_1, long_3_2)
+    keep sharing the new number. A shard whose first question of a prefix is a later
+    alternative (long_1_2) continues the previous shard's last question of that prefix,
+    so it keeps that number; this is reported, since the model was asked to avoid it.
+    Ids that do not follow the prefix_N[_M] pattern are left untouched.
+    """
+    next_number: Dict[str, int] = {}
+    last_alt: Dict[str, Optional[str]] = {}
+    merged = []
+    for questions in shard_results:
+        # (prefix, old main number) -> new main number, for this shard only
+        renumbered: Dict[Tuple[str, str], int] = {}
+        for question in questions:
+            match = ID_PATTERN.match(str(question.get("id", ""))) if isinstance(question, dict) else None
+            if not match:
+                merged.append(question)
+                continue
+            prefix, main, alt = match.group("prefix"), match.group("main"), match.group("alt")
+            if (prefix, main) not in renumbered and not any(key[0] == prefix for key in renumbered) \
+                    and alt not in (None, "1") and last_alt.get(prefix) is not None:
+                print(f"⚠️  {question['id']} starts a shard but is an alternative; "
+                      f"joining it to {prefix}_{next_number[prefix]}")
+                renumbered[(prefix, main)] = next_number[prefix]
+            if (prefix, main) not in renumbered:
+                next_number[prefix] = next_number.get(prefix, 0) + 1
+                renumbered[(prefix, main)] = next_number[prefix]
+            new_id = f"{prefix}_{renumbered[(prefix, main)]}"
+            if alt is not None:
+                new_id += f"_{alt}"
+            last_alt[prefix] = alt
+            merged.append({**question, "id": new_id})
+    return merged
+
+
+def extract_in_shards(input_path: pathlib.Path, pages_per_shard: int,
+                      extract_shard: Callable[[pathlib.Path, int, int, str], Optional[List[Dict[str, Any]]]],
+                      max_workers: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Splits the PDF, runs `extract_shard(shard_path, first_page, last_page, note)` for every
+    shard in parallel, where `note` is the shard_note to append to the prompt, and stitches
+    the results. Returns None if any shard failed; shards that did succeed stay in the
+    response cache, so a retry only redoes the failed ones.
+    """
+    with tempfile.TemporaryDirectory(prefix="shards_") as tmp_dir:
+        shards = split_pdf(input_path, pages_per_shard, pathlib.Path(tmp_dir))
+        if not shards:
+            print(f"❌ {input_path.name} has no pages to shard; not writing {input_path.stem}")
+            return None
+        total_pages = shards[-1][2]
+        print(f"Split {input_path.name} into {len(shards)} shards of up to {pages_per_shard} pages "
+              f"(+{OVERLAP_PAGES} overlap)")
+
+        def run(shard: Tuple[pathlib.Path, int, int]) -> Optional[List[Dict[str, Any]]]:
+            shard_path, first, last = shard
+            next_page = last + 1 if OVERLAP_PAGES and last < total_pages else None
+            return extract_shard(shard_path, first, last, shard_note(first, last, next_page))
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(shards)) as executor:
+            results = list(executor.map(run, shards))
+
+    labels = [f"{first}-{last}" for _, first, last in shards]
+    failed = [label for label, result in zip(labels, results) if result is None]
+    if failed:
+        print(f"❌ Shards for pages {', '.join(failed)} failed; not writing {input_path.stem}")
+        return None
+    return stitch_question_ids(drop_boundary_duplicates(results, labels))
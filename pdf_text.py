@@ -0,0 +1,99 @@
+import pathlib
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # Only needed when text-layer mode is switched on
+    PdfReader = PdfWriter = None
+
+# A page needs at least this many non-space characters to count as having a text layer
+MIN_PAGE_CHARS = 200
+# ...and at least this share of them must be letters (scans with OCR junk fail this)
+MIN_LETTER_RATIO = 0.6
+# Pages of bilingual papers must contain some real Devanagari; legacy Hindi fonts
+# (Kruti Dev etc.) extract as Latin gibberish and are better sent as images
+MIN_DEVANAGARI_CHARS = 20
+
+
+def _is_devanagari(ch: str) -> bool:
+    return "\u0900" <= ch <= "\u097f"
+
+
+def has_usable_text(text: str, require_devanagari: bool = False) -> bool:
+    stripped = "".join((text or "").split())
+    if len(stripped) < MIN_PAGE_CHARS or "\ufffd" in stripped:
+        return False
+    letters = sum(ch.isalpha() for ch in stripped)
+    if letters / len(stripped) < MIN_LETTER_RATIO:
+        return False
+    if require_devanagari and sum(_is_devanagari(ch) for ch in stripped) < MIN_DEVANAGARI_CHARS:
+        return False
+    return True
+
+
+def extract_page_texts(input_path: pathlib.Path) -> List[str]:
+    """Returns the embedded text of every page ("" where there is none)."""
+    if PdfReader is None:
+        raise ImportError("Text-layer extraction needs pypdf. Install it with: pip install pypdf")
+    reader = PdfReader(str(input_path))
+    texts = []
+    for page in reader.pages:
+        try:
+            texts.append(page.extract_text() or "")
+        except Exception:
+            texts.append("")  # broken content stream: treat as scanned
+    return texts
+
+
+def split_text_layer(input_path: pathlib.Path, require_devanagari: bool = False,
+                     first_page: int = 1) -> Tuple[Optional[pathlib.Path], Dict[int, str], List[int]]:
+    """
+    Sorts the pages into those with a usable text layer and scanned ones. Pages are
+    numbered from `first_page`, the paper's page number of a shard's first page.
+
+    Returns (pdf_path, text_pages, scanned_pages):
+    - pdf_path: a temporary PDF holding only the scanned pages (the caller deletes it),
+      the original path if no page has usable text, or None if every page does
+    - text_pages: {page number: text} for pages sent as plain text
+    - scanned_pages: page numbers that stay in the PDF
+    """
+    texts = extract_page_texts(input_path)
+    text_pages = {first_page + i: t for i, t in enumerate(texts) if has_usable_text(t, require_devanagari)}
+    scanned_pages = [first_page + i for i in range(len(texts)) if first_page + i not in text_pages]
+
+    if not text_pages:
+        return input_path, {}, scanned_pages
+    if not scanned_pages:
+        return None, text_pages, []
+
+    reader = PdfReader(str(input_path))
+    writer = PdfWriter()
+    for page_number in scanned_pages:
+        writer.add_page(reader.pages[page_number - first_page])
+    with tempfile.NamedTemporaryFile(prefix=f"{input_path.stem}_scanned_", suffix=".pdf", delete=False) as f:
+        writer.write(f)
+        return pathlib.Path(f.name), text_pages, scanned_pages
+
+
+def with_text_pages(prompt_parts: List[Dict[str, Any]], text_pages: Dict[int, str],
+                    scanned_pages: List[int], has_pdf: bool) -> List[Dict[str, Any]]:
+    """
+    Rewrites the prompt from generate_extraction_prompt so the text-layer pages are
+    sent as plain text and the attached PDF (if any) only covers the scanned pages.
+    """
+    if not text_pages:
+        return prompt_parts
+
+    parts = [part for part in prompt_parts if has_pdf or "file_data" not in part]
+    if has_pdf:
+        layout = (f"The attached PDF contains only pages {', '.join(map(str, scanned_pages))} of the paper. "
+                  f"Pages {', '.join(map(str, text_pages))} are given below as extracted text. ")
+    else:
+        layout = "No PDF is attached: every page of the paper is given below as extracted text. "
+    note = (layout + "Treat all of them as one question paper, read in page order. The extracted text "
+            "may have lost sub/superscripts and layout, so restore LaTeX notation where it is clearly intended.")
+    parts.append({"text": note})
+    for page_number, text in text_pages.items():
+        parts.append({"text": f"--- Page {page_number} (extracted text) ---\n{text}"})
+    return parts
@@ -0,0 +1,293 @@
+# Make-style runner for the whole pipeline: download -> extract -> annotate -> merge -> split.
+# Every (subject, year) gets download/extract/annotate tasks and every subject a merge and
+# a split task, each with its input and output files. A task runs only when
+#   - one of its outputs is missing,
+#   - the content hash of one of its inputs differs from when it last ran, or
+#   - a task it depends on rewrote its outputs in this run.
+# Outputs made before the pipeline tracked them are adopted as up to date. Hashes are
+# kept in .pipeline_state.json (PIPELINE_STATE) and only recomputed for files whose size
+# or mtime changed. Extraction and annotation (model calls) run on a thread pool sharing
+# the upload/generation limits of run_extraction.py / run_annotation.py; merge and split
+# run on a process pool. Independent subjects and years proceed in parallel, so after a
+# new year is released `python pipeline.py --years 2026 --download` touches that year's
+# papers and the merged and split files of the subjects that gained one, nothing else.
+# --years is taken as given, even for years not yet in SUBJECTS[subject]["years"]; without
+# it the registry's years are used, so add the new year there for later full runs.
+import argparse
+import concurrent.futures
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import annotation_engine
+import chapter_classifier
+import llm_backend
+import merge_incremental
+import run_annotation
+import run_extraction
+import split_engine
+import syllabus_index
+from llm_cache import file_sha256, sha256_text
+from subjects import SUBJECTS, annotated_path, data_path, find_paper, papers_folder, resolve_subjects
+
+STATE_PATH = pathlib.Path(os.environ.get("PIPELINE_STATE", ".pipeline_state.json"))
+STAGES = ("download", "extract", "annotate", "merge", "split")
+# Stages that wait on the network or a model run on threads; the rest are CPU-bound
+THREAD_STAGES = {"download", "extract", "annotate"}
+
+
+class Task:
+    def __init__(self, stage: str, subject: str, year: Optional[int], inputs: Callable[[], List[pathlib.Path]],
+                 outputs: Sequence[pathlib.Path], deps: Sequence["Task"] = ()):
+        self.stage, self.subject, self.year = stage, subject, year
+        self.inputs = inputs  # evaluated when the task is reached, after its dependencies ran
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.status: Optional[str] = None  # ran, up to date, failed, blocked, unavailable
+        self.changed = False
+
+    @property
+    def id(self) -> str:
+        return f"{self.stage}:{self.subject}" + (f":{self.year}" if self.year is not None else "")
+
+
+class State:
+    """Input hashes per task at its last successful run, plus a (size, mtime) -> hash cache."""
+
+    def __init__(self, path: pathlib.Path = STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            data = {}
+        self.hashes: Dict[str, List[Any]] = data.get("hashes", {})
+        self.tasks: Dict[str, Dict[str, str]] = data.get("tasks", {})
+
+    def digest(self, path: pathlib.Path) -> Optional[str]:
+        """The file's SHA-256 (a folder's is its files' names and hashes), or None if it doesn't exist."""
+        if path.is_dir():
+            parts = [f"{p.relative_to(path)}:{self.digest(p)}" for p in sorted(path.rglob("*")) if p.is_file()]
+            return sha256_text("\n".join(parts))
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        key = str(path)
+        with self._lock:
+            cached = self.hashes.get(key)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = file_sha256(path)
+        with self._lock:
+            self.hashes[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def snapshot(self, paths: Sequence[pathlib.Path]) -> Dict[str, Optional[str]]:
+        return {str(p): self.digest(p) for p in paths}
+
+    def record(self, task: Task, inputs: Dict[str, Optional[str]]) -> None:
+        with self._lock:
+            self.tasks[task.id] = inputs
+
+    def save(self) -> None:
+        with self._lock:
+            data = json.dumps({"tasks": self.tasks, "hashes": self.hashes}, indent=2)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+
+def build_tasks(subjects: Sequence[str], years: Optional[Sequence[int]] = None, download: bool = False) -> List[Task]:
+    """The task graph, in dependency order."""
+    tasks = []
+    for subject in subjects:
+        annotate_tasks = []
+        # --years may name a year the registry doesn't list yet (a newly released paper)
+        for year in sorted(set(years) if years else SUBJECTS[subject]["years"], reverse=True):
+            paper = find_paper(subject, year)
+            download_task = None
+            if download and paper is None:
+                import pyqs
+                name = f"{pyqs.SUBJECT_ABBREV.get(subject)}_{year}.pdf"
+                # Only where pyqs.py saves papers under a name the rest of the pipeline looks for
+                if subject in pyqs.SUBJECT_ABBREV and name in SUBJECTS[subject]["paper_names"]:
+                    paper = papers_folder(subject) / name
+                    download_task = Task("download", subject, year, lambda: [], [paper])
+                    tasks.append(download_task)
+            extract_task = None
+            if paper is not None:
+                extract_task = Task("extract", subject, year, lambda paper=paper: [paper], [data_path(subject, year)],
+                                    [download_task] if download_task else [])
+                tasks.append(extract_task)
+            if extract_task is not None or data_path(subject, year).exists():
+                annotate_tasks.append(Task("annotate", subject, year, lambda s=subject, y=year: [data_path(s, y)],
+                                           [annotated_path(subject, year)], [extract_task] if extract_task else []))
+        tasks.extend(annotate_tasks)
+        if not annotate_tasks:
+            continue
+        merged = pathlib.Path(merge_incremental.output_path(subject))
+        merge_task = Task("merge", subject, None,
+                          lambda s=subject: [pathlib.Path(p) for p in merge_incremental.input_files(s)],
+                          [merged], annotate_tasks)
+        split_task = Task("split", subject, None, lambda merged=merged: [merged],
+                          [pathlib.Path(split_engine.layout_folder(subject, name)) for name in split_engine.DEFAULT_LAYOUTS],
+                          [merge_task])
+        tasks.extend([merge_task, split_task])
+    return tasks
+
+
+def staleness(task: Task, state: State, inputs: Dict[str, Optional[str]]) -> Optional[str]:
+    """Why the task has to run, or None if its outputs are up to date."""
+    if any(dep.changed for dep in task.deps):
+        return "inputs rebuilt"
+    if any(not p.exists() for p in task.outputs):
+        return "missing output"
+    recorded = state.tasks.get(task.id)
+    if recorded is not None and recorded != inputs:
+        return "inputs changed"
+    return None
+
+
+# --- Stage runners (module level so the process pool can pickle them) ---
+
+def _download(task: Task, options: Dict[str, Any]) -> None:
+    import pyqs
+    pyqs.download_papers(task.subject, task.year, task.year)
+    if not task.outputs[0].exists():
+        raise RuntimeError(f"{task.outputs[0]} was not downloaded")
+
+
+def _extract(task: Task, options: Dict[str, Any]) -> None:
+    paper, = task.inputs()
+    run_extraction.run_job((task.subject, task.year, paper, task.outputs[0]), options["upload_slots"],
+                           options["generation_slots"], cascade=options["cascade"])
+    if not task.outputs[0].exists():
+        raise RuntimeError("No output file")
+
+
+def _annotate(task: Task, options: Dict[str, Any]) -> None:
+    data, = task.inputs()
+    if not run_annotation.run_job((task.subject, task.year, data, task.outputs[0]), options["cascade"],
+                                  options["chunk_size"], generation_slots=options["generation_slots"],
+                                  local_precision=chapter_classifier.DEFAULT_PRECISION,
+                                  candidate_count=syllabus_index.DEFAULT_CANDIDATES):
+        raise RuntimeError("Unparseable response")
+
+
+def _merge(subject: str) -> None:
+    merge_incremental.merge_subject(subject)
+
+
+def _split(subject: str) -> None:
+    split_engine.split_subject(subject, split_engine.DEFAULT_LAYOUTS)
+
+
+RUNNERS = {"download": _download, "extract": _extract, "annotate": _annotate, "merge": _merge, "split": _split}
+
+
+def run(tasks: List[Task], state: State, workers: int, processes: int, options: Dict[str, Any],
+        dry_run: bool = False) -> None:
+    """Runs every stale task once its dependencies are done, the independent ones in parallel."""
+    configured = dry_run
+    pending = list(tasks)
+    running: Dict[concurrent.futures.Future, Any] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as threads, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=processes) as cpu:
+        while pending or running:
+            for task in [t for t in pending if all(dep.status is not None for dep in t.deps)]:
+                pending.remove(task)
+                if any(dep.status in ("failed", "blocked") for dep in task.deps):
+                    task.status = "blocked"
+                    print(f"⏭️  {task.id}: blocked by a failed dependency")
+                    continue
+                inputs = state.snapshot(task.inputs())
+                # A dry run can't know the inputs an upstream task would have written
+                if any(digest is None for digest in inputs.values()) and not (dry_run and any(d.changed for d in task.deps)):
+                    task.status = "unavailable"
+                    continue
+                reason = staleness(task, state, inputs)
+                if reason is None:
+                    task.status = "up to date"
+                    state.record(task, inputs)  # adopts outputs made before the pipeline tracked them
+                    continue
+                print(f"▶️  {task.id}: {reason}")
+                if dry_run:
+                    task.status, task.changed = "ran", True
+                    continue
+                if task.stage in ("extract", "annotate") and not configured:
+                    llm_backend.configure()  # fail fast on a missing key rather than in every worker
+                    configured = True
+                before = state.snapshot(task.outputs)
+                if task.stage in THREAD_STAGES:
+                    future = threads.submit(RUNNERS[task.stage], task, options)
+                else:
+                    future = cpu.submit(RUNNERS[task.stage], task.subject)
+                running[future] = (task, inputs, before, time.time())
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task, inputs, before, started = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    task.status = "failed"
+                    print(f"❌ {task.id}: {type(e).__name__}: {e}")
+                    continue
+                task.status = "ran"
+                task.changed = state.snapshot(task.outputs) != before
+                state.record(task, inputs)
+                state.save()
+                print(f"✓ {task.id} in {time.time() - started:.1f}s" + ("" if task.changed else " (output unchanged)"))
+    if not dry_run:
+        state.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring every stage of the pipeline up to date, running only what is stale")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--years", type=int, nargs="+",
+                        help="Only these years, even ones the subject registry doesn't list yet "
+                             "(merge and split still cover all years)")
+    parser.add_argument("--download", action="store_true", help="Download missing papers first (pyqs.py subjects only)")
+    parser.add_argument("--dry-run", action="store_true", help="List the tasks that would run, without running them")
+    parser.add_argument("--workers", type=int, default=8, help="Threads for download/extract/annotate tasks (default: 8)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Processes for merge/split tasks (default: CPU count)")
+    parser.add_argument("--max-uploads", type=int, default=4, help="Max uploads to the File API in flight (default: 4)")
+    parser.add_argument("--max-generations", type=int, default=8, help="Max model generations in flight (default: 8)")
+    parser.add_argument("--chunk-size", type=int, default=annotation_engine.DEFAULT_CHUNK_SIZE,
+                        help=f"Questions per annotation call (default: {annotation_engine.DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--cascade", action="store_true", help="Try the flash model first; rerun on pro only if validation fails")
+    args = parser.parse_args()
+
+    state = State()
+    tasks = build_tasks(resolve_subjects(args.subjects), args.years, args.download)
+    options = {"upload_slots": threading.BoundedSemaphore(args.max_uploads),
+               "generation_slots": threading.BoundedSemaphore(args.max_generations),
+               "chunk_size": args.chunk_size, "cascade": args.cascade}
+    start = time.time()
+    run(tasks, state, args.workers, args.processes, options, args.dry_run)
+
+    print(f"\n⏱️  Total execution time: {time.time() - start:.2f} seconds")
+    for stage in STAGES:
+        counts: Dict[str, int] = {}
+        for task in tasks:
+            if task.stage == stage:
+                counts[task.status] = counts.get(task.status, 0) + 1
+        if counts:
+            label = {"ran": "would run"} if args.dry_run else {}
+            print(f"{stage:<9} " + ", ".join(f"{n} {label.get(status, status)}" for status, n in sorted(counts.items())))
+    failed = [task for task in tasks if task.status == "failed"]
+    if failed:
+        print("Failed:")
+        for task in failed:
+            print(f"  - {task.id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,32 @@ import os
 import json
 import base64
 import time
-from google import genai
-from google.genai import types
+
+import llm_backend
+import telemetry
 
 # --- Configuration ---
 # You can adjust model names here
 MODEL_PRO = "gemini-1.5-pro" # or "gemini-3-pro-preview" as per user snippet
 MODEL_FLASH = "gemini-1.5-flash"
 
+# Subject of the current run, attached to every call's metrics (see telemetry.py)
+RUN_CONTEXT = {}
+
+def _turn(role, text):
+    # Plain dicts are what google.genai accepts as Content, so replayed runs
+    # (LLM_BACKEND=replay) don't need the SDK installed
+    return {"role": role, "parts": [{"text": text}]}
+
+
+def generate_tracked(client, model, contents, step):
+    """client.models.generate_content with per-call metrics (recorded/replayed per LLM_BACKEND)."""
+    with telemetry.track("predict", model, step=step, **RUN_CONTEXT) as call:
+        response = llm_backend.client_generate_content(client, model, contents)
+        call.usage(response)
+    return response
+
+
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
@@ -156,23 +174,17 @@ The goal is to ensure that a student who thoroughly prepares only these 12 quest
     encoded_json = base64.b64encode(json_bytes).decode('utf-8')
     
     contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_bytes(
-                    mime_type="application/json",
-                    data=base64.b64decode(encoded_json) 
-                ),
-                types.Part.from_text(text=prompt_text)
+        {
+            "role": "user",
+            "parts": [
+                {"inline_data": {"mime_type": "application/json", "data": base64.b64decode(encoded_json)}},
+                {"text": prompt_text}
             ]
-        )
+        }
     ]
     
-    response = client.models.generate_content(
-        model=MODEL_PRO,
-        contents=contents
-    )
-    return response.text, contents + [types.Content(role="model", parts=[types.Part.from_text(text=response.text)])]
+    response = generate_tracked(client, MODEL_PRO, contents, "analyze_and_generate_12")
+    return response.text, contents + [_turn("model", response.text)]
 
 def extend_to_20(client, history):
     """Step 2: Extend to 20 questions."""
@@ -180,13 +192,10 @@ def extend_to_20(client, history):
     
     prompt_text = "please provide 20, in the order which has highest probable question on top"
     
-    history.append(types.Content(role="user", parts=[types.Part.from_text(text=prompt_text)]))
+    history.append(_turn("user", prompt_text))
     
-    response = client.models.generate_content(
-        model=MODEL_PRO,
-        contents=history
-    )
-    return response.text, history + [types.Content(role="model", parts=[types.Part.from_text(text=response.text)])]
+    response = generate_tracked(client, MODEL_PRO, history, "extend_to_20")
+    return response.text, history + [_turn("model", response.text)]
 
 def extract_questions_text(client, history):
     """Step 3: Extract just the question text."""
@@ -194,13 +203,11 @@ def extract_questions_text(client, history):
     
     prompt_text = "Please write down the questions, just the questions..."
     
-    history.append(types.Content(role="user", parts=[types.Part.from_text(text=prompt_text)]))
+    history.append(_turn("user", prompt_text))
     
-    response = client.models.generate_content(
-        model=MODEL_FLASH, # Switching to Flash as requested for subsequent prompts
-        contents=history
-    )
-    return response.text, history + [types.Content(role="model", parts=[types.Part.from_text(text=response.text)])]
+    # Switching to Flash as requested for subsequent prompts
+    response = generate_tracked(client, MODEL_FLASH, history, "extract_questions_text")
+    return response.text, history + [_turn("model", response.text)]
 
 def translate_to_hindi(client, history):
     """Step 4: Translate to Hindi."""
@@ -208,13 +215,10 @@ def translate_to_hindi(client, history):
     
     prompt_text = "in Hindi please"
     
-    history.append(types.Content(role="user", parts=[types.Part.from_text(text=prompt_text)]))
+    history.append(_turn("user", prompt_text))
     
-    response = client.models.generate_content(
-        model=MODEL_FLASH,
-        contents=history
-    )
-    return response.text, history + [types.Content(role="model", parts=[types.Part.from_text(text=response.text)])]
+    response = generate_tracked(client, MODEL_FLASH, history, "translate_to_hindi")
+    return response.text, history + [_turn("model", response.text)]
 
 def generate_answers(client, history, subject_name):
     """Step 5: Generate detailed answers."""
@@ -230,13 +234,10 @@ I am providing you with 20 important Long Answer Questions. Your task is to writ
 3. **Detail:** Include definitions, principles, formulas, chemical reactions, or diagrams (described in text) wherever necessary.
 4. **Tone:** Academic, clear, and easy to memorize for a student."""
     
-    history.append(types.Content(role="user", parts=[types.Part.from_text(text=prompt_text)]))
+    history.append(_turn("user", prompt_text))
     
-    response = client.models.generate_content(
-        model=MODEL_FLASH,
-        contents=history
-    )
-    return response.text, history + [types.Content(role="model", parts=[types.Part.from_text(text=response.text)])]
+    response = generate_tracked(client, MODEL_FLASH, history, "generate_answers")
+    return response.text, history + [_turn("model", response.text)]
 
 def generate_html(client, history, subject_name):
     """Step 6: Generate HTML."""
@@ -325,12 +326,9 @@ You must use the EXACT CSS and HTML structure provided below. Do not change the
 6. Use `<strong>` for headings inside the answer.
 7. Output only the full HTML code."""
 
-    history.append(types.Content(role="user", parts=[types.Part.from_text(text=prompt_text)]))
+    history.append(_turn("user", prompt_text))
     
-    response = client.models.generate_content(
-        model=MODEL_FLASH,
-        contents=history
-    )
+    response = generate_tracked(client, MODEL_FLASH, history, "generate_html")
     return response.text, history
 
 def save_html(html_content, folder_path, subject_name):
@@ -356,18 +354,23 @@ def main():
     clear_screen()
     
     # 1. Setup
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY environment variable not set.")
-        return
+    # Replayed runs (LLM_BACKEND=replay) need no key and no client
+    client = None
+    if not llm_backend.replaying():
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            print("Error: GEMINI_API_KEY environment variable not set.")
+            return
 
-    client = genai.Client(api_key=api_key)
+        from google import genai
+        client = genai.Client(api_key=api_key)
 
     # 2. User Input
     target_folder, subject_name, total_q, solve_q = get_user_input()
     
     print(f"\nProcessing folder: {target_folder}")
     print(f"Subject: {subject_name}")
+    RUN_CONTEXT["subject"] = subject_name
     
     # 3. Read JSON
     json_path = find_json_file(target_folder)
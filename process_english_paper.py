@@ -1,43 +1,14 @@
-import os
-import google.generativeai as genai
 import json
 import argparse
 import pathlib
 import textwrap
-import re
 import time
-from dotenv import load_dotenv
 
-# --- Configuration ---
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Set your API key securely.
-# It's recommended to use environment variables or a secrets manager.
-GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
-
-if not GOOGLE_API_KEY:
-    raise ValueError("Gemini API key not found. Please set the GOOGLE_API_KEY environment variable.")
-
-genai.configure(api_key=GOOGLE_API_KEY)
+import paper_extraction
 
 
 # --- Core Functions ---
 
-def clean_json_response(raw_text: str) -> str:
-    """
-    Cleans the raw text response from the Gemini API to extract a valid JSON string.
-    It removes markdown code fences and any leading/trailing text.
-    """
-    # Use regex to find the JSON block within markdown fences
-    match = re.search(r'```json\s*([\s\S]*?)\s*```', raw_text, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    # Fallback for responses that might not have the fences but are still valid JSON
-    return raw_text.strip()
-
-
 def generate_extraction_prompt(uploaded_file_uri: str) -> list:
     """
     Constructs the detailed prompt for the Gemini API, including the file
@@ -93,9 +64,21 @@ def generate_extraction_prompt(uploaded_file_uri: str) -> list:
         }}
     ]
 
-def process_question_paper(input_pdf_path: str, output_json_path: str):
+def process_question_paper(input_pdf_path: str, output_json_path: str, upload_slots=None, generation_slots=None, use_cache=True, shard_pages=None, stream=False, text_layer=False, usage=None, cascade=False):
     """
     Main function to process a question paper PDF and generate a structured JSON file.
+
+    `upload_slots` / `generation_slots` are optional semaphores (see run_extraction.py)
+    that cap how many uploads and generations are in flight across threads.
+    Responses are cached by PDF hash + prompt hash + model (see llm_cache.py);
+    pass `use_cache=False` to force a fresh generation.
+    With `shard_pages=N` the PDF is split into N-page shards that are extracted
+    concurrently and stitched back together (see pdf_shards.py).
+    `stream=True` streams the generation and checkpoints each question (see stream_json.py).
+    `text_layer=True` sends pages with an embedded text layer as plain text (see pdf_text.py).
+    `usage` is an optional dict that collects input/output token counts (see job_ledger.py).
+    `cascade=True` tries the flash model first and reruns on pro only if the output
+    (or, with sharding, a shard's output) fails the checks in validation.py.
     """
     start_time = time.time()
     print(f"Starting processing for: {input_pdf_path}")
@@ -104,37 +87,12 @@ def process_question_paper(input_pdf_path: str, output_json_path: str):
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found at: {input_pdf_path}")
 
-    # Step 1: Upload the file to the Gemini File API
-    print("Uploading file to the File API...")
-    uploaded_file = genai.upload_file(path=input_path, display_name=input_path.name)
-    print(f"File uploaded successfully: {uploaded_file.uri}")
-
-    # Step 2: Construct the detailed prompt
-    prompt_parts = generate_extraction_prompt(uploaded_file.uri)
-
-    # Step 3: Call the Gemini API to generate the content
-    print("Generating content with Gemini... (This may take a moment)")
-    model = genai.GenerativeModel(model_name="models/gemini-2.5-pro")
-    # model = genai.GenerativeModel(model_name="models/gemini-1.5-pro") # Fallback if needed
-    response = model.generate_content(prompt_parts)
-
-    # Step 4: Clean and parse the response
-    print("Cleaning and parsing the JSON response...")
-    try:
-        cleaned_json_string = clean_json_response(response.text)
-        data = json.loads(cleaned_json_string)
-    except json.JSONDecodeError as e:
-        print("\n--- ERROR: Failed to decode JSON from the model's response. ---")
-        print(f"Error details: {e}")
-        print("\n--- Raw Model Response: ---")
-        print(response.text)
-        print("\n--------------------------")
+    data = paper_extraction.extract_paper(input_path, generate_extraction_prompt, upload_slots, generation_slots,
+                                          use_cache, shard_pages, stream, text_layer, usage, cascade,
+                                          require_devanagari=False)
+
+    if data is None:
         return # Exit without writing a file
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        print("\n--- Raw Model Response: ---")
-        print(response.text)
-        return
 
     # Step 5: Write the structured data to the output file
     output_path = pathlib.Path(output_json_path)
@@ -145,11 +103,6 @@ def process_question_paper(input_pdf_path: str, output_json_path: str):
 
     print("\nProcessing complete! The JSON file has been created successfully.")
     
-    # Optional: Delete the file from the File API after processing
-    print(f"Deleting file {uploaded_file.name} from the API...")
-    genai.delete_file(uploaded_file.name)
-    print("File deleted.")
-    
     # Calculate and display execution time
     end_time = time.time()
     execution_time = end_time - start_time
@@ -1,6 +1,16 @@
 import os
 import requests
 
+# Abbreviated subject names for file naming
+SUBJECT_ABBREV = {
+    'biology': 'bio',
+    'chemistry': 'chem',
+    'physics': 'phy',
+    'english': 'eng',
+    'hindi': 'hin',
+    'mathematics': 'math'
+}
+
 def download_papers(subject, start_year=2009, end_year=2025, dest_folder=None):
     if dest_folder is None:
         dest_folder = f'{subject}_papers'
@@ -12,17 +22,7 @@ def download_papers(subject, start_year=2009, end_year=2025, dest_folder=None):
 
     for year in range(start_year, end_year + 1):
         url = base_url.format(year)
-        # Create abbreviated subject names for file naming
-        subject_abbrev = {
-            'biology': 'bio',
-            'chemistry': 'chem',
-            'physics': 'phy',
-            'english': 'eng',
-            'hindi': 'hin',
-            'mathematics': 'math'
-        }
-        
-        filename = os.path.join(dest_folder, f'{subject_abbrev[subject]}_{year}.pdf')
+        filename = os.path.join(dest_folder, f'{SUBJECT_ABBREV[subject]}_{year}.pdf')
         
         # Check if file already exists
         if os.path.exists(filename):
@@ -0,0 +1,174 @@
+# Token-bucket pacing for LLM calls, shared by every stage running in the process.
+# Each model gets a requests-per-minute and a tokens-per-minute bucket; a call waits
+# (in FIFO order) until both can cover it, so concurrent workers keep the quota
+# saturated instead of sleeping a fixed time or tripping 429s.
+# Override the defaults with LLM_RATE_LIMITS="model=RPM:TPM,model=RPM:TPM"
+# (e.g. "gemini-2.5-pro=150:2000000"); a model without limits is not paced.
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+# (RPM, TPM) per model, without the "models/" prefix
+DEFAULT_LIMITS: Dict[str, Tuple[int, int]] = {
+    "gemini-2.5-pro": (150, 2_000_000),
+    "gemini-2.5-flash": (1_000, 1_000_000),
+    # The free Groq tier the English annotator was written for (10k TPM)
+    "moonshotai/kimi-k2-instruct-0905": (60, 10_000),
+}
+
+# Gemini's tokens-per-minute quota counts input tokens only; Groq's counts input + output
+INPUT_ONLY_TPM_PREFIXES = ("gemini",)
+
+# Rough token estimates made before a request is sent; corrected from the
+# response's reported usage once it arrives
+CHARS_PER_TOKEN = 4
+FILE_PART_TOKENS = 258 * 12  # Gemini counts ~258 tokens per PDF page; papers run ~12 pages
+
+# Retries of a call rejected with 429 (the bucket pauses for the server's retry delay)
+RATE_LIMIT_RETRIES = 5
+
+
+def _model_key(model_name: str) -> str:
+    return model_name[len("models/"):] if model_name.startswith("models/") else model_name
+
+
+def configured_limits() -> Dict[str, Tuple[int, int]]:
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, (part.strip() for part in os.environ.get("LLM_RATE_LIMITS", "").split(","))):
+        name, _, values = item.rpartition("=")
+        rpm, _, tpm = values.partition(":")
+        if not name or not rpm.isdigit() or not tpm.isdigit():
+            raise ValueError(f"LLM_RATE_LIMITS entries look like model=RPM:TPM (got {item!r})")
+        limits[_model_key(name)] = (int(rpm), int(tpm))
+    return limits
+
+
+def estimate_tokens(contents: Any) -> int:
+    """Estimates the input tokens of a prompt (strings, parts dicts, SDK content types)."""
+    chars = 0
+    files = 0
+    stack = [contents]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            chars += len(item)
+        elif isinstance(item, (bytes, bytearray)):
+            chars += len(item)
+        elif isinstance(item, dict):
+            if "file_uri" in item:
+                files += 1
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif hasattr(item, "model_dump"):  # google.genai pydantic types
+            stack.append(item.model_dump(exclude_none=True))
+    return chars // CHARS_PER_TOKEN + files * FILE_PART_TOKENS
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 per second up to `per_minute`; the level may go negative (debt)."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class Limiter:
+    def __init__(self, name: str, rpm: int, tpm: int):
+        self.name = name
+        self.input_only = name.startswith(INPUT_ONLY_TPM_PREFIXES)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+
+    def acquire(self, tokens: int) -> float:
+        """Blocks until the call fits both budgets; returns the seconds waited."""
+        tokens = min(tokens, self.tokens.capacity)  # an oversized request waits for a full bucket
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            while True:
+                now = time.monotonic()
+                self.requests.refill(now)
+                self.tokens.refill(now)
+                if self._queue[0] is not ticket:
+                    self._cond.wait()
+                    continue
+                wait = max(self.paused_until - now, self.requests.seconds_until(1), self.tokens.seconds_until(tokens))
+                if wait <= 0:
+                    self.requests.level -= 1
+                    self.tokens.level -= tokens
+                    self._queue.popleft()
+                    self._cond.notify_all()
+                    return now - start
+                self._cond.wait(timeout=wait)
+
+    def expected_wait(self, tokens: int, requests: int = 1) -> float:
+        """Roughly how long `requests` calls of `tokens` in total would wait now, behind the calls already queued."""
+        tokens = min(tokens, self.tokens.capacity)
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return max(self.paused_until - now, self.requests.seconds_until(requests + len(self._queue)),
+                       self.tokens.seconds_until(tokens))
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        """Charges (or refunds) the difference between the estimate and the reported usage."""
+        if actual is None:
+            return
+        with self._cond:
+            self.tokens.level -= actual - min(estimated, self.tokens.capacity)
+            self._cond.notify_all()
+
+    def backoff(self, seconds: float) -> None:
+        """Holds every queued call for `seconds` after the server rejected one with 429."""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+_limiters: Dict[str, Optional[Limiter]] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model_name: str) -> Optional[Limiter]:
+    """The process-wide limiter for a model, or None if it has no configured limits."""
+    key = _model_key(model_name)
+    with _limiters_lock:
+        if key not in _limiters:
+            limits = configured_limits().get(key)
+            _limiters[key] = Limiter(key, *limits) if limits else None
+        return _limiters[key]
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """429 / quota errors from google.api_core, google.genai or the Groq client."""
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return status == 429 or type(error).__name__ in ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+
+
+def retry_after(error: Exception, attempt: int) -> float:
+    """The server's requested delay if it gave one, otherwise exponential from 5 s."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+    match = re.search(r"retry(?:_delay)?\D{0,20}?(\d+(?:\.\d+)?)", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else 5.0 * 2 ** attempt
@@ -1,12 +1,18 @@
 import time
 from process_hindi_paper import process_hindi_question_paper
 import pathlib
+import job_ledger
 
 def main():
     """Retry only the failed years with enhanced error reporting."""
     
-    # Years that failed in the batch run
-    failed_years = [2022, 2021, 2020, 2019, 2017, 2012]
+    # Years that failed (or were interrupted) in earlier runs, from the job ledger
+    job_ledger.sync(["hindi"], "extract")
+    failed_rows = job_ledger.jobs_with_status("extract", (job_ledger.FAILED, job_ledger.RUNNING), ["hindi"])
+    failed_years = [row["year"] for row in failed_rows]
+    if not failed_years:
+        print("No failed Hindi papers in the job ledger - nothing to retry.")
+        return
     
     input_folder = pathlib.Path("hindi_papers")
     output_folder = pathlib.Path("hindi_data")
@@ -35,6 +41,7 @@ def main():
         if output_json.exists():
             print(f"✓  {year} - Already successfully processed")
             success_count += 1
+            job_ledger.finish("hindi", year, "extract")
             continue
             
         print(f"\n{'='*60}")
@@ -44,20 +51,25 @@ def main():
         print(f"Output: {output_json}")
         
         start = time.time()
+        job_ledger.start("hindi", year, "extract")
+        usage = {}
         try:
-            process_hindi_question_paper(str(input_pdf), str(output_json))
+            process_hindi_question_paper(str(input_pdf), str(output_json), usage=usage)
             
             # Verify the output was created
             if output_json.exists():
                 print(f"✓  SUCCESS - {year} processed successfully")
                 success_count += 1
+                job_ledger.finish("hindi", year, "extract", time.time() - start, usage)
             else:
                 print(f"❌ FAILED - {year} - No output file created")
                 failed_list.append((year, "No output file"))
+                job_ledger.finish("hindi", year, "extract", time.time() - start, usage, error="No output file")
                 
         except Exception as e:
             print(f"❌ FAILED - {year} - Exception: {e}")
             failed_list.append((year, str(e)))
+            job_ledger.finish("hindi", year, "extract", time.time() - start, usage, error=str(e))
             
         end = time.time()
         print(f"⏱️  Time: {end - start:.2f}s ({(end - start)/60:.2f} min)")
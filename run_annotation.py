@@ -0,0 +1,152 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import annotation_engine
+import chapter_classifier
+import job_ledger
+import llm_backend
+import llm_router
+import syllabus_index
+import validation
+from subjects import SUBJECTS, annotated_path, data_folder, data_path, identify_file, resolve_subjects
+
+
+def collect_jobs(subjects, rescan=False):
+    """(subject, year, data file, annotated file) for every extracted paper still to annotate."""
+    job_ledger.sync(subjects, "annotate", rescan)
+    jobs = []
+    for row in job_ledger.runnable("annotate", subjects):
+        subject, year = row["subject"], row["year"]
+        out_path = annotated_path(subject, year)
+        if out_path.exists():
+            print(f"⏭️  Skipping {out_path.name} (already annotated)")
+            job_ledger.finish(subject, year, "annotate")
+            continue
+        jobs.append((subject, year, data_path(subject, year), out_path))
+    return jobs
+
+
+def collect_annotated(subjects):
+    """(subject, year, data file, annotated file) for every extracted paper that has been annotated."""
+    jobs = []
+    for subject in subjects:
+        for fpath in sorted(data_folder(subject).glob("*.json")):
+            _, year = identify_file(fpath.name)
+            if year is not None and annotated_path(subject, year).exists():
+                jobs.append((subject, year, fpath, annotated_path(subject, year)))
+    return jobs
+
+
+def run_job(job, cascade=False, chunk_size=annotation_engine.DEFAULT_CHUNK_SIZE, use_cache=True, generation_slots=None,
+            local_precision=None, reuse=True, candidate_count=0):
+    subject, year, fpath, out_path = job
+    with open(fpath, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+    known, label_versions = None, None
+    if out_path.exists():  # --delta: keep the labels that are still good
+        known, label_versions, stale = annotation_engine.delta_labels(subject, questions, out_path)
+        if not stale:
+            print(f"⏭️  Skipping {out_path.name} (labels up to date)")
+            if annotation_engine.load_provenance(out_path) is None:
+                annotation_engine.save_provenance(subject, questions, out_path, label_versions)
+            return True
+        print(f"{out_path.name}: re-annotating {sum(stale.values())} of {len(questions)} questions "
+              f"({', '.join(f'{n} {reason}' for reason, n in stale.items())})")
+    job_ledger.start(subject, year, "annotate")
+    usage = {}
+    start = time.time()
+    try:
+        annotated = annotation_engine.annotate_paper(subject, questions, chunk_size, cascade, usage, fpath.name,
+                                                     use_cache, generation_slots, local_precision, reuse,
+                                                     candidate_count, known)
+    except Exception as e:
+        job_ledger.finish(subject, year, "annotate", time.time() - start, usage, error=str(e))
+        raise
+    elapsed = time.time() - start
+    if annotated is None:
+        job_ledger.finish(subject, year, "annotate", elapsed, usage, error="Unparseable response")
+        return False
+    annotation_engine.save_annotations(subject, annotated, out_path, label_versions)
+    job_ledger.finish(subject, year, "annotate", elapsed, usage)
+    print(f"✓ Annotated data saved to: {out_path} ({elapsed:.1f}s)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate extracted papers with chapters/topics for several subjects")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects to annotate (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Try the flash model first; rerun on pro only if validation fails")
+    parser.add_argument("--rescan", action="store_true", help="Re-check output files for jobs the ledger already knows")
+    parser.add_argument("--workers", type=int, default=4, help="Papers annotated at the same time (default: 4)")
+    parser.add_argument("--max-generations", type=int, default=8, help="Max Gemini generations in flight (default: 8)")
+    parser.add_argument("--chunk-size", type=int, default=annotation_engine.DEFAULT_CHUNK_SIZE,
+                        help=f"Questions per call; chunks run concurrently and are retried alone "
+                             f"(default: {annotation_engine.DEFAULT_CHUNK_SIZE}, 0 = whole paper)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached chunk annotations and generate again")
+    parser.add_argument("--local-precision", type=float, default=chapter_classifier.DEFAULT_PRECISION,
+                        help="Label questions with the local classifier where it is calibrated to this precision "
+                             f"(default: {chapter_classifier.DEFAULT_PRECISION})")
+    parser.add_argument("--no-local", action="store_true", help="Don't use the local classifier")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="Don't copy labels from the same question in earlier annotated years")
+    parser.add_argument("--candidates", type=int, default=syllabus_index.DEFAULT_CANDIDATES,
+                        help="Topics shortlisted per question in narrowed prompts (physics); questions that fit none "
+                             f"are asked again with the full list (default: {syllabus_index.DEFAULT_CANDIDATES}, "
+                             "0 = always send the full list)")
+    parser.add_argument("--providers",
+                        help="Spread the pro model's calls over these providers by observed speed, errors and quota, "
+                             "failing over between them, e.g. gemini:models/gemini-2.5-pro,"
+                             "groq:moonshotai/kimi-k2-instruct-0905 (default: $LLM_PROVIDERS, else Gemini pro only)")
+    parser.add_argument("--delta", action="store_true",
+                        help="Also revisit annotated papers and re-send only questions that are new, whose text "
+                             "changed, or whose labels are no longer in the syllabus")
+    args = parser.parse_args()
+
+    router = llm_router.configure_pool(validation.PRO_MODEL, args.providers) if args.providers \
+        else llm_router.router_for(validation.PRO_MODEL)
+    if args.cascade or any(p.kind == "gemini" for p in router.providers):
+        llm_backend.configure()  # fail fast on a missing key rather than on the first job
+
+    subjects = resolve_subjects(args.subjects)
+    jobs = collect_jobs(subjects, args.rescan)
+    if args.delta:
+        jobs += collect_annotated(subjects)
+    if not jobs:
+        print("Nothing to do - every extracted paper has already been annotated.")
+        return
+
+    print(f"\nAnnotating {len(jobs)} papers with {args.workers} workers (generations ≤ {args.max_generations})")
+    generation_slots = threading.BoundedSemaphore(args.max_generations)
+    start = time.time()
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        local_precision = None if args.no_local else args.local_precision
+        futures = {executor.submit(run_job, job, args.cascade, args.chunk_size, not args.no_cache,
+                                   generation_slots, local_precision, not args.no_reuse,
+                                   args.candidates): job for job in jobs}
+        for future in as_completed(futures):
+            subject, year, fpath, _ = futures[future]
+            try:
+                if not future.result():
+                    failed.append((subject, year, "Unparseable response"))
+            except Exception as e:
+                print(f"❌ Error annotating {fpath}: {e}")
+                failed.append((subject, year, str(e)))
+
+    end = time.time()
+    print(f"\n⏱️  Total execution time: {end - start:.2f} seconds ({(end - start)/60:.2f} minutes)")
+    print(f"✓  Successful: {len(jobs) - len(failed)}/{len(jobs)}")
+    if len(router.providers) > 1:
+        print(f"Providers: {router.summary()}")
+    if failed:
+        print("Failed:")
+        for subject, year, reason in failed:
+            print(f"  - {subject} {year}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
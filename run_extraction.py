@@ -0,0 +1,123 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import job_ledger
+import llm_backend
+from subjects import SUBJECTS, data_path, find_paper, get_extractor, resolve_subjects
+
+
+def collect_jobs(subjects, years=None, rescan=False):
+    """
+    Build the list of (subject, year, pdf, json) jobs that still need extracting.
+    New papers are registered in the job ledger; pending, failed and interrupted
+    jobs are then read from it instead of checking every output file.
+    """
+    job_ledger.sync(subjects, "extract", rescan)
+    jobs = []
+    for row in job_ledger.runnable("extract", subjects):
+        subject, year = row["subject"], row["year"]
+        if years and year not in years:
+            continue
+        input_pdf = find_paper(subject, year)
+        output_json = data_path(subject, year)
+
+        # Registered earlier, but the PDF has since been moved or deleted
+        if input_pdf is None:
+            print(f"⚠️  {subject} {year}: paper no longer found; marking the job failed")
+            job_ledger.finish(subject, year, "extract", error="Paper not found")
+            continue
+
+        # Written by another script (e.g. process_paper.py) since the ledger last saw it
+        if output_json.exists():
+            print(f"⏭️  Skipping {input_pdf.name} -> {output_json.name} (already processed)")
+            job_ledger.finish(subject, year, "extract")
+            continue
+
+        jobs.append((subject, year, input_pdf, output_json))
+    return jobs
+
+
+def run_job(job, upload_slots, generation_slots, use_cache=True, shard_pages=None, stream=False, text_layer=False,
+            cascade=False):
+    subject, year, input_pdf, output_json = job
+    output_json.parent.mkdir(exist_ok=True)
+    extractor = get_extractor(subject)
+    job_ledger.start(subject, year, "extract")
+    usage = {}
+    start = time.time()
+    try:
+        extractor(str(input_pdf), str(output_json),
+                  upload_slots=upload_slots, generation_slots=generation_slots,
+                  use_cache=use_cache, shard_pages=shard_pages, stream=stream,
+                  text_layer=text_layer, usage=usage, cascade=cascade)
+    except Exception as e:
+        job_ledger.finish(subject, year, "extract", time.time() - start, usage, error=str(e))
+        raise
+    elapsed = time.time() - start
+    # process_question_paper returns without writing when the response can't be parsed
+    error = None if output_json.exists() else "No output file"
+    job_ledger.finish(subject, year, "extract", elapsed, usage, error=error)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract question papers for several subjects in parallel")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects to process (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--years", type=int, nargs="+", help="Only process these years")
+    parser.add_argument("--workers", type=int, default=8, help="Papers processed at the same time (default: 8)")
+    parser.add_argument("--max-uploads", type=int, default=4, help="Max uploads to the File API in flight (default: 4)")
+    parser.add_argument("--max-generations", type=int, default=4, help="Max Gemini generations in flight (default: 4)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached Gemini responses and generate again")
+    parser.add_argument("--stream", action="store_true", help="Stream generations and checkpoint each question so retries resume")
+    parser.add_argument("--text-layer", action="store_true", help="Send pages with an embedded text layer as text; upload only scanned pages")
+    parser.add_argument("--shard-pages", type=int, help="Split each PDF into shards of this many pages and extract them concurrently")
+    parser.add_argument("--cascade", action="store_true", help="Try the flash model first; rerun on pro only if validation fails")
+    parser.add_argument("--rescan", action="store_true", help="Re-check output files for jobs the ledger already knows (e.g. after deleting a JSON)")
+    args = parser.parse_args()
+
+    subjects = resolve_subjects(args.subjects)
+    jobs = collect_jobs(subjects, args.years, args.rescan)
+    if not jobs:
+        print("Nothing to do - every available paper has already been processed.")
+        return
+    llm_backend.configure()  # fail fast on a missing key rather than in every worker
+
+    print(f"\nProcessing {len(jobs)} papers with {args.workers} workers "
+          f"(uploads ≤ {args.max_uploads}, generations ≤ {args.max_generations})")
+
+    upload_slots = threading.BoundedSemaphore(args.max_uploads)
+    generation_slots = threading.BoundedSemaphore(args.max_generations)
+
+    start = time.time()
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_job, job, upload_slots, generation_slots,
+                                   not args.no_cache, args.shard_pages, args.stream, args.text_layer,
+                                   args.cascade): job for job in jobs}
+        for future in as_completed(futures):
+            subject, year, input_pdf, output_json = futures[future]
+            try:
+                elapsed = future.result()
+            except Exception as e:
+                print(f"❌ Error processing {input_pdf}: {e}")
+                failed.append((subject, year, str(e)))
+                continue
+            if output_json.exists():
+                print(f"✓  {input_pdf.name} -> {output_json} in {elapsed:.2f} seconds ({elapsed/60:.2f} minutes)")
+            else:
+                print(f"❌ {input_pdf.name} finished without writing {output_json.name}")
+                failed.append((subject, year, "No output file"))
+
+    end = time.time()
+    print(f"\n⏱️  Total execution time: {end - start:.2f} seconds ({(end - start)/60:.2f} minutes)")
+    print(f"✓  Successful: {len(jobs) - len(failed)}/{len(jobs)}")
+    if failed:
+        print("Failed:")
+        for subject, year, reason in failed:
+            print(f"  - {subject} {year}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# Group-by splits of {subject}_pro/{subject}_all_years.json, for any combination of the
+# keys year, chapter, topic and type. Each layout is a list of keys; the default layouts
+# reproduce the per-subject scripts byte for byte:
+#   chapters      ["chapter"]          split_{subject}_by_chapter.py
+#   types         ["type"]             split_{subject}_by_type.py
+#   type_chapters ["type", "chapter"]  split_{subject}_types_by_chapters.py
+# The merged file is parsed once per subject and every layout is built from it in memory.
+# A layout with one key writes {key}-{value}.json files plus manifest.json; each outer key
+# adds a {value}_{next key}s/ folder level and an overall_manifest.json. Per-subject type
+# buckets come from subjects.split_spec. Subjects run in parallel worker processes.
+#   python split_engine.py                         default layouts, all subjects
+#   python split_engine.py physics --by chapter,topic --by year
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from split_physics_by_chapter import slugify
+from subjects import SUBJECTS, resolve_subjects, split_spec
+
+KEYS = ("year", "chapter", "topic", "type")
+DEFAULT_LAYOUTS: Dict[str, List[str]] = {
+    "chapters": ["chapter"],
+    "types": ["type"],
+    "type_chapters": ["type", "chapter"],
+}
+
+YearMap = Dict[str, List[Dict[str, Any]]]
+KeyFunction = Callable[[str, Dict[str, Any]], str]
+
+
+def _first_value(item: Dict[str, Any], fields: Sequence[str]) -> str:
+    for field in fields:
+        value = item.get(field)
+        if value is not None and value != "":
+            return str(value)
+    return "unknown"
+
+
+def key_functions(subject: str) -> Dict[str, KeyFunction]:
+    """(year, item) -> group value, for each key."""
+    spec = split_spec(subject)
+    aliases, other_type = spec["type_aliases"], spec["other_type"]
+    # Chapter numbers where the subject has them, else the chapter name
+    chapter_fields = ["chapter", "chapter_name"] if "chapter" in SUBJECTS[subject]["annotation"]["fields"] \
+        else ["chapter_name"]
+
+    def question_type(year: str, item: Dict[str, Any]) -> str:
+        value = item.get("type", "")
+        if not value:
+            return "unknown"
+        return aliases.get(value.lower().strip(), other_type)
+
+    return {
+        "year": lambda year, item: year,
+        "chapter": lambda year, item: _first_value(item, chapter_fields),
+        "topic": lambda year, item: _first_value(item, ["topic", "topic_name"]),
+        "type": question_type,
+    }
+
+
+def _slug(key: str, value: str) -> str:
+    # Topic numbers differ only by their dot ("1.11" vs "11.1")
+    return slugify(value.replace(".", "-") if key == "topic" else value)
+
+
+def ordered(year_map: YearMap) -> YearMap:
+    """Years in numeric order when possible."""
+    try:
+        years = sorted(year_map.keys(), key=lambda y: int(y))
+    except ValueError:
+        years = sorted(year_map.keys())
+    return {y: year_map[y] for y in years}
+
+
+def group(year_map: YearMap, key: KeyFunction) -> Dict[str, YearMap]:
+    """value -> {year -> [items]}, in order of first appearance."""
+    groups: Dict[str, YearMap] = {}
+    for year, items in year_map.items():
+        for item in items:
+            groups.setdefault(key(year, item), {}).setdefault(year, []).append(item)
+    return groups
+
+
+def _plural(key: str) -> str:
+    return f"{key}s"
+
+
+def write_layout(output_dir: str, year_map: YearMap, keys: Sequence[str], functions: Dict[str, KeyFunction],
+                 types: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Writes `year_map` grouped by `keys` under `output_dir` and returns its manifest.
+    An outer "type" level only covers `types`, in that order.
+    """
+    key, rest = keys[0], keys[1:]
+    groups = group(year_map, functions[key])
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    if not rest:
+        for value, values_by_year in groups.items():
+            filename = f"{key}-{_slug(key, value)}.json"
+            with open(os.path.join(output_dir, filename), "w", encoding="utf-8") as f:
+                json.dump(ordered(values_by_year), f, ensure_ascii=False, indent=2)
+            manifest.append({key: value, "file": filename, "total_items": sum(len(v) for v in values_by_year.values()),
+                             "years": len(values_by_year)})
+        manifest_name = "manifest.json"
+    else:
+        values = [t for t in types if t in groups] if key == "type" and types is not None else list(groups)
+        inner = _plural(rest[0])
+        for value in values:
+            # The inner level walks the group's years in order, as if reading its own split file
+            entries = write_layout(os.path.join(output_dir, f"{_slug(key, value)}_{inner}"),
+                                   ordered(groups[value]), rest, functions, types)
+            manifest.append({key: value, f"total_{inner}": len(entries),
+                             "total_items": sum(entry["total_items"] for entry in entries), inner: entries})
+        manifest_name = "overall_manifest.json"
+    with open(os.path.join(output_dir, manifest_name), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def layout_folder(subject: str, name: str) -> str:
+    return f"{subject}_pro_{name}"
+
+
+def split_subject(subject: str, layouts: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Writes every layout of one subject from a single read; returns {"questions", layout name: groups}."""
+    source_path = os.path.join(f"{subject}_pro", f"{subject}_all_years.json")
+    with open(source_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected top-level object keyed by year in {source_path}")
+
+    year_map = {year: [item for item in items if isinstance(item, dict)]
+                for year, items in data.items() if isinstance(items, list)}
+    functions = key_functions(subject)
+    types = split_spec(subject)["types"]
+    counts = {"questions": sum(len(items) for items in year_map.values())}
+    for name, keys in layouts.items():
+        counts[name] = len(write_layout(layout_folder(subject, name), year_map, keys, functions, types))
+    return counts
+
+
+def parse_layout(value: str) -> List[str]:
+    keys = [key.strip() for key in value.split(",") if key.strip()]
+    unknown = [key for key in keys if key not in KEYS]
+    if not keys or unknown or len(set(keys)) != len(keys):
+        raise argparse.ArgumentTypeError(f"Expected distinct keys from {', '.join(KEYS)}, e.g. type,chapter (got {value!r})")
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the merged files of several subjects by any combination of keys")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--by", type=parse_layout, action="append", metavar="KEYS",
+                        help=f"Comma-separated keys from {', '.join(KEYS)}; repeat for several layouts, each written "
+                             "to {subject}_pro_by_<keys>/ (default: the chapters, types and type_chapters trees)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    layouts = {f"by_{'_'.join(keys)}": keys for keys in args.by} if args.by else DEFAULT_LAYOUTS
+    subjects = []
+    for subject in resolve_subjects(args.subjects):
+        if os.path.exists(os.path.join(f"{subject}_pro", f"{subject}_all_years.json")):
+            subjects.append(subject)
+        else:
+            print(f"⏭️  {subject}: no merged file, run merge_{subject}.py first")
+
+    start = time.time()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(subjects) or 1))) as pool:
+        futures = {subject: pool.submit(split_subject, subject, layouts) for subject in subjects}
+        for subject, future in futures.items():
+            try:
+                counts = future.result()
+            except Exception as e:
+                print(f"❌ {subject}: {type(e).__name__}: {e}")
+                continue
+            print(f"✓ {subject}: {counts['questions']} questions -> "
+                  + ", ".join(f"{layout_folder(subject, name)}/ ({counts[name]})" for name in layouts))
+    print(f"⏱️  Split in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
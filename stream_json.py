@@ -0,0 +1,155 @@
+import json
+import pathlib
+from typing import Any, Dict, List, Optional
+
+import job_ledger
+import llm_cache
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser for a streamed JSON array of objects.
+
+    Text is fed in arbitrary chunks; every top-level object is returned as soon as
+    its closing brace arrives. Anything before the opening "[" (e.g. a ```json fence)
+    is ignored. Parsing stops at the first element that is not valid JSON, so
+    everything in `items` is followed by nothing we silently dropped.
+    """
+
+    def __init__(self):
+        self.items: List[Dict[str, Any]] = []
+        self.complete = False   # saw the closing "]"
+        self.broken = False     # an element failed to parse
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer: List[str] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        new_items = []
+        for ch in text:
+            if self.complete or self.broken:
+                break
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                continue
+            if self._depth == 0:
+                # Between elements: only commas/whitespace until the next object or the end
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                elif ch == "]":
+                    self.complete = True
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        item = json.loads("".join(self._buffer))
+                    except json.JSONDecodeError as e:
+                        print(f"\n--- ERROR: Could not parse streamed question #{len(self.items) + 1}: {e}")
+                        self.broken = True
+                        break
+                    self.items.append(item)
+                    new_items.append(item)
+        return new_items
+
+
+# --- Checkpoints ---
+# Completed questions are appended to .llm_cache/partial/<cache key>.jsonl while
+# streaming, so a failed or truncated generation can be resumed.
+
+def checkpoint_path(key: str) -> pathlib.Path:
+    return llm_cache.CACHE_DIR / "partial" / f"{key}.jsonl"
+
+
+def load_checkpoint(key: str) -> List[Dict[str, Any]]:
+    path = checkpoint_path(key)
+    if not path.exists():
+        return []
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # a half-written last line from a crash
+    return items
+
+
+def clear_checkpoint(key: str) -> None:
+    path = checkpoint_path(key)
+    if path.exists():
+        path.unlink()
+
+
+def resume_note(done: List[Dict[str, Any]]) -> str:
+    """Extra prompt text asking the model to continue after the already extracted questions."""
+    last_id = done[-1].get("id", f"#{len(done)}") if isinstance(done[-1], dict) else f"#{len(done)}"
+    done_ids = ", ".join(str(q.get("id")) for q in done if isinstance(q, dict))
+    return (
+        f"Note: the first {len(done)} questions (ids: {done_ids}) have already been extracted. "
+        f"Continue from the question that follows `{last_id}` and output a JSON array containing "
+        "only the remaining questions, using the same id numbering as if the full paper were extracted."
+    )
+
+
+def stream_generate(model, prompt_parts: List[Dict[str, Any]], key: str, usage: Optional[Dict[str, int]] = None,
+                    call=None, **generate_kwargs) -> Optional[str]:
+    """
+    Streams a generation, checkpointing each complete question as it arrives.
+
+    If a checkpoint for `key` exists, the model is asked to resume after it. Returns the
+    full JSON array text (checkpoint + new questions) once the array closes, or None if
+    the stream ended early; the checkpoint is kept in that case for the next attempt.
+    Token counts are added to `usage` and the telemetry `call` once the stream has been consumed.
+    """
+    done = load_checkpoint(key)
+    parts = list(prompt_parts)
+    if done:
+        print(f"Resuming after {len(done)} checkpointed questions (last: {done[-1].get('id')})")
+        parts.append({"text": resume_note(done)})
+
+    parser = JsonArrayStreamParser()
+    path = checkpoint_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    response = model.generate_content(parts, stream=True, **generate_kwargs)
+    with open(path, "a", encoding="utf-8") as checkpoint:
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # chunk without text parts (e.g. a safety or finish-reason chunk)
+            for item in parser.feed(text):
+                checkpoint.write(json.dumps(item, ensure_ascii=False) + "\n")
+                checkpoint.flush()
+                print(f"  ✓ {item.get('id', len(done) + len(parser.items))}")
+    job_ledger.add_usage(usage, response)
+    if call is not None:
+        call.usage(response)
+        call.set(resumed_questions=len(done))
+
+    if not parser.complete or parser.broken:
+        total = len(done) + len(parser.items)
+        print(f"\n--- ERROR: Stream ended before the JSON array was complete. "
+              f"{total} questions are checkpointed; re-run to resume. ---")
+        return None
+
+    clear_checkpoint(key)
+    return json.dumps(done + parser.items, ensure_ascii=False)
@@ -0,0 +1,236 @@
+import importlib
+import pathlib
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# --- Subject Registry ---
+# One entry per subject. File names use "{year}" as a placeholder and mirror
+# what the individual batch_processing_*.py scripts look for. "annotation" names
+# the batch_annotate_* module, its chapter list / prompt builder, and the label
+# fields it inserts after "type". "split" overrides DEFAULT_SPLIT for split_engine.py.
+SUBJECTS: Dict[str, Dict[str, Any]] = {
+    "biology": {
+        "paper_names": ["bio_{year}.pdf"],
+        "data_name": "bio_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2025, 2008, -1)),
+        "annotation": {"module": "batch_annotate", "chapters": "CHAPTERS", "prompt": "generate_annotation_prompt", "subject_arg": True,
+                       "fields": ["chapter", "chapter_name"]},
+    },
+    "chemistry": {
+        "paper_names": ["chem_{year}.pdf"],
+        "data_name": "chem_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2025, 2008, -1)),
+        "annotation": {"module": "batch_annotate", "chapters": "CHAPTERS", "prompt": "generate_annotation_prompt", "subject_arg": True,
+                       "fields": ["chapter", "chapter_name"]},
+    },
+    "physics": {
+        "paper_names": ["phy_{year}.pdf"],
+        "data_name": "phy_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2025, 2008, -1)),
+        "annotation": {"module": "batch_annotate_physics", "chapters": "PHYSICS_CHAPTERS", "topics": "PHYSICS_TOPICS",
+                       "prompt": "generate_physics_annotation_prompt",
+                       "candidate_prompt": "generate_physics_candidate_prompt",
+                       "fields": ["chapter", "chapter_name", "topic", "topic_name"]},
+    },
+    "mathematics": {
+        "paper_names": ["math_{year}.pdf"],
+        "data_name": "math_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2025, 2020, -1)),
+        "annotation": {"module": "batch_annotate_mathematics", "chapters": "MATHEMATICS_CHAPTERS",
+                       "prompt": "generate_mathematics_annotation_prompt", "fields": ["chapter", "chapter_name"]},
+    },
+    "geography": {
+        "paper_names": ["geo_{year}.pdf"],
+        "data_name": "geo_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_geography", "chapters": "GEOGRAPHY_CHAPTERS",
+                       "prompt": "generate_geography_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "history": {
+        "paper_names": ["his_{year}.pdf"],
+        "data_name": "his_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_history", "chapters": "HISTORY_CHAPTERS",
+                       "prompt": "generate_history_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "home_science": {
+        "paper_names": ["hsci_{year}.pdf"],
+        "data_name": "hsci_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_home_science", "chapters": "HOME_SCIENCE_CHAPTERS",
+                       "prompt": "generate_home_science_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "political_science": {
+        "paper_names": ["psci_{year}.pdf"],
+        "data_name": "psci_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_political_science", "chapters": "POLITICAL_SCIENCE_CHAPTERS",
+                       "prompt": "generate_political_science_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "psychology": {
+        "paper_names": ["psy_{year}.pdf"],
+        "data_name": "psy_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_psychology", "chapters": "PSYCHOLOGY_CHAPTERS",
+                       "prompt": "generate_psychology_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "economics": {
+        "paper_names": ["eco_{year}.pdf"],
+        "data_name": "eco_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_economics", "chapters": "ECONOMICS_CHAPTERS",
+                       "prompt": "generate_economics_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "music": {
+        "paper_names": ["mus_{year}.pdf"],
+        "data_name": "music_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_music", "chapters": "MUSIC_CHAPTERS",
+                       "prompt": "generate_music_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "sociology": {
+        "paper_names": ["soc_{year}.pdf"],
+        "data_name": "sociology_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_sociology", "chapters": "SOCIOLOGY_CHAPTERS",
+                       "prompt": "generate_sociology_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "philosophy": {
+        "paper_names": ["phil_{year}.pdf"],
+        "data_name": "philosophy_{year}.json",
+        "extractor": ("process_paper", "process_question_paper"),
+        "years": list(range(2026, 2020, -1)),
+        "annotation": {"module": "batch_annotate_philosophy", "chapters": "PHILOSOPHY_CHAPTERS",
+                       "prompt": "generate_philosophy_annotation_prompt", "fields": ["chapter_name"]},
+    },
+    "hindi": {
+        "paper_names": ["hin-{year}.pdf"],
+        "data_name": "hindi_{year}.json",
+        "extractor": ("process_hindi_paper", "process_hindi_question_paper"),
+        "years": list(range(2026, 2008, -1)),
+        "annotation": {"module": "batch_annotate_hindi", "chapters": "HINDI_CHAPTERS",
+                       "prompt": "generate_hindi_annotation_prompt", "fields": ["chapter_name"],
+                       # Essays, letters, comprehension etc. are labelled by type, without the model
+                       "composition_keywords": "COMPOSITION_KEYWORDS", "composition_chapter": "Vyakaran"},
+        "split": {
+            "type_aliases": {**{alias: "objective" for alias in ["objective", "mcq", "multiple choice", "multiple_choice"]},
+                             **{alias: "short_answer" for alias in ["short", "short answer", "short_answer", "sa"]},
+                             **{alias: "long_answer" for alias in ["long", "long answer", "long_answer", "la", "descriptive"]},
+                             **{alias: "essay" for alias in ["essay", "nibandh"]},
+                             **{alias: "explanation" for alias in ["explanation", "explain", "vyakhya", "saprasang vyakhya"]},
+                             **{alias: "letter_writing" for alias in ["letter", "letter writing", "patra", "patra lekhan", "application"]},
+                             **{alias: "summary" for alias in ["summary", "saransh", "bhavarth"]},
+                             **{alias: "translation" for alias in ["translation", "anuvad"]},
+                             **{alias: "comprehension" for alias in ["comprehension", "passage", "gadyansh", "reading comprehension"]}},
+            "other_type": "various",
+            "types": ["objective", "essay", "explanation", "letter_writing", "short_answer", "long_answer",
+                      "summary", "translation", "comprehension"],
+        },
+    },
+    "english": {
+        # English papers use hyphens (e.g., eng-2021.pdf), with underscore as a fallback
+        "paper_names": ["eng-{year}.pdf", "eng_{year}.pdf"],
+        "data_name": "eng_{year}.json",
+        "extractor": ("process_english_paper", "process_question_paper"),
+        "years": list(range(2026, 2008, -1)),
+        "annotation": {"module": "batch_annotate_english", "chapters": "ENGLISH_CHAPTERS",
+                       "prompt": "generate_english_annotation_prompt", "fields": ["chapter_name"],
+                       # Non-textbook questions: the Gemini prompt asks for "General", the Groq/dummy scripts use "Grammar"
+                       "extra_chapter_names": ["General", "Grammar"],
+                       "composition_keywords": "COMPOSITION_KEYWORDS", "composition_chapter": "General"},
+        "split": {
+            "type_aliases": {t: t for t in ["objective", "essay", "explanation", "letter_application",
+                                            "short_answer", "long_answer", "passage_comprehension", "precis"]},
+            "types": ["objective", "essay", "explanation", "letter_application", "short_answer", "long_answer",
+                      "passage_comprehension", "precis"],
+        },
+    },
+}
+
+# How split_engine.py buckets `type`: the lower-cased value is looked up in
+# "type_aliases", an unlisted value becomes "other_type" (a missing one is always
+# "unknown"), and "types" lists in order the types that are split further.
+DEFAULT_SPLIT: Dict[str, Any] = {
+    "type_aliases": {**{alias: "objective" for alias in ["objective", "mcq", "multiple choice", "multiple_choice"]},
+                     **{alias: "short" for alias in ["short", "short answer", "short_answer", "sa"]},
+                     **{alias: "long" for alias in ["long", "long answer", "long_answer", "la", "descriptive"]}},
+    "other_type": "unknown",
+    "types": ["objective", "short", "long"],
+}
+
+
+def split_spec(subject: str) -> Dict[str, Any]:
+    return {**DEFAULT_SPLIT, **SUBJECTS[subject].get("split", {})}
+
+
+def papers_folder(subject: str) -> pathlib.Path:
+    return pathlib.Path(f"{subject}_papers")
+
+
+def data_folder(subject: str) -> pathlib.Path:
+    return pathlib.Path(f"{subject}_data")
+
+
+def annotated_folder(subject: str) -> pathlib.Path:
+    return pathlib.Path(f"{subject}_data_annotated")
+
+
+def find_paper(subject: str, year: int) -> Optional[pathlib.Path]:
+    """Return the first existing PDF for the subject/year, or None."""
+    for name in SUBJECTS[subject]["paper_names"]:
+        candidate = papers_folder(subject) / name.format(year=year)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def data_path(subject: str, year: int) -> pathlib.Path:
+    return data_folder(subject) / SUBJECTS[subject]["data_name"].format(year=year)
+
+
+def annotated_path(subject: str, year: int) -> pathlib.Path:
+    return annotated_folder(subject) / SUBJECTS[subject]["data_name"].format(year=year)
+
+
+def get_extractor(subject: str) -> Callable[..., Any]:
+    """Import the subject's extraction function on demand."""
+    module_name, func_name = SUBJECTS[subject]["extractor"]
+    module = importlib.import_module(module_name)
+    return getattr(module, func_name)
+
+
+def resolve_subjects(names: List[str]) -> List[str]:
+    """Validate subject names from the command line; empty means all subjects."""
+    if not names:
+        return list(SUBJECTS.keys())
+    unknown = [n for n in names if n not in SUBJECTS]
+    if unknown:
+        raise ValueError(f"Unknown subject(s): {', '.join(unknown)}. Choose from: {', '.join(SUBJECTS)}")
+    return names
+
+
+def identify_file(name: str) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Maps a paper/data file name (or a page shard like phy_2021_p1-2.pdf) to its
+    (subject, year), or (None, None) if it follows none of the naming patterns.
+    """
+    for subject, config in SUBJECTS.items():
+        for pattern in config["paper_names"] + [config["data_name"]]:
+            prefix = pattern.split("{year}")[0]
+            match = re.match(rf"{re.escape(prefix)}(\d{{4}})", name)
+            if match:
+                return subject, int(match.group(1))
+    return None, None
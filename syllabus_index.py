@@ -0,0 +1,143 @@
+# Local lexical index over a subject's syllabus (physics topics, or chapters for
+# subjects without topics). Each entry's document is its topic and chapter name,
+# optionally enriched with the text of questions already annotated with it; BM25
+# then shortlists the top-k candidates for a question so prompts only need to
+# list those instead of the whole syllabus.
+import argparse
+import collections
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import annotation_payload
+from chapter_classifier import normalize_text, question_text
+from subjects import SUBJECTS, resolve_subjects
+
+DEFAULT_CANDIDATES = 8
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Common words that say nothing about the topic
+STOPWORDS = set("""
+a an and are as at be by can define describe does explain find for from give how in is it its of on or
+show state the their this to two what when which who why with write your
+""".split())
+
+Entry = Tuple[str, ...]
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in normalize_text(text).split() if word not in STOPWORDS and len(word) > 1]
+
+
+class SyllabusIndex:
+    def __init__(self):
+        self.entries: List[Entry] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = collections.defaultdict(list)
+        self.lengths: List[int] = []
+        self.idf: Dict[str, float] = {}
+
+    def build(self, documents: Sequence[Tuple[Entry, str]]) -> "SyllabusIndex":
+        for entry, text in documents:
+            terms = collections.Counter(_terms(text))
+            doc_id = len(self.entries)
+            self.entries.append(entry)
+            self.lengths.append(sum(terms.values()))
+            for term, count in terms.items():
+                self.postings[term].append((doc_id, count))
+        n = len(self.entries)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+        return self
+
+    def shortlist(self, text: str, k: int = DEFAULT_CANDIDATES) -> List[Entry]:
+        """The k entries scoring highest for `text` (fewer if too few terms match)."""
+        average = sum(self.lengths) / max(len(self.lengths), 1)
+        scores: Dict[int, float] = collections.defaultdict(float)
+        for term in set(_terms(text)):
+            for doc_id, count in self.postings.get(term, ()):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / average)
+                scores[doc_id] += self.idf[term] * count * (BM25_K1 + 1) / (count + norm)
+        ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [self.entries[doc_id] for doc_id in ranked]
+
+
+def syllabus_documents(subject: str) -> List[Tuple[Entry, str]]:
+    """(label values, names) for every topic, or every chapter if the subject has no topics."""
+    import annotation_engine
+    spec = annotation_engine.annotation_spec(subject)
+    chapters = annotation_engine.get_chapters(subject)
+    documents = []
+    if "topics" in spec:
+        for number, name in getattr(annotation_engine._annotator_module(subject), spec["topics"]):
+            chapter = number.split(".")[0]
+            chapter_name = chapters[int(chapter) - 1]
+            values = {"chapter": chapter, "chapter_name": chapter_name, "topic": number, "topic_name": name}
+            documents.append((tuple(values[field] for field in spec["fields"]), f"{name} {chapter_name}"))
+    else:
+        for i, chapter_name in enumerate(chapters):
+            values = {"chapter": str(i + 1), "chapter_name": chapter_name}
+            documents.append((tuple(values[field] for field in spec["fields"]), chapter_name))
+    return documents
+
+
+def build(subject: str, examples: bool = True, exclude_years: Sequence[Optional[int]] = ()) -> SyllabusIndex:
+    """
+    Indexes the syllabus; with `examples`, the text of every validated annotated
+    question is added to its entry's document (syllabus names alone are too short
+    to match most questions).
+    """
+    import annotation_engine
+    documents = dict(syllabus_documents(subject))
+    texts = {entry: [names] for entry, names in documents.items()}
+    if examples:
+        for year, q, label in annotation_engine.labelled_questions(subject):
+            if label in texts and year not in exclude_years:
+                texts[label].append(question_text(q))
+    return SyllabusIndex().build([(entry, " ".join(parts)) for entry, parts in texts.items()])
+
+
+_indexes: Dict[str, SyllabusIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def load(subject: str) -> SyllabusIndex:
+    with _indexes_lock:
+        if subject not in _indexes:
+            _indexes[subject] = build(subject)
+        return _indexes[subject]
+
+
+def candidates(subject: str, questions: List[Dict[str, Any]], k: int = DEFAULT_CANDIDATES) -> Dict[str, List[Entry]]:
+    """Shortlisted syllabus entries per question id (annotation_payload.payload_ids)."""
+    index = load(subject)
+    return {qid: index.shortlist(question_text(q), k)
+            for q, qid in zip(questions, annotation_payload.payload_ids(questions))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report how often the shortlist contains the annotated label")
+    parser.add_argument("subjects", nargs="*", default=["physics"], help=f"Subjects (default: physics). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("-k", type=int, nargs="+", default=[3, 5, 8, 12], help="Shortlist sizes to evaluate")
+    args = parser.parse_args()
+
+    import annotation_engine
+    print(f"{'subject':<18} {'entries':>7} " + " ".join(f"{f'recall@{k}':>9}" for k in args.k))
+    for subject in resolve_subjects(args.subjects):
+        labelled = annotation_engine.labelled_questions(subject)
+        hits = collections.Counter()
+        total = 0
+        for year in sorted({year for year, _, _ in labelled}, key=lambda y: (y is None, y)):
+            # Enrich the index from every other year, as when annotating a new paper
+            index = build(subject, exclude_years=[year])
+            for y, q, label in labelled:
+                if y != year:
+                    continue
+                total += 1
+                shortlist = index.shortlist(question_text(q), max(args.k))
+                for k in args.k:
+                    hits[k] += label in shortlist[:k]
+        entries = len(syllabus_documents(subject))
+        print(f"{subject:<18} {entries:>7} " + " ".join(f"{hits[k] / max(total, 1):>9.0%}" for k in args.k))
+
+
+if __name__ == "__main__":
+    main()
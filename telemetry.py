@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import pathlib
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import llm_backend
+from subjects import identify_file
+
+# One JSON line per LLM call; append-only so concurrent runs can share it
+METRICS_PATH = pathlib.Path(os.environ.get("LLM_METRICS", "llm_metrics.jsonl"))
+
+# Rough USD prices per million (input, output) tokens, for cost estimates only
+PRICES = {
+    "models/gemini-2.5-pro": (1.25, 10.00),
+    "models/gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "moonshotai/kimi-k2-instruct-0905": (1.00, 3.00),
+}
+
+_write_lock = threading.Lock()
+
+
+class Call:
+    """Metrics for one LLM call; filled in by the caller and written by track()."""
+
+    def __init__(self, stage: str, model: str, provider: str, source: Optional[str], **fields):
+        subject, year = identify_file(pathlib.Path(source).name) if source else (None, None)
+        self.fields: Dict[str, Any] = {
+            "stage": stage, "provider": provider, "model": model, "backend": llm_backend.MODE,
+            "subject": subject, "year": year, "source": pathlib.Path(source).name if source else None,
+            "retries": 0, **fields,
+        }
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def timing(self, name: str) -> Iterator[None]:
+        """Times a sub-step (e.g. "upload_seconds") within the call."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fields[name] = round(self.fields.get(name, 0) + time.perf_counter() - start, 3)
+
+    def usage(self, response) -> None:
+        """Reads token counts from a Gemini response or a Groq/OpenAI-style usage object."""
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            input_tokens, output_tokens = metadata.prompt_token_count, metadata.candidates_token_count
+        else:
+            usage = getattr(response, "usage", response)
+            input_tokens = getattr(usage, "prompt_tokens", None)
+            output_tokens = getattr(usage, "completion_tokens", None)
+        if input_tokens is None and output_tokens is None:
+            return
+        self.fields["input_tokens"] = self.fields.get("input_tokens", 0) + (input_tokens or 0)
+        self.fields["output_tokens"] = self.fields.get("output_tokens", 0) + (output_tokens or 0)
+
+    def set(self, **fields) -> None:
+        self.fields.update(fields)
+
+    def record(self, error: Optional[str] = None, **fields) -> None:
+        self.fields.update(fields)
+        self.fields["wall_seconds"] = round(time.perf_counter() - self._start, 3)
+        if error:
+            self.fields["error"] = error
+        prices = PRICES.get(self.fields["model"])
+        if prices and "input_tokens" in self.fields:
+            self.fields["cost_usd"] = round((self.fields["input_tokens"] * prices[0]
+                                             + self.fields["output_tokens"] * prices[1]) / 1e6, 6)
+        line = json.dumps({"ts": time.time(), **self.fields}, ensure_ascii=False)
+        with _write_lock:
+            with open(METRICS_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+@contextmanager
+def track(stage: str, model: str, provider: str = "gemini", source: Optional[str] = None, **fields) -> Iterator[Call]:
+    """
+    Records one LLM call (wall time, tokens, retries, ...) to METRICS_PATH when the
+    block exits. Subject and year are derived from the `source` file name. An exception
+    is recorded as the call's error and re-raised.
+    """
+    call = Call(stage, model, provider, source, **fields)
+    try:
+        yield call
+    except BaseException as e:
+        call.record(error=f"{type(e).__name__}: {e}")
+        raise
+    call.record()
+
+
+# --- Summary ---
+
+def load_metrics(path: pathlib.Path = METRICS_PATH) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _fmt(value: Optional[float], digits: int = 1) -> str:
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def summarize(records: List[Dict[str, Any]], group_by: List[str]) -> None:
+    groups = defaultdict(list)
+    for record in records:
+        groups[tuple(str(record.get(key) or "-") for key in group_by)].append(record)
+
+    widths = [max([len(key)] + [len(group[i]) for group in groups]) for i, key in enumerate(group_by)]
+    header = " ".join(f"{key:<{width}}" for key, width in zip(group_by, widths))
+    print(f"{header} {'calls':>5} {'errors':>6} {'p50 s':>7} {'p95 s':>7} "
+          f"{'p50 tok/q':>9} {'p95 tok/q':>9} {'retries':>7} {'cost $':>8}")
+    for key in sorted(groups):
+        rows = groups[key]
+        ok = [r for r in rows if not r.get("error")]
+        latency = [r["wall_seconds"] for r in ok]
+        per_question = [(r.get("input_tokens", 0) + r.get("output_tokens", 0)) / r["questions"]
+                        for r in ok if r.get("questions") and "input_tokens" in r]
+        cost = sum(r.get("cost_usd", 0) for r in rows)
+        print(" ".join(f"{part:<{width}}" for part, width in zip(key, widths))
+              + f" {len(rows):>5} {len(rows) - len(ok):>6} {_fmt(percentile(latency, 50)):>7} "
+                f"{_fmt(percentile(latency, 95)):>7} {_fmt(percentile(per_question, 50), 0):>9} "
+                f"{_fmt(percentile(per_question, 95), 0):>9} {sum(r.get('retries', 0) for r in rows):>7} "
+                f"{cost:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-call LLM metrics from llm_metrics.jsonl")
+    parser.add_argument("--by", nargs="+", default=["stage", "subject"],
+                        choices=["stage", "subject", "year", "model", "provider", "backend"],
+                        help="Fields to group by (default: stage subject)")
+    parser.add_argument("--stage", help="Only calls of this stage (extract, annotate, predict)")
+    parser.add_argument("--file", type=pathlib.Path, default=METRICS_PATH, help="Metrics file to read")
+    args = parser.parse_args()
+
+    records = load_metrics(args.file)
+    if args.stage:
+        records = [r for r in records if r.get("stage") == args.stage]
+    if not records:
+        print(f"No metrics recorded in {args.file} yet.")
+        return
+    summarize(records, args.by)
+
+
+if __name__ == "__main__":
+    main()
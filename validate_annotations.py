@@ -0,0 +1,215 @@
+# Bulk check and repair of {subject}_data_annotated/ against the canonical label lists
+# (chapter lists, extra chapter names and PHYSICS_TOPICS). Every annotated file of a
+# subject is loaded at once and each distinct label value is resolved only once against
+# a precomputed index of the canonical names, so a pass over all subjects is quick.
+# Repairs (written with --fix):
+# - a chapter_name / topic_name that nearly matches a canonical name (case, punctuation,
+#   "Chapter 3:" prefixes, small misspellings)
+# - a missing or wrong name filled in from a valid chapter or topic number
+# - a missing or wrong chapter number taken from the chapter_name and topic when they agree
+# Questions that can't be resolved are listed; --reannotate sends just those to the model.
+import argparse
+import difflib
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from chapter_classifier import normalize_text
+from subjects import SUBJECTS, annotated_folder, resolve_subjects
+
+FUZZY_CUTOFF = 0.85
+CHAPTER_PREFIX = re.compile(r"^(?:chapter|ch|unit|lesson|path|adhyay)\s*\d+\s*", re.IGNORECASE)
+
+
+def _key(value: str) -> str:
+    return normalize_text(CHAPTER_PREFIX.sub("", normalize_text(value)))
+
+
+class NameIndex:
+    """Canonical names by normalized form; anything else is fuzzy-matched once and memoized."""
+
+    def __init__(self, names: Sequence[str]):
+        self.names = set(names)
+        self.by_key = {_key(name): name for name in names}
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    def resolve(self, value: Any) -> Optional[str]:
+        if not isinstance(value, str):
+            return None
+        if value in self.names:
+            return value
+        if value not in self._resolved:
+            key = _key(value)
+            name = self.by_key.get(key)
+            if name is None:
+                close = difflib.get_close_matches(key, list(self.by_key), n=2, cutoff=FUZZY_CUTOFF)
+                # Two equally plausible names is a guess, not a repair
+                if len(close) == 1 or (len(close) == 2 and difflib.SequenceMatcher(None, key, close[0]).ratio()
+                                       > difflib.SequenceMatcher(None, key, close[1]).ratio()):
+                    name = self.by_key[close[0]]
+            self._resolved[value] = name
+        return self._resolved[value]
+
+
+def _number(value: Any, limit: int) -> Optional[int]:
+    try:
+        number = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return number if 1 <= number <= limit else None
+
+
+class SubjectLabels:
+    """The canonical labels of one subject and the rules for repairing a question's labels."""
+
+    def __init__(self, subject: str):
+        import annotation_engine
+        spec = annotation_engine.annotation_spec(subject)
+        self.subject = subject
+        self.fields = spec["fields"]
+        self.chapters = annotation_engine.get_chapters(subject)
+        self.chapter_names = NameIndex(list(self.chapters) + list(spec.get("extra_chapter_names", ())))
+        topics = getattr(annotation_engine._annotator_module(subject), spec["topics"]) if "topics" in spec else []
+        self.topic_names = {number: name for number, name in topics}
+        # Topic names repeat across chapters ("Introduction"), so they're looked up per chapter
+        self.topics_by_chapter: Dict[int, NameIndex] = {}
+        self.topic_numbers: Dict[Tuple[int, str], str] = {}
+        for number, name in topics:
+            chapter = int(number.split(".")[0])
+            self.topic_numbers[(chapter, name)] = number
+        for chapter in {int(number.split(".")[0]) for number, _ in topics}:
+            self.topics_by_chapter[chapter] = NameIndex([n for (c, n) in self.topic_numbers if c == chapter])
+
+    def _topic(self, q: Dict[str, Any], chapters: Sequence[int]) -> Optional[str]:
+        topic = str(q.get("topic", "")).strip()
+        if topic in self.topic_names:
+            return topic
+        for chapter in chapters:
+            name = self.topics_by_chapter.get(chapter, NameIndex([])).resolve(q.get("topic_name"))
+            if name is not None:
+                return self.topic_numbers[(chapter, name)]
+        return None
+
+    def repair(self, q: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """The question's labels made canonical, or None if they can't be resolved."""
+        name = self.chapter_names.resolve(q.get("chapter_name")) if "chapter_name" in q else None
+        if "chapter" not in self.fields:
+            return {"chapter_name": name} if name is not None else None
+
+        votes = []
+        number = _number(q.get("chapter"), len(self.chapters))
+        if number is not None:
+            votes.append(number)
+        if name in self.chapters:
+            votes.append(self.chapters.index(name) + 1)
+        topic = None
+        if "topic" in self.fields:
+            topic = self._topic(q, votes)
+            if topic is not None:
+                votes.append(int(topic.split(".")[0]))
+        if not votes:
+            return None
+        chapter = max(set(votes), key=votes.count)
+        if votes.count(chapter) * 2 <= len(votes) and len(votes) > 1:
+            return None  # number, name and topic disagree with no majority
+        labels = {"chapter": str(chapter), "chapter_name": self.chapters[chapter - 1]}
+        if "topic" in self.fields:
+            if topic is None or int(topic.split(".")[0]) != chapter:
+                return None
+            labels.update(topic=topic, topic_name=self.topic_names[topic])
+        return {field: labels[field] for field in self.fields}
+
+
+def check_subject(subject: str) -> List[Dict[str, Any]]:
+    """
+    One entry per annotated file: its questions with repairs applied, the ids that
+    were repaired and the indices that couldn't be resolved.
+    """
+    labels = SubjectLabels(subject)
+    results = []
+    for fpath in sorted(annotated_folder(subject).glob("*.json")):
+        with open(fpath, 'r', encoding='utf-8') as f:
+            questions = json.load(f)
+        repaired, unresolved = [], []
+        for i, q in enumerate(questions):
+            if not isinstance(q, dict):
+                unresolved.append(i)
+                continue
+            fixed = labels.repair(q)
+            if fixed is None:
+                unresolved.append(i)
+            elif any(str(q.get(field)) != value or field not in q for field, value in fixed.items()):
+                q.update(fixed)
+                repaired.append(q.get("id", f"item #{i + 1}"))
+        results.append({"path": fpath, "questions": questions, "repaired": repaired, "unresolved": unresolved})
+    return results
+
+
+def reannotate(subject: str, result: Dict[str, Any], chunk_size: int) -> int:
+    """Sends a file's unresolved questions (without their labels) back to the model; returns how many came back valid."""
+    import annotation_engine
+    fields = annotation_engine.annotation_spec(subject)["fields"]
+    indices = [i for i in result["unresolved"] if isinstance(result["questions"][i], dict)]
+    stripped = [{k: v for k, v in result["questions"][i].items() if k not in fields} for i in indices]
+    annotated = annotation_engine.annotate_in_chunks(subject, stripped, chunk_size, label=result["path"].name)
+    if annotated is None:
+        return 0
+    labels = SubjectLabels(subject)
+    fixed = 0
+    for i, q in zip(indices, annotated):
+        repaired = labels.repair(q)
+        if repaired is not None:
+            result["questions"][i].update(repaired)
+            fixed += 1
+    return fixed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate every annotated file against the canonical chapter/topic lists")
+    parser.add_argument("subjects", nargs="*", help=f"Subjects (default: all). Choices: {', '.join(SUBJECTS)}")
+    parser.add_argument("--fix", action="store_true", help="Write the repaired labels back to the annotated files")
+    parser.add_argument("--reannotate", action="store_true",
+                        help="Also send the questions that can't be repaired back to the model (implies --fix)")
+    parser.add_argument("--chunk-size", type=int, default=25, help="Questions per re-annotation call (default: 25)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="List every repaired and unresolved question")
+    args = parser.parse_args()
+
+    import annotation_engine
+    start = time.time()
+    results = {subject: check_subject(subject) for subject in resolve_subjects(args.subjects)}
+    elapsed = time.time() - start
+
+    print(f"{'subject':<18} {'files':>5} {'questions':>9} {'repaired':>8} {'unresolved':>10}")
+    for subject, files in results.items():
+        questions = sum(len(r["questions"]) for r in files)
+        repaired = sum(len(r["repaired"]) for r in files)
+        unresolved = sum(len(r["unresolved"]) for r in files)
+        print(f"{subject:<18} {len(files):>5} {questions:>9} {repaired:>8} {unresolved:>10}")
+        if args.verbose:
+            for r in files:
+                if r["repaired"]:
+                    print(f"  ✓ {r['path'].name}: repaired {', '.join(map(str, r['repaired']))}")
+                if r["unresolved"]:
+                    ids = [str(r["questions"][i].get("id", f"item #{i + 1}")) if isinstance(r["questions"][i], dict)
+                           else f"item #{i + 1}" for i in r["unresolved"]]
+                    print(f"  ❌ {r['path'].name}: unresolved {', '.join(ids)}")
+    print(f"⏱️  Checked in {elapsed:.2f}s")
+
+    if not (args.fix or args.reannotate):
+        return
+    for subject, files in results.items():
+        for r in files:
+            changed = bool(r["repaired"])
+            if args.reannotate and r["unresolved"]:
+                fixed = reannotate(subject, r, args.chunk_size)
+                print(f"{'✓' if fixed == len(r['unresolved']) else '⚠️ '} {r['path'].name}: "
+                      f"{fixed}/{len(r['unresolved'])} unresolved questions re-annotated")
+                changed = changed or fixed > 0
+            if changed:
+                annotation_engine.save_annotations(subject, r["questions"], r["path"])
+                print(f"✓ Saved {r['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Cheaper model tried first in cascade mode; the pro model only reruns what fails validation
+FAST_MODEL = "models/gemini-2.5-flash"
+PRO_MODEL = "models/gemini-2.5-pro"
+
+OPTION_KEYS = ["A", "B", "C", "D"]
+# Like pdf_shards.ID_PATTERN, but sub-parts may nest deeper ("long_1_3_2")
+ID_PATTERN = re.compile(r"^(?P<prefix>[A-Za-z]+(?:_[A-Za-z]+)*)_(?P<main>\d+)(?:_\d+)*$")
+# Long-answer / composition questions may legitimately be split into sub-questions
+# without text of their own, so only these fields are checked for non-empty text
+TEXT_FIELDS = ("question", "prashna")
+
+
+def extraction_problems(questions: Any) -> List[str]:
+    """
+    Structural checks on an extracted question list. Returns a list of problems
+    (empty if the output looks sound):
+    - every item is an object with an id, a type and question text
+    - ids are unique, follow prefix_N[_M...] and each prefix counts 1, 2, 3... without gaps
+    - objective questions have options (and vikalpa, if present) keyed exactly A-D
+    Page shards number from 1 too (see pdf_shards.shard_note), so they are checked the same way.
+    """
+    if not isinstance(questions, list) or not questions:
+        return ["response is not a non-empty JSON array"]
+
+    problems = []
+    seen = set()
+    numbers: Dict[str, List[int]] = {}
+    for i, q in enumerate(questions):
+        if not isinstance(q, dict):
+            problems.append(f"item #{i + 1} is not an object")
+            continue
+        qid = str(q.get("id", ""))
+        label = qid or f"item #{i + 1}"
+        if not q.get("type"):
+            problems.append(f"{label}: missing type")
+        if not any(isinstance(q.get(field), str) and q[field].strip() for field in TEXT_FIELDS) \
+                and not q.get("sub_questions"):
+            problems.append(f"{label}: no question text")
+
+        if qid in seen:
+            problems.append(f"{label}: duplicate id")
+        seen.add(qid)
+        match = ID_PATTERN.match(qid)
+        if not match:
+            problems.append(f"{label}: id does not look like prefix_N")
+        else:
+            main = int(match.group("main"))
+            mains = numbers.setdefault(match.group("prefix"), [])
+            if not mains or mains[-1] != main:
+                mains.append(main)
+
+        if q.get("type") == "objective":
+            for field in ("options", "vikalpa"):
+                if field == "vikalpa" and field not in q:
+                    continue
+                options = q.get(field)
+                if not isinstance(options, dict) or sorted(options) != OPTION_KEYS:
+                    problems.append(f"{label}: {field} are not keyed A-D")
+                elif not all(str(v).strip() for v in options.values()):
+                    problems.append(f"{label}: empty {field} text")
+
+    for prefix, mains in numbers.items():
+        if mains != list(range(1, len(mains) + 1)):
+            problems.append(f"{prefix}_* ids are not numbered consecutively from 1: {mains}")
+    return problems
+
+
+def annotation_problems(questions: Any, fields: Sequence[str], chapters: Sequence[str],
+                        topics: Optional[Sequence] = None, extra_chapter_names: Sequence[str] = ()) -> List[str]:
+    """
+    Checks annotated questions: every label field is present, chapter names come from
+    the subject's chapter list, chapter numbers are in range and match the name, and
+    physics topics exist in PHYSICS_TOPICS under the same chapter.
+    """
+    if not isinstance(questions, list) or not questions:
+        return ["response is not a non-empty JSON array"]
+
+    problems = []
+    allowed_names = set(chapters) | set(extra_chapter_names)
+    topic_names = {number: name for number, name in topics} if topics else {}
+    for i, q in enumerate(questions):
+        if not isinstance(q, dict):
+            problems.append(f"item #{i + 1} is not an object")
+            continue
+        label = q.get("id", f"item #{i + 1}")
+        missing = [field for field in fields if field not in q]
+        if missing:
+            problems.append(f"{label}: missing {', '.join(missing)}")
+            continue
+        if "chapter_name" in fields and q["chapter_name"] not in allowed_names:
+            problems.append(f"{label}: unknown chapter_name {q['chapter_name']!r}")
+        if "chapter" in fields:
+            try:
+                number = int(q["chapter"])
+            except (TypeError, ValueError):
+                problems.append(f"{label}: chapter {q['chapter']!r} is not a number")
+                continue
+            if not 1 <= number <= len(chapters):
+                problems.append(f"{label}: chapter {number} out of range")
+            elif q.get("chapter_name") not in (None, chapters[number - 1]):
+                problems.append(f"{label}: chapter {number} does not match chapter_name {q['chapter_name']!r}")
+            if "topic" in fields:
+                topic = str(q["topic"])
+                if topic not in topic_names:
+                    problems.append(f"{label}: unknown topic {topic!r}")
+                elif topic.split(".")[0] != str(number):
+                    problems.append(f"{label}: topic {topic} is not in chapter {number}")
+                elif "topic_name" in fields and q["topic_name"] != topic_names[topic]:
+                    problems.append(f"{label}: topic {topic} does not match topic_name {q['topic_name']!r}")
+    return problems
+
+
+def cascade(models: Sequence[str], attempt: Callable[[str], Any], validate: Callable[[Any], List[str]],
+            label: str = "") -> Any:
+    """
+    Runs `attempt(model_name)` with each model in turn until the result passes
+    `validate`. The last model's result is returned even if it still has problems
+    (the pipeline accepted pro output without validation before).
+    """
+    result = None
+    for i, model_name in enumerate(models):
+        result = attempt(model_name)
+        if i == len(models) - 1:
+            break
+        problems = ["no parseable response"] if result is None else validate(result)
+        if not problems:
+            print(f"✓ {label} passed validation on {model_name}")
+            return result
+        print(f"⚠️  {label} failed validation on {model_name} ({len(problems)} problems, e.g. {problems[0]}); "
+              f"escalating to {models[i + 1]}")
+    return result